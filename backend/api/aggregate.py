@@ -0,0 +1,71 @@
+"""
+Server-side rollups of the annual series
+Groups years into fixed-size buckets and reduces each bucket in a single
+pass over the columnar year index
+"""
+
+import math
+
+# Supported reductions for /api/aggregate
+AGGREGATIONS = ('mean', 'min', 'max', 'std', 'count')
+
+
+def bucket_label(bucket_start, bucket_size):
+    """Label a bucket the way decades are labelled ('1880s') or as a year span"""
+    if bucket_size == 10:
+        return f'{bucket_start}s'
+    if bucket_size == 1:
+        return str(bucket_start)
+    return f'{bucket_start}-{bucket_start + bucket_size - 1}'
+
+def reduce_bucket(agg, count, total, total_sq, low, high):
+    """Compute one aggregate value from the running sums of a bucket"""
+    if agg == 'count':
+        return count
+    if agg == 'min':
+        return low
+    if agg == 'max':
+        return high
+    mean = total / count
+    if agg == 'mean':
+        return mean
+    # Sample standard deviation (ddof=1, same as pandas); undefined for one value
+    if count < 2:
+        return None
+    variance = max(total_sq - count * mean * mean, 0.0) / (count - 1)
+    return math.sqrt(variance)
+
+def aggregate(index, bucket_size, agg, start_year, end_year):
+    """Roll up anomalies between start_year and end_year into bucket_size-year buckets"""
+    lo, hi = index.offsets(start_year, end_year)
+    years = index.years
+    anomalies = index.anomalies
+
+    # Buckets are aligned to multiples of bucket_size, like decades
+    starts = []
+    sums = []
+    for i in range(lo, hi):
+        year = years[i]
+        value = anomalies[i]
+        bucket_start = year - year % bucket_size
+        if not starts or starts[-1] != bucket_start:
+            starts.append(bucket_start)
+            # count, sum, sum of squares, min, max
+            sums.append([0, 0.0, 0.0, value, value])
+        acc = sums[-1]
+        acc[0] += 1
+        acc[1] += value
+        acc[2] += value * value
+        if value < acc[3]:
+            acc[3] = value
+        if value > acc[4]:
+            acc[4] = value
+
+    return {
+        'bucket_size': bucket_size,
+        'aggregation': agg,
+        'buckets': [bucket_label(start, bucket_size) for start in starts],
+        'start_years': starts,
+        'values': [reduce_bucket(agg, *acc) for acc in sums],
+        'counts': [acc[0] for acc in sums]
+    }
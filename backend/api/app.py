@@ -4,24 +4,180 @@ Climate Data Visualization API Server
 Flask backend to serve climate data from SQLite database
 """
 
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
-import sqlite3
+from werkzeug.middleware.proxy_fix import ProxyFix
+import atexit
 import os
-import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from aggregate import AGGREGATIONS, aggregate
+from baselines import find_baseline, parse_periods, period_means, rebase_decades, rebase_index, rebase_trends
+from batch import parse_queries
+from compression import ENCODINGS, MIN_COMPRESS_SIZE, choose_encoding, compress
+from db import ConnectionPool, PoolTimeout, default_db_path
+from formats import DEFAULT_FORMAT, MEDIA_TYPES, encode_annual, negotiate
+from limits import REQUEST_START_HEADER, SHED_RETRY_AFTER, LoadShedder, RateLimiter, queue_wait
+from metrics import MetricsRegistry
+from profiling import SamplingProfiler, dump_profile
+from resolutions import DEFAULT_MAX_POINTS, MAX_POINTS_LIMIT, RESOLUTIONS, choose_level, parse_range, series_points
+from serialize import encode_json
+from snapshot import DEFAULT_SERIES, SnapshotCache
+
+# Database path (CLIMATE_DB_PATH overrides it, e.g. for the load test)
+DB_PATH = default_db_path()
+
+# Seconds clients and CDNs may reuse a response before revalidating
+CACHE_MAX_AGE = 60
+
+# Endpoints whose responses depend only on the dataset version
+CACHEABLE_ENDPOINTS = {
+    'annual_data', 'trends_data', 'decades_data', 'range_data', 'aggregate_data', 'catalog_data',
+    'batch_data', 'series_data', 'trend_data'
+}
+
+# Requests slower than this many milliseconds have their sampled stacks written
+# to PROFILE_DIR; the profiler is off unless API_PROFILE_SLOW_MS is set
+PROFILE_SLOW_MS = float(os.environ['API_PROFILE_SLOW_MS']) if os.environ.get('API_PROFILE_SLOW_MS') else None
+PROFILE_DIR = os.environ.get('API_PROFILE_DIR', '/tmp/climate-api-profiles')
+
+# Seconds between stack samples while a request is being profiled
+PROFILE_INTERVAL = 0.002
+
+# Per-client token bucket on /api/* requests: API_RATE_LIMIT requests per second
+# with bursts of up to API_RATE_BURST; off unless API_RATE_LIMIT is set
+RATE_LIMIT = float(os.environ['API_RATE_LIMIT']) if os.environ.get('API_RATE_LIMIT') else None
+RATE_BURST = int(os.environ.get('API_RATE_BURST', 20))
+
+# Reverse proxies in front of the API that append to X-Forwarded-For. Clients are
+# told apart by remote address, which behind a proxy is the proxy's own, so set
+# this to the number of trusted hops to key rate limits on the forwarded address
+TRUSTED_PROXIES = int(os.environ.get('API_TRUSTED_PROXIES', 0))
+
+# /api/* requests that waited longer than this many milliseconds since the proxy
+# stamped X-Request-Start are shed with 503; requests without the header never are.
+# This is what sheds load under gunicorn, where requests queue in the worker before
+# any thread, and so Flask, sees them. Clients can send the header themselves, so it
+# is only honoured behind API_TRUSTED_PROXIES (which must set or strip it), and is
+# off unless API_MAX_QUEUE_MS is set
+MAX_QUEUE_MS = float(os.environ.get('API_MAX_QUEUE_MS', 0))
+
+# /api/* requests admitted at once before new ones are shed with 503 (API_MAX_PENDING).
+# A count only bounds a queue where queued requests are visible: asgi.py counts
+# them on the event loop, allowing PENDING_PER_THREAD per thread by default. Under
+# gunicorn gthread at most one request per thread reaches Flask, so the count is
+# off unless API_MAX_PENDING is set (e.g. for a threaded development server)
+MAX_PENDING = int(os.environ['API_MAX_PENDING']) if os.environ.get('API_MAX_PENDING') else None
+PENDING_PER_THREAD = 4
 
-# Database path
-DB_PATH = '/home/ubuntu/climate_app/backend/database/climate_data.db'
+# Endpoints serving the annual series in any of the formats.MEDIA_TYPES, chosen by Accept
+NEGOTIATED_ENDPOINTS = {'annual_data', 'range_data'}
+
+# Header naming the years the baseline= mean was taken over
+BASELINE_HEADER = 'X-Baseline'
+
+# Digits kept in window= moving averages, like the stored 5-year ones
+MOVING_AVG_DIGITS = 7
+
+# Digits kept in /api/trend slopes, intercepts and r-squared
+TREND_DIGITS = 6
+
+# /api/aggregate bucket size in years when bucket= is absent; larger buckets are
+# allowed up to the span of the series (the default is always allowed)
+DEFAULT_BUCKET = 10
+
+class SeriesNotFound(Exception):
+    """Raised when a request names a series that is not in the database"""
+
+class BadParameter(ValueError):
+    """Raised when a query parameter is invalid"""
 
 # Initialize Flask app
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=[BASELINE_HEADER])  # Enable CORS for all routes
+if TRUSTED_PROXIES:
+    # remote_addr becomes the address the nearest trusted proxy saw
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+elif MAX_QUEUE_MS:
+    print("API_MAX_QUEUE_MS is ignored: X-Request-Start is only trusted with API_TRUSTED_PROXIES set")
+
+# Read-only connections reused across requests; reopened when the database file is replaced
+pool = ConnectionPool(lambda: DB_PATH)
+atexit.register(pool.close_all)
 
 def get_db_connection():
-    """Create a connection to the SQLite database"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-    return conn
+    """Borrow a pooled read-only connection to the SQLite database (use in a with block)"""
+    return pool.connection()
+
+# Snapshot of the database tables, reloaded when the database file changes
+snapshot_cache = SnapshotCache(get_db_connection)
+
+# Per-process request metrics, exposed at /metrics
+metrics = MetricsRegistry()
+metrics.describe('climate_request_duration_seconds', 'histogram',
+                 'Request time by endpoint and phase (snapshot, handler, compress, total)')
+metrics.describe('climate_requests_total', 'counter', 'Requests by endpoint and status code')
+metrics.describe('climate_snapshot_load_seconds', 'histogram',
+                 'Snapshot load time by phase (connect, query, build)')
+
+def record_snapshot_load(timings):
+    """Observe the phase timings of a snapshot load"""
+    for name, seconds in timings.items():
+        metrics.observe('climate_snapshot_load_seconds', seconds, phase=name)
+
+snapshot_cache.on_load = record_snapshot_load
+
+# Samples request stacks when slow-request profiling is enabled
+profiler = SamplingProfiler(PROFILE_INTERVAL) if PROFILE_SLOW_MS is not None else None
+
+# Admission control; asgi.py counts requests itself, where queued ones are visible,
+# and clears SHED_LOAD so they are not counted twice
+rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST) if RATE_LIMIT else None
+shedder = LoadShedder(MAX_PENDING) if MAX_PENDING else None
+app.config['SHED_LOAD'] = shedder is not None
+metrics.describe('climate_rejected_requests_total', 'counter',
+                 'Requests refused by admission control, by reason (rate_limited, overloaded)')
+
+# Set once warm_up() has loaded the snapshot; /ready answers 503 until then
+ready = threading.Event()
+warm_up_error = None
+# Held while a warm-up runs, so concurrent callers never start a second load
+warm_up_lock = threading.Lock()
+
+def warm_up():
+    """Load the snapshot and encode the default series before the worker takes traffic"""
+    global warm_up_error
+    if not warm_up_lock.acquire(blocking=False):
+        return ready.is_set()
+    started = time.perf_counter()
+    try:
+        try:
+            snapshot = snapshot_cache.get(DB_PATH)
+        except (OSError, sqlite3.Error, PoolTimeout) as e:
+            # Keep booting so /ready can report the problem; it retries after the next probe
+            warm_up_error = str(e)
+            print(f"Warm-up failed: {e}")
+            return False
+        
+        series = snapshot.series.get(DEFAULT_SERIES)
+        if series is not None:
+            # Reading the cached properties encodes the fixed endpoint bodies now
+            series.annual_json, series.trends_json, series.decades_json
+        warm_up_error = None
+        ready.set()
+    finally:
+        warm_up_lock.release()
+    print(f"Warm-up complete in {time.perf_counter() - started:.3f}s "
+          f"({len(snapshot.series)} series, {snapshot.annual_records()} annual records)")
+    return True
+
+def start_warm_up():
+    """Run warm_up() in a background thread unless one is already running"""
+    if not warm_up_lock.locked():
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
 
 @app.route('/')
 def index():
@@ -29,118 +185,578 @@ def index():
     return jsonify({
         'name': 'Climate Data Visualization API',
         'description': 'API for accessing global temperature data',
+        'parameters': {
+            'series': f"Series id for any /api/* data endpoint (default '{DEFAULT_SERIES}', see /api/catalog)",
+            'baseline': 'YYYY-YYYY on /api/annual, /api/range, /api/trends, /api/trend and /api/decades: '
+                        'anomalies relative to the mean of those years instead of 1971-2000',
+            'periods': 'YYYY-YYYY,... on the same endpoints: mean anomaly of each span; '
+                       '/api/annual and /api/range then return {"data": ..., "periods": ...}',
+            'window': 'N on /api/annual and /api/range: adds a centred N-year moving average '
+                      'column moving_avg_Nyr (JSON formats only)'
+        },
+        'formats': {
+            'description': 'Accept header values for /api/annual and /api/range',
+            'media_types': list(MEDIA_TYPES.values())
+        },
         'endpoints': [
             {'path': '/api/annual', 'description': 'Annual temperature anomalies'},
             {'path': '/api/trends', 'description': 'Temperature trends and statistics'},
             {'path': '/api/decades', 'description': 'Decadal temperature averages'},
-            {'path': '/api/range?start=YYYY&end=YYYY', 'description': 'Temperature data for specific year range'}
+            {'path': '/api/range?start=YYYY&end=YYYY', 'description': 'Temperature data for specific year range'},
+            {'path': '/api/trend?start=YYYY&end=YYYY', 'description': 'Least-squares trend of any year range'},
+            {'path': '/api/aggregate?bucket=N&agg=mean|min|max|std|count&start=YYYY&end=YYYY', 'description': 'Anomalies rolled up into N-year buckets'},
+            {'path': '/api/batch?queries=annual,trends,decades,range:YYYY-YYYY&format=rows|columns', 'description': 'Several sub-queries answered from one snapshot in one response'},
+            {'path': '/api/series?start=YYYY[-MM[-DD]]&end=YYYY[-MM[-DD]]&max_points=N&resolution=auto|daily|monthly|annual|decadal', 'description': 'Series at the finest resolution within a point budget, LTTB-downsampled when none fits'},
+            {'path': '/api/catalog', 'description': 'Available series'},
+            {'path': '/api/cache', 'description': 'Snapshot cache hit/miss/reload counters'},
+            {'path': '/ready', 'description': 'Readiness probe: 200 once the data is loaded, 503 before'},
+            {'path': '/metrics', 'description': 'Request, cache and database metrics in Prometheus text format'}
         ]
     })
 
+@contextmanager
+def phase(name):
+    """Add the time spent in the with block to the request's phase timings"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases = g.setdefault('phases', {})
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+
+def get_snapshot():
+    """Return the in-memory snapshot for the current database version"""
+    if 'snapshot' not in g:
+        with phase('snapshot'):
+            g.snapshot = snapshot_cache.get(DB_PATH)
+    return g.snapshot
+
+def get_series():
+    """Return the series named by the request's series parameter"""
+    series_id = request.args.get('series', DEFAULT_SERIES)
+    series = get_snapshot().series.get(series_id)
+    if series is None:
+        raise SeriesNotFound(series_id)
+    return series
+
+def get_format():
+    """Return the annual series format negotiated for the current request"""
+    if 'format' not in g:
+        g.format = (negotiate(request.accept_mimetypes)
+                    if request.endpoint in NEGOTIATED_ENDPOINTS else DEFAULT_FORMAT)
+    return g.format
+
+def response_etag(snapshot, encoding=None):
+    """Return the ETag of the current representation (each format and encoding has its own)"""
+    fmt = get_format()
+    etag = snapshot.etag if fmt == DEFAULT_FORMAT else f'{snapshot.etag}-{fmt}'
+    return f'{etag}-{encoding}' if encoding else etag
+
+def get_int(name, default=None):
+    """Return an integer query parameter, or default when it is absent; raises BadParameter when malformed"""
+    text = request.args.get(name)
+    if text is None:
+        return default
+    try:
+        return int(text)
+    except ValueError:
+        raise BadParameter(f"{name} must be an integer, got '{text}'")
+
+def get_baseline(series):
+    """Return the Baseline named by the request's baseline parameter, or None"""
+    text = request.args.get('baseline')
+    if not text:
+        return None
+    try:
+        g.baseline = find_baseline(series.index, text)
+    except ValueError as e:
+        raise BadParameter(str(e))
+    return g.baseline
+
+def get_periods():
+    """Return the (label, start_year, end_year) spans of the request's periods parameter, or None"""
+    text = request.args.get('periods')
+    if text is None:
+        return None
+    try:
+        return parse_periods(text)
+    except ValueError as e:
+        raise BadParameter(str(e))
+
+def get_window():
+    """Return the request's moving average window in years, or None"""
+    if 'window' not in request.args:
+        return None
+    window = request.args.get('window', type=int)
+    if window is None or window < 1:
+        raise BadParameter('window must be a positive number of years')
+    return window
+
+def rebasing_requested():
+    """Check whether the request asks for a baseline or period means"""
+    return 'baseline' in request.args or 'periods' in request.args
+
+def rebasing_key(baseline, periods):
+    """Memo key part for a baseline and periods; equivalent baselines share it"""
+    return (baseline and (baseline.lo, baseline.hi), periods and tuple(periods))
+
+def rebased_index(series, baseline):
+    """Return the year index of a series shifted onto a baseline, from the bounded per-snapshot cache"""
+    if baseline is None:
+        return series.index
+    return get_snapshot().rebased.get_or_compute(
+        (series.series_id, baseline.lo, baseline.hi),
+        lambda: rebase_index(series.index, baseline)
+    )
+
+@app.errorhandler(SeriesNotFound)
+def series_not_found(error):
+    """Report an unknown series as a JSON 404"""
+    return jsonify({'error': f"Unknown series '{error.args[0]}'"}), 404
+
+@app.errorhandler(BadParameter)
+def bad_parameter(error):
+    """Report an invalid query parameter as a JSON 400"""
+    return jsonify({'error': str(error)}), 400
+
+def add_cache_headers(response, snapshot, encoding=None):
+    """Attach validators and caching policy for a snapshot-backed response"""
+    response.set_etag(response_etag(snapshot, encoding))
+    response.last_modified = snapshot.last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    if request.endpoint in NEGOTIATED_ENDPOINTS:
+        response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+    return response
+
+def compress_response(response, snapshot):
+    """Compress a snapshot-backed body and return the encoding used, if any"""
+    encoding = choose_encoding(request.accept_encodings)
+    body = response.get_data()
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return None
+    
+    # The snapshot fixes the body of each URL and negotiated format, so like the memo
+    # the key names the request rather than hashing (and holding on to) the body
+    response.set_data(snapshot.compressed.get_or_compute(
+        (request.full_path, get_format(), encoding), lambda: compress(body, encoding)
+    ))
+    response.content_encoding = encoding
+    return encoding
+
+@app.before_request
+def start_request():
+    """Start the request clock (and the profiler when enabled)"""
+    g.request_started = time.perf_counter()
+    if profiler is not None:
+        profiler.start()
+
+def rejection(status, reason, message, retry_after):
+    """Build a 429/503 JSON response asking the client to retry later"""
+    metrics.inc('climate_rejected_requests_total', reason=reason)
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+@app.before_request
+def admit_request():
+    """Rate-limit each client and shed load on the data endpoints"""
+    if not request.path.startswith('/api/'):
+        return None
+    
+    if rate_limiter is not None:
+        retry_after = rate_limiter.acquire(request.remote_addr)
+        if retry_after:
+            return rejection(429, 'rate_limited', 'Rate limit exceeded, retry later', retry_after)
+    
+    if MAX_QUEUE_MS and TRUSTED_PROXIES:
+        wait = queue_wait(request.headers.get(REQUEST_START_HEADER))
+        if wait is not None and wait * 1000 > MAX_QUEUE_MS:
+            return rejection(503, 'overloaded', 'Server is overloaded, retry later', SHED_RETRY_AFTER)
+    
+    if app.config['SHED_LOAD']:
+        if not shedder.enter():
+            return rejection(503, 'overloaded', 'Server is overloaded, retry later', SHED_RETRY_AFTER)
+        g.admitted = True
+    return None
+
+@app.teardown_request
+def release_request(error=None):
+    """Release the request's admission slot"""
+    if g.pop('admitted', False):
+        shedder.leave()
+
+@app.after_request
+def record_request(response):
+    """Observe the request's phase timings and save profiles of slow requests"""
+    if 'request_started' not in g:
+        return response
+    total = time.perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unmatched'
+    phases = g.get('phases', {})
+    
+    # Whatever the named phases do not cover is the handler's own work (slicing, encoding)
+    for name, seconds in phases.items():
+        metrics.observe('climate_request_duration_seconds', seconds, endpoint=endpoint, phase=name)
+    metrics.observe('climate_request_duration_seconds', max(0.0, total - sum(phases.values())),
+                    endpoint=endpoint, phase='handler')
+    metrics.observe('climate_request_duration_seconds', total, endpoint=endpoint, phase='total')
+    metrics.inc('climate_requests_total', endpoint=endpoint, status=response.status_code)
+    
+    if profiler is not None:
+        samples = profiler.stop()
+        if samples and total * 1000 >= PROFILE_SLOW_MS:
+            path = dump_profile(samples, PROFILE_DIR, endpoint)
+            print(f"Slow request {request.full_path} took {total * 1000:.1f} ms, profile saved to {path}")
+    return response
+
+def not_modified_encoding(snapshot):
+    """Return whether the request's validators match the current representation, and the encoding of the matched ETag"""
+    if request.method != 'GET' or (not request.if_none_match and request.if_modified_since is None):
+        return False, None
+    if request.if_none_match:
+        # A cached copy in any content encoding is still current
+        matches = [e for e in (None, *ENCODINGS)
+                   if request.if_none_match.contains_weak(response_etag(snapshot, e))]
+        return bool(matches), matches[0] if matches else None
+    return int(snapshot.last_modified) <= request.if_modified_since.timestamp(), None
+
+@app.after_request
+def set_cache_headers(response):
+    """Answer conditional GETs with 304, else compress data responses; adds ETag, Last-Modified and Cache-Control"""
+    if (request.endpoint in CACHEABLE_ENDPOINTS and response.status_code == 200
+            and 'snapshot' in g):
+        # Checked after the view, so unknown series and bad parameters are never a 304;
+        # the view only read the in-memory snapshot, so SQLite is still not touched
+        not_modified, encoding = not_modified_encoding(g.snapshot)
+        if not_modified:
+            return add_cache_headers(app.response_class(status=304), g.snapshot, encoding)
+        with phase('compress'):
+            encoding = compress_response(response, g.snapshot)
+        add_cache_headers(response, g.snapshot, encoding)
+    if response.status_code == 200 and g.get('baseline') is not None:
+        response.headers[BASELINE_HEADER] = f'{g.baseline.first_year}-{g.baseline.last_year}'
+    return response
+
+def json_response(body, status=200):
+    """Wrap pre-serialized JSON bytes in a response"""
+    return app.response_class(body, status=status, mimetype='application/json')
+
+def annual_response(series, lo, hi):
+    """Return rows [lo, hi) of a series in the negotiated format, rebased and with period means or a moving average on request"""
+    fmt = get_format()
+    baseline = get_baseline(series)
+    periods = get_periods()
+    window = get_window()
+    if periods is not None and fmt == 'packed':
+        raise BadParameter('periods cannot be combined with the packed format')
+    if window is not None and fmt == 'packed':
+        raise BadParameter('window cannot be combined with the packed format')
+    
+    def build():
+        index = rebased_index(series, baseline)
+        extra = None
+        if window is not None:
+            averages = index.moving_averages(lo, hi, window)
+            extra = {f'moving_avg_{window}yr': [
+                None if average is None else round(average, MOVING_AVG_DIGITS) for average in averages
+            ]}
+        body = encode_annual(index, fmt, lo, hi, encode_json, extra)
+        if periods is None:
+            return body
+        # Period means do not fit in an array of rows, so the rows move into an envelope
+        means = encode_json(period_means(series.index, periods, baseline))
+        return b'{"data":' + body + b',"periods":' + means + b'}'
+    
+    body = get_snapshot().memo.get_or_compute(
+        ('annual', fmt, series.series_id, lo, hi, window) + rebasing_key(baseline, periods),
+        build
+    )
+    return app.response_class(body, mimetype=MEDIA_TYPES[fmt])
+
+def summary_response(kind, series, data, rebase):
+    """Return a trends or decades structure, rebased and with period means on request"""
+    baseline = get_baseline(series)
+    periods = get_periods()
+    
+    def build():
+        result = rebase(data, baseline) if baseline is not None else dict(data)
+        if periods is not None:
+            result['periods'] = period_means(series.index, periods, baseline)
+        return encode_json(result)
+    
+    body = get_snapshot().memo.get_or_compute(
+        (kind, series.series_id) + rebasing_key(baseline, periods),
+        build
+    )
+    return json_response(body)
+
 @app.route('/api/annual')
 def annual_data():
     """Return all annual temperature data"""
-    conn = get_db_connection()
-    annual_temps = conn.execute('SELECT * FROM annual_temperatures ORDER BY year').fetchall()
-    conn.close()
+    series = get_series()
     
-    # Convert to list of dictionaries
-    result = []
-    for row in annual_temps:
-        result.append({
-            'year': row['year'],
-            'anomaly': row['anomaly'],
-            'moving_avg_5yr': row['moving_avg_5yr']
-        })
+    if get_format() == DEFAULT_FORMAT and not rebasing_requested() and 'window' not in request.args:
+        return json_response(series.annual_json)
     
-    return jsonify(result)
+    return annual_response(series, 0, len(series.index))
 
 @app.route('/api/trends')
 def trends_data():
     """Return temperature trends and statistics"""
-    conn = get_db_connection()
-    trends = conn.execute('SELECT * FROM temperature_trends').fetchone()
-    conn.close()
+    series = get_series()
     
-    if not trends:
+    if series.trends_json is None:
         return jsonify({'error': 'No trends data found'}), 404
     
-    # Convert to dictionary
-    result = {
-        'data_range': {
-            'start_year': trends['start_year'],
-            'end_year': trends['end_year']
-        },
-        'trend_per_decade': trends['trend_per_decade'],
-        'warming_since_preindustrial': trends['warming_since_preindustrial'],
-        'average_anomalies': {
-            'pre_industrial': trends['pre_industrial_avg'],
-            'early_20th_century': trends['early_20th_century_avg'],
-            'late_20th_century': trends['late_20th_century_avg'],
-            '21st_century': trends['twentyfirst_century_avg']
-        },
-        'extremes': {
-            'warmest_year': {
-                'year': trends['warmest_year'],
-                'anomaly': trends['warmest_year_anomaly']
-            },
-            'coldest_year': {
-                'year': trends['coldest_year'],
-                'anomaly': trends['coldest_year_anomaly']
-            }
-        }
-    }
+    if rebasing_requested():
+        return summary_response('trends', series, series.trends, rebase_trends)
     
-    return jsonify(result)
+    return json_response(series.trends_json)
 
 @app.route('/api/decades')
 def decades_data():
     """Return decadal temperature averages"""
-    conn = get_db_connection()
-    decades = conn.execute('SELECT * FROM decadal_averages ORDER BY decade').fetchall()
-    conn.close()
-    
-    # Convert to dictionary with lists
-    decades_list = []
-    averages_list = []
-    
-    for row in decades:
-        decades_list.append(row['decade'])
-        averages_list.append(row['average'])
+    series = get_series()
     
-    result = {
-        'decades': decades_list,
-        'averages': averages_list
-    }
+    if rebasing_requested():
+        return summary_response('decades', series, series.decades, rebase_decades)
     
-    return jsonify(result)
+    return json_response(series.decades_json)
 
 @app.route('/api/range')
 def range_data():
     """Return temperature data for a specific year range"""
-    start_year = request.args.get('start', type=int)
-    end_year = request.args.get('end', type=int)
+    start_year = get_int('start')
+    end_year = get_int('end')
     
     if not start_year or not end_year:
         return jsonify({'error': 'Missing start or end year parameter'}), 400
     
-    conn = get_db_connection()
-    annual_temps = conn.execute(
-        'SELECT * FROM annual_temperatures WHERE year >= ? AND year <= ? ORDER BY year',
-        (start_year, end_year)
-    ).fetchall()
-    conn.close()
+    series = get_series()
     
-    # Convert to list of dictionaries
-    result = []
-    for row in annual_temps:
-        result.append({
-            'year': row['year'],
-            'anomaly': row['anomaly'],
-            'moving_avg_5yr': row['moving_avg_5yr']
-        })
+    if get_format() == DEFAULT_FORMAT and not rebasing_requested() and 'window' not in request.args:
+        return json_response(series.range_json(start_year, end_year))
     
-    return jsonify(result)
+    return annual_response(series, *series.index.offsets(start_year, end_year))
+
+@app.route('/api/trend')
+def trend_data():
+    """Return the least-squares trend of the anomalies over a year range"""
+    start_year = get_int('start')
+    end_year = get_int('end')
+    
+    series = get_series()
+    index = series.index
+    if start_year is None:
+        start_year = index.first_year
+    if end_year is None:
+        end_year = index.last_year
+    
+    lo, hi = index.offsets(start_year, end_year)
+    if hi - lo < 2:
+        return jsonify({'error': 'A trend needs at least two years of data in the range'}), 400
+    baseline = get_baseline(series)
+    periods = get_periods()
+    
+    def build():
+        slope, intercept, r_squared = index.regression(lo, hi)
+        if baseline is not None:
+            intercept -= baseline.offset
+        result = {
+            'series': series.series_id,
+            'start_year': index.years[lo],
+            'end_year': index.years[hi - 1],
+            'years': hi - lo,
+            'slope_per_year': round(slope, TREND_DIGITS),
+            'slope_per_decade': round(slope * 10, TREND_DIGITS),
+            'intercept': round(intercept, TREND_DIGITS),
+            'r_squared': None if r_squared is None else round(r_squared, TREND_DIGITS)
+        }
+        if periods is not None:
+            result['periods'] = period_means(index, periods, baseline)
+        return encode_json(result)
+    
+    # Equivalent ranges share a cache entry once clamped to the data
+    body = get_snapshot().memo.get_or_compute(
+        ('trend', series.series_id, lo, hi) + rebasing_key(baseline, periods),
+        build
+    )
+    return json_response(body)
+
+@app.route('/api/aggregate')
+def aggregate_data():
+    """Return anomalies aggregated into fixed-size year buckets"""
+    bucket_size = get_int('bucket', DEFAULT_BUCKET)
+    agg = request.args.get('agg', 'mean')
+    start_year = get_int('start')
+    end_year = get_int('end')
+    
+    if bucket_size < 1:
+        return jsonify({'error': 'bucket must be a positive number of years'}), 400
+    if agg not in AGGREGATIONS:
+        return jsonify({'error': f"agg must be one of: {', '.join(AGGREGATIONS)}"}), 400
+    
+    series = get_series()
+    index = series.index
+    # Wider buckets tell nothing more about the series, and unbounded sizes overflow the encoder
+    max_bucket = max(index.last_year - index.first_year + 1, DEFAULT_BUCKET)
+    if bucket_size > max_bucket:
+        return jsonify({'error': f'bucket must be at most {max_bucket} years, the span of the series'}), 400
+    # start and end need no bound: they are clamped to the data before use
+    if start_year is None:
+        start_year = index.first_year
+    if end_year is None:
+        end_year = index.last_year
+    
+    # Equivalent ranges share a cache entry once clamped to the data
+    lo, hi = index.offsets(start_year, end_year)
+    body = get_snapshot().memo.get_or_compute(
+        ('aggregate', series.series_id, bucket_size, agg, lo, hi),
+        lambda: encode_json(aggregate(index, bucket_size, agg, start_year, end_year))
+    )
+    return json_response(body)
+
+def batch_body(series, queries, fmt):
+    """Join the pre-encoded bodies of each sub-query into one JSON object"""
+    parts = []
+    for key, kind, args in queries:
+        if kind == 'annual':
+            lo, hi = 0, len(series.index)
+        elif kind == 'range':
+            lo, hi = series.index.offsets(*args)
+        elif kind == 'trends':
+            parts.append((key, series.trends_json or b'null'))
+            continue
+        else:
+            parts.append((key, series.decades_json))
+            continue
+        parts.append((key, encode_annual(series.index, fmt, lo, hi, encode_json)))
+    return b'{' + b','.join(encode_json(key) + b':' + body for key, body in parts) + b'}'
+
+@app.route('/api/batch')
+def batch_data():
+    """Answer several sub-queries from one consistent snapshot"""
+    fmt = request.args.get('format', DEFAULT_FORMAT)
+    
+    if fmt not in ('rows', 'columns'):
+        return jsonify({'error': 'format must be rows or columns'}), 400
+    try:
+        queries = parse_queries(request.args.get('queries', ''))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    series = get_series()
+    body = get_snapshot().memo.get_or_compute(
+        ('batch', series.series_id, fmt, tuple(key for key, _, _ in queries)),
+        lambda: batch_body(series, queries, fmt)
+    )
+    return json_response(body)
+
+@app.route('/api/series')
+def series_data():
+    """Return a series at the finest resolution that fits within max_points"""
+    max_points = get_int('max_points', DEFAULT_MAX_POINTS)
+    resolution = request.args.get('resolution', 'auto')
+    
+    if not 1 <= max_points <= MAX_POINTS_LIMIT:
+        return jsonify({'error': f'max_points must be between 1 and {MAX_POINTS_LIMIT}'}), 400
+    if resolution != 'auto' and resolution not in RESOLUTIONS:
+        return jsonify({'error': f"resolution must be auto or one of: {', '.join(RESOLUTIONS)}"}), 400
+    try:
+        start, end = parse_range(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    series = get_series()
+    levels = series.levels
+    if resolution == 'auto':
+        chosen = choose_level(levels, start, end, max_points)
+    elif resolution in levels:
+        chosen = (levels[resolution],) + levels[resolution].offsets(start, end)
+    else:
+        chosen = None
+    if chosen is None:
+        missing = 'data' if resolution == 'auto' else f'{resolution} data'
+        return jsonify({'error': f"Series '{series.series_id}' has no {missing}"}), 404
+    
+    # Equivalent ranges share a cache entry once clamped to the data
+    level, lo, hi = chosen
+    body = get_snapshot().memo.get_or_compute(
+        ('series', series.series_id, level.resolution, lo, hi, max_points),
+        lambda: encode_json(series_points(series.series_id, level, lo, hi, max_points))
+    )
+    return json_response(body)
+
+@app.route('/api/catalog')
+def catalog_data():
+    """Return the series available from the API"""
+    return json_response(get_snapshot().catalog_json)
+
+@app.route('/ready')
+def readiness():
+    """Return 200 once the warm-up has finished, 503 before"""
+    if not ready.is_set():
+        # The probe only reports the state; a startup warm-up that failed or was
+        # skipped (API_WARM_UP=0) is retried in the background, one load at a time
+        start_warm_up()
+        return jsonify({'status': 'unavailable', 'error': warm_up_error}), 503
+    
+    return jsonify({'status': 'ready'})
+
+@app.route('/api/cache')
+def cache_stats():
+    """Return snapshot cache and connection pool counters"""
+    stats = snapshot_cache.stats()
+    stats['pool'] = pool.stats()
+    return jsonify(stats)
+
+@app.route('/metrics')
+def metrics_data():
+    """Return request, cache and database metrics in Prometheus text format"""
+    cache = snapshot_cache.stats()
+    db = pool.stats()
+    memo = cache['memo'] or {'hits': 0, 'misses': 0, 'coalesced': 0, 'entries': 0}
+    compressed = cache['compressed'] or {'hits': 0, 'misses': 0, 'coalesced': 0, 'entries': 0}
+    collected = [
+        ('climate_snapshot_cache_hits_total', 'counter', 'Requests served by the current snapshot',
+         [({}, cache['hits'])]),
+        ('climate_snapshot_cache_misses_total', 'counter', 'Snapshot loads, including the first',
+         [({}, cache['misses'])]),
+        ('climate_snapshot_reloads_total', 'counter', 'Snapshot loads after a database change',
+         [({}, cache['reloads'])]),
+        ('climate_memo_hits_total', 'counter', 'Memoized results reused by the current snapshot',
+         [({}, memo['hits'])]),
+        ('climate_memo_misses_total', 'counter', 'Memoized results computed by the current snapshot',
+         [({}, memo['misses'])]),
+        ('climate_memo_coalesced_total', 'counter', 'Memo misses that waited for a computation already running',
+         [({}, memo['coalesced'])]),
+        ('climate_memo_entries', 'gauge', 'Memoized results held by the current snapshot',
+         [({}, memo['entries'])]),
+        ('climate_compressed_hits_total', 'counter', 'Compressed bodies reused by the current snapshot',
+         [({}, compressed['hits'])]),
+        ('climate_compressed_misses_total', 'counter', 'Bodies compressed for the current snapshot',
+         [({}, compressed['misses'])]),
+        ('climate_compressed_entries', 'gauge', 'Compressed bodies held by the current snapshot',
+         [({}, compressed['entries'])]),
+        ('climate_db_statements_total', 'counter', 'SQL statements run on pooled connections',
+         [({}, db['statements'])]),
+        ('climate_db_checkouts_total', 'counter', 'Connections borrowed from the pool',
+         [({}, db['checkouts'])]),
+        ('climate_db_connections_opened_total', 'counter', 'Connections opened by the pool',
+         [({}, db['opened'])]),
+        ('climate_db_connections_open', 'gauge', 'Connections currently open', [({}, db['open'])]),
+        ('climate_db_generations_total', 'counter', 'Database generation swaps seen by the pool',
+         [({}, db['generations'])]),
+        ('climate_pending_requests', 'gauge', 'Requests admitted by load shedding and not yet finished',
+         [({}, shedder.pending if shedder is not None else 0)]),
+        ('climate_ready', 'gauge', '1 once the warm-up has finished', [({}, int(ready.is_set()))]),
+    ]
+    return app.response_class(metrics.render(collected), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; production runs wsgi.py under gunicorn or asgi.py under uvicorn
+    warm_up()
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1')
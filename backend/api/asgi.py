@@ -0,0 +1,70 @@
+"""
+ASGI entry point for async servers (requires the a2wsgi and uvicorn packages)
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+The Flask app runs on a pool of ASGI_THREADS threads, so snapshot loads
+and pooled SQLite reads never block the event loop. As in wsgi.py, the
+snapshot is loaded on import, before the worker serves requests. Load is
+shed here rather than in Flask, because requests waiting for a thread are
+only visible on the event loop
+"""
+
+import os
+
+from a2wsgi import WSGIMiddleware
+
+import app as api
+from app import app as flask_app, warm_up
+from limits import SHED_RETRY_AFTER, LoadShedder
+
+# Threads running requests per worker; matches the connection pool size by default
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8))
+
+# Requests queued and running per worker before new ones are shed; API_MAX_PENDING
+# overrides the default of PENDING_PER_THREAD per thread (0 turns shedding off)
+MAX_PENDING = api.MAX_PENDING if api.MAX_PENDING is not None else ASGI_THREADS * api.PENDING_PER_THREAD
+
+# Body of the 503 sent to shed requests
+OVERLOADED_BODY = b'{"error":"Server is overloaded, retry later"}'
+
+
+class ShedLoad:
+    """ASGI middleware answering /api/* with 503 once the shedder's limit of queued and running requests is reached"""
+
+    def __init__(self, app, shedder):
+        self.app = app
+        self.shedder = shedder
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith('/api/'):
+            await self.app(scope, receive, send)
+            return
+        if not self.shedder.enter():
+            api.metrics.inc('climate_rejected_requests_total', reason='overloaded')
+            await send({
+                'type': 'http.response.start',
+                'status': 503,
+                'headers': [
+                    (b'content-type', b'application/json'),
+                    (b'content-length', str(len(OVERLOADED_BODY)).encode('ascii')),
+                    (b'retry-after', str(SHED_RETRY_AFTER).encode('ascii')),
+                ]
+            })
+            await send({'type': 'http.response.body', 'body': OVERLOADED_BODY})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.shedder.leave()
+
+
+if os.environ.get('API_WARM_UP', '1') != '0':
+    warm_up()
+
+app = WSGIMiddleware(flask_app, workers=ASGI_THREADS)
+if MAX_PENDING > 0:
+    # Shared with app.py, whose /metrics reports the pending count
+    api.shedder = api.shedder or LoadShedder(MAX_PENDING)
+    flask_app.config['SHED_LOAD'] = False
+    app = ShedLoad(app, api.shedder)
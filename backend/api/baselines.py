@@ -0,0 +1,100 @@
+"""
+Anomaly baselines and period comparisons
+The stored anomalies are relative to 1971-2000. A baseline=YYYY-YYYY
+request shifts every value by the mean anomaly of that span, and
+periods=YYYY-YYYY,... reports the mean anomaly of each span; both means
+come from the prefix sums of the year index in O(1)
+"""
+
+import re
+from collections import namedtuple
+
+from year_index import YearIndex
+
+# Year span syntax used by baseline= and periods=
+SPAN = re.compile(r'(\d{1,4})-(\d{1,4})')
+
+# Most periods one request may compare
+MAX_PERIODS = 10
+
+# Digits kept in rebased values: the source anomalies have 6 and their 5-year means 7
+REBASED_DIGITS = 7
+
+# Digits of the summary values (period means, decades, trends), as stored in the database
+SUMMARY_DIGITS = 4
+
+# The baseline actually applied: years present in the data within the requested span
+Baseline = namedtuple('Baseline', 'offset lo hi first_year last_year')
+
+
+def parse_span(text):
+    """Parse 'YYYY-YYYY' into (start_year, end_year); raises ValueError"""
+    match = SPAN.fullmatch(text.strip())
+    if not match:
+        raise ValueError(f"Invalid year span '{text}' (expected YYYY-YYYY)")
+    start_year, end_year = int(match.group(1)), int(match.group(2))
+    if start_year > end_year:
+        raise ValueError(f"Invalid year span '{text}': start is after end")
+    return start_year, end_year
+
+def parse_periods(text):
+    """Parse a comma-separated list of year spans into (label, start_year, end_year) tuples"""
+    labels = [label.strip() for label in text.split(',') if label.strip()]
+    if not labels:
+        raise ValueError('periods must list at least one YYYY-YYYY span')
+    if len(labels) > MAX_PERIODS:
+        raise ValueError(f"At most {MAX_PERIODS} periods are allowed, got {len(labels)}")
+    return [(label,) + parse_span(label) for label in labels]
+
+def find_baseline(index, text):
+    """Return the Baseline for a 'YYYY-YYYY' span; raises ValueError if it holds no data"""
+    lo, hi = index.offsets(*parse_span(text))
+    if lo == hi:
+        raise ValueError(f"Baseline {text} has no data (series covers {index.first_year}-{index.last_year})")
+    return Baseline(index.mean(lo, hi), lo, hi, index.years[lo], index.years[hi - 1])
+
+def rebase_index(index, baseline):
+    """Build a year index with every anomaly and moving average shifted by the baseline mean"""
+    offset = baseline.offset
+    return YearIndex([
+        (year, round(anomaly - offset, REBASED_DIGITS),
+         None if moving_avg is None else round(moving_avg - offset, REBASED_DIGITS))
+        for year, anomaly, moving_avg in zip(index.years, index.anomalies, index.moving_avgs)
+    ])
+
+def shift(value, baseline):
+    """Shift a summary value onto the baseline"""
+    if value is None or baseline is None:
+        return value
+    return round(value - baseline.offset, SUMMARY_DIGITS)
+
+def period_means(index, periods, baseline=None):
+    """Return {label: {start_year, end_year, years, mean}} for each period"""
+    result = {}
+    for label, start_year, end_year in periods:
+        lo, hi = index.offsets(start_year, end_year)
+        offset = baseline.offset if baseline is not None else 0.0
+        result[label] = {
+            'start_year': start_year,
+            'end_year': end_year,
+            'years': hi - lo,
+            'mean': round(index.mean(lo, hi) - offset, SUMMARY_DIGITS) if hi > lo else None
+        }
+    return result
+
+def rebase_trends(trends, baseline):
+    """Shift the absolute values of a trends structure; slopes and differences are unchanged"""
+    averages = trends['average_anomalies']
+    extremes = trends['extremes']
+    return dict(
+        trends,
+        average_anomalies={period: shift(value, baseline) for period, value in averages.items()},
+        extremes={
+            kind: {'year': extreme['year'], 'anomaly': shift(extreme['anomaly'], baseline)}
+            for kind, extreme in extremes.items()
+        }
+    )
+
+def rebase_decades(decades, baseline):
+    """Shift the decadal averages onto the baseline"""
+    return dict(decades, averages=[shift(value, baseline) for value in decades['averages']])
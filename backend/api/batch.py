@@ -0,0 +1,38 @@
+"""
+Sub-query parsing for /api/batch
+A batch is a comma-separated list of sub-queries, each answered as if it
+were its own endpoint:
+
+    annual | trends | decades | range:START-END
+"""
+
+import re
+
+# Most sub-queries accepted in one batch
+MAX_BATCH_QUERIES = 20
+
+# Sub-queries without arguments
+SIMPLE_QUERIES = ('annual', 'trends', 'decades')
+
+RANGE_QUERY = re.compile(r'range:(-?\d+)-(-?\d+)$')
+
+
+def parse_queries(text):
+    """Split a batch into (key, kind, args) tuples, raising ValueError on a bad sub-query"""
+    keys = [key.strip() for key in text.split(',') if key.strip()]
+    if not keys:
+        raise ValueError('queries must list at least one sub-query')
+    if len(keys) > MAX_BATCH_QUERIES:
+        raise ValueError(f'at most {MAX_BATCH_QUERIES} sub-queries per batch')
+    
+    queries = []
+    for key in dict.fromkeys(keys):
+        if key in SIMPLE_QUERIES:
+            queries.append((key, key, ()))
+            continue
+        match = RANGE_QUERY.match(key)
+        if match is None:
+            raise ValueError(f"Unknown sub-query '{key}' (expected "
+                             f"{', '.join(SIMPLE_QUERIES)} or range:START-END)")
+        queries.append((key, 'range', (int(match.group(1)), int(match.group(2)))))
+    return queries
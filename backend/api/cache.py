@@ -0,0 +1,96 @@
+"""
+Small thread-safe LRU cache for memoized API results
+Concurrent misses on the same key are coalesced (single-flight): the first
+thread computes the value and the others wait for it instead of repeating
+the work
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class Flight:
+    """A computation in progress that other threads can wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    """Mapping that evicts the least recently used entry beyond maxsize"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # Key -> Flight for values being computed
+        self._flights = {}
+        self.hits = 0
+        self.misses = 0
+        # Misses answered by waiting for another thread's computation
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """Return the cached value or None, marking the entry as recently used"""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting the oldest entries if the cache is full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss
+
+        Only one thread computes a given key at a time; the others wait for its
+        result, or its exception.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                # The value may have been stored since get() missed
+                value = self._data.get(key)
+                if value is not None:
+                    return value
+                flight = self._flights[key] = Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            self.put(key, flight.value)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
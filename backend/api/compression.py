@@ -0,0 +1,42 @@
+"""
+Content-Encoding negotiation and compression
+Shared by the API, which compresses each snapshot body once per dataset
+version at a fast level, and by the static file server, which serves
+.br/.gz siblings written ahead of time at the best level by precompress.py
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Supported encodings in order of preference, and the suffix of precompressed files
+ENCODINGS = {'br': '.br', 'gzip': '.gz'} if brotli else {'gzip': '.gz'}
+
+# Bodies smaller than this are sent uncompressed; the framing outweighs the savings
+MIN_COMPRESS_SIZE = 256
+
+# Levels for compressing on the request path: close to the best ratio at a
+# fraction of the cost, since a cold body is compressed while the client waits
+FAST_LEVELS = {'br': 5, 'gzip': 6}
+
+# Highest levels, for files written ahead of time by precompress.py and export_api.py
+BEST_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def choose_encoding(accept_encodings):
+    """Return the preferred encoding from a parsed Accept-Encoding header, or None"""
+    encoding = accept_encodings.best_match(list(ENCODINGS))
+    # best_match also honours '*', which must not select an encoding with q=0
+    if encoding is None or accept_encodings[encoding] == 0:
+        return None
+    return encoding
+
+def compress(body, encoding, levels=FAST_LEVELS):
+    """Compress a body with 'br' or 'gzip' at the level given for it in levels"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=levels['br'])
+    # mtime=0 keeps the output identical across runs, so precompressed files are reproducible
+    return gzip.compress(body, compresslevel=levels['gzip'], mtime=0)
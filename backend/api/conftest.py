@@ -0,0 +1,81 @@
+"""
+Fixtures for the API test suite
+
+    python -m pytest backend/api
+
+The app is exercised through the Flask test client against a temporary
+database built with the setup_database.py functions: the processed global
+series from data/processed, plus a small synthetic series with gaps,
+missing moving averages and monthly points with missing values
+"""
+
+import os
+import sys
+
+import pytest
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(API_DIR, '..', 'database'))
+
+import app as api  # noqa: E402
+import setup_database  # noqa: E402
+
+# Processed files of the global series
+PROCESSED_DIR = os.path.join(API_DIR, '..', '..', 'data', 'processed')
+
+# Synthetic series: 1992, 1995 and 1996 are missing, and the moving
+# average is only known for the middle rows
+GAPPY_SERIES = 'gappy'
+GAPPY_CSV = '''year,anomaly,moving_avg_5yr
+1990,-0.25,
+1991,0.0,
+1993,0.5,0.1
+1994,1.0,0.35
+1997,0.75,
+1998,-0.125,
+'''
+
+# Monthly NOAA-style rows for the synthetic series; -999 marks a missing month
+GAPPY_MONTHLY = '''1990 1 0.5
+1990 2 -999.0
+1990 3 1.5
+1991 1 -1.0
+1991 12 1.0
+'''
+
+
+def build_database(directory):
+    """Build the test database in a directory and return its path"""
+    path = os.path.join(directory, 'climate_data.db')
+    annual_path, trends_path, decadal_path = setup_database.series_paths(PROCESSED_DIR)
+    gappy_path = os.path.join(directory, 'gappy.csv')
+    monthly_path = os.path.join(directory, 'gappy_monthly.asc')
+    with open(gappy_path, 'w') as f:
+        f.write(GAPPY_CSV)
+    with open(monthly_path, 'w') as f:
+        f.write(GAPPY_MONTHLY)
+
+    conn = setup_database.create_database(path)
+    with conn:
+        setup_database.register_series(conn, setup_database.DEFAULT_SERIES)
+        setup_database.import_annual_data(conn, setup_database.DEFAULT_SERIES, annual_path, verbose=False)
+        setup_database.import_trends_data(conn, setup_database.DEFAULT_SERIES, trends_path, verbose=False)
+        setup_database.import_decadal_data(conn, setup_database.DEFAULT_SERIES, decadal_path, verbose=False)
+        setup_database.register_series(conn, GAPPY_SERIES)
+        setup_database.import_annual_data(conn, GAPPY_SERIES, gappy_path, verbose=False)
+    setup_database.import_points(conn, GAPPY_SERIES, monthly_path, 'monthly')
+    conn.close()
+    return path
+
+@pytest.fixture(scope='session')
+def database(tmp_path_factory):
+    """Path of the test database, built once per session"""
+    return build_database(str(tmp_path_factory.mktemp('database')))
+
+@pytest.fixture
+def client(database, monkeypatch):
+    """Flask test client serving the test database with admission control off"""
+    monkeypatch.setattr(api, 'DB_PATH', database)
+    monkeypatch.setattr(api, 'rate_limiter', None)
+    monkeypatch.setitem(api.app.config, 'SHED_LOAD', False)
+    return api.app.test_client()
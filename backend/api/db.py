@@ -0,0 +1,217 @@
+"""
+Pooled read-only SQLite connections for the API
+Connections are opened once with a read-only URI, tuned for read-heavy
+access and reused across requests instead of being reopened every time.
+When setup_database.py swaps in a new database generation, connections to
+the old file finish their current request and are then closed (drained)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Database used by the API and the scripts when CLIMATE_DB_PATH is not set
+DEFAULT_DB_PATH = '/home/ubuntu/climate_app/backend/database/climate_data.db'
+
+# Maximum number of open connections shared by all request threads
+POOL_SIZE = 8
+
+# Seconds to wait for a free connection before giving up
+ACQUIRE_TIMEOUT = 10.0
+
+# Seconds between liveness checks of an idle connection
+HEALTH_CHECK_INTERVAL = 30.0
+
+# Read tuning applied to every connection
+MMAP_SIZE = 256 * 1024 * 1024   # bytes of the file mapped into memory
+CACHE_SIZE_KB = 16 * 1024       # page cache per connection
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+def default_db_path():
+    """Return the database path from CLIMATE_DB_PATH, or DEFAULT_DB_PATH when it is unset"""
+    return os.environ.get('CLIMATE_DB_PATH', DEFAULT_DB_PATH)
+
+def file_identity(db_path):
+    """Return (device, inode) of the database file, which changes when it is replaced"""
+    st = os.stat(db_path)
+    return (st.st_dev, st.st_ino)
+
+def open_read_only(db_path):
+    """Open a tuned read-only connection to the database"""
+    conn = sqlite3.connect(
+        f'file:{db_path}?mode=ro',
+        uri=True,
+        check_same_thread=False  # the pool hands each connection to one thread at a time
+    )
+    conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+    conn.execute('PRAGMA query_only = ON')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+    return conn
+
+
+class PooledConnection:
+    """A connection plus the bookkeeping the pool needs"""
+
+    def __init__(self, db_path):
+        self.identity = file_identity(db_path)
+        self.conn = open_read_only(db_path)
+        self.checked_at = time.monotonic()
+        # WAL mode is persistent and set by setup_database.py, so read-only
+        # connections cannot change it; this only records what the file uses
+        self.journal_mode = self.conn.execute('PRAGMA journal_mode').fetchone()[0]
+
+    def is_healthy(self, identity):
+        """Check the connection still points at the current file and responds"""
+        if self.identity != identity:
+            return False
+        now = time.monotonic()
+        if now - self.checked_at < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            self.conn.execute('SELECT 1').fetchone()
+        except sqlite3.Error:
+            return False
+        self.checked_at = now
+        return True
+
+    def close(self):
+        """Close the underlying connection, ignoring errors"""
+        try:
+            self.conn.close()
+        except sqlite3.Error:
+            pass
+
+
+class ConnectionPool:
+    """Bounded pool of read-only connections to the climate database"""
+
+    def __init__(self, get_path, size=POOL_SIZE):
+        # get_path is called on every checkout so the database path can change
+        self._get_path = get_path
+        self._size = size
+        self._idle = []
+        self._open = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        # Identity of the database file seen by the latest checkout
+        self._identity = None
+        self.opened = 0
+        self.discarded = 0
+        self.generations = 0
+        self.checkouts = 0
+        # SQL statements run on pooled connections, counted by a trace callback
+        self.statements = 0
+
+    def _count_statement(self, statement):
+        """Trace callback installed on every pooled connection"""
+        self.statements += 1
+
+    def _checkout(self):
+        """Take a healthy idle connection or open a new one within the size limit"""
+        db_path = self._get_path()
+        identity = file_identity(db_path)
+        deadline = time.monotonic() + ACQUIRE_TIMEOUT
+
+        with self._cond:
+            if identity != self._identity:
+                self._switch_generation(identity)
+            while True:
+                if self._closed:
+                    raise PoolTimeout('Connection pool is closed')
+                while self._idle:
+                    pooled = self._idle.pop()
+                    if pooled.is_healthy(identity):
+                        return pooled
+                    # Stale or broken: the file was swapped or the connection died
+                    pooled.close()
+                    self._open -= 1
+                    self.discarded += 1
+                if self._open < self._size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise PoolTimeout(f'No database connection available after {ACQUIRE_TIMEOUT}s')
+
+        # Open outside the lock so a slow open does not block other threads
+        try:
+            pooled = PooledConnection(db_path)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        pooled.conn.set_trace_callback(self._count_statement)
+        self.opened += 1
+        return pooled
+
+    def _switch_generation(self, identity):
+        """Record a new database file and close idle connections to the old one (lock held)"""
+        if self._identity is not None:
+            self.generations += 1
+        self._identity = identity
+        stale = [pooled for pooled in self._idle if pooled.identity != identity]
+        self._idle = [pooled for pooled in self._idle if pooled.identity == identity]
+        for pooled in stale:
+            pooled.close()
+        self._open -= len(stale)
+        self.discarded += len(stale)
+
+    def _checkin(self, pooled, broken=False):
+        """Return a connection to the pool, or close it if it should not be reused"""
+        with self._cond:
+            # Connections still in use at a swap are closed as they come back
+            if broken or self._closed or pooled.identity != self._identity:
+                pooled.close()
+                self._open -= 1
+                self.discarded += 1
+            else:
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with block"""
+        pooled = self._checkout()
+        self.checkouts += 1
+        try:
+            yield pooled.conn
+        except sqlite3.Error:
+            self._checkin(pooled, broken=True)
+            raise
+        except BaseException:
+            self._checkin(pooled)
+            raise
+        else:
+            self._checkin(pooled)
+
+    def close_all(self):
+        """Close idle connections and stop handing out new ones"""
+        with self._cond:
+            self._closed = True
+            for pooled in self._idle:
+                pooled.close()
+            self._open -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        """Return pool counters"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'opened': self.opened,
+                'discarded': self.discarded,
+                'generations': self.generations,
+                'checkouts': self.checkouts,
+                'statements': self.statements
+            }
@@ -0,0 +1,107 @@
+"""
+Alternative encodings of the annual series
+Served by content negotiation on the Accept header; the default remains
+the original JSON array of row objects
+
+columns  application/vnd.climate.columns+json
+         {"anomaly": [...], "moving_avg_5yr": [...], "year": [...]}
+         with JSON null where a moving average is missing
+
+packed   application/vnd.climate.packed
+         little-endian, no padding needed for any column:
+           header          4s magic b'CLMP', uint32 row count n
+           anomaly         float32[n]
+           moving_avg_5yr  float32[n] (0.0 where missing)
+           year            int16[n]
+           moving_avg_5yr  uint8[n] validity, 1 = present, 0 = null
+"""
+
+import struct
+import sys
+from array import array
+
+from serialize import encode_records
+
+# Format name -> media type, in order of preference for Accept: */*
+MEDIA_TYPES = {
+    'rows': 'application/json',
+    'columns': 'application/vnd.climate.columns+json',
+    'packed': 'application/vnd.climate.packed',
+}
+
+# Format served when the client expresses no preference
+DEFAULT_FORMAT = 'rows'
+
+# Header of the packed format: magic and row count
+PACKED_HEADER = struct.Struct('<4sI')
+PACKED_MAGIC = b'CLMP'
+
+
+def negotiate(accept_mimetypes):
+    """Return the format name that best matches a parsed Accept header"""
+    mimetype = accept_mimetypes.best_match(list(MEDIA_TYPES.values()),
+                                           MEDIA_TYPES[DEFAULT_FORMAT])
+    for name, media_type in MEDIA_TYPES.items():
+        if media_type == mimetype:
+            return name
+    return DEFAULT_FORMAT
+
+def little_endian(values):
+    """Return the bytes of an array in little-endian order"""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def columns_json(index, lo, hi, encode):
+    """Encode the rows [lo, hi) of a year index as a JSON object of columns"""
+    return encode({
+        'year': index.years[lo:hi].tolist(),
+        'anomaly': index.anomalies[lo:hi].tolist(),
+        'moving_avg_5yr': index.moving_avgs[lo:hi]
+    })
+
+def packed(index, lo, hi):
+    """Encode the rows [lo, hi) of a year index in the packed binary format"""
+    moving_avgs = index.moving_avgs[lo:hi]
+    return b''.join([
+        PACKED_HEADER.pack(PACKED_MAGIC, hi - lo),
+        little_endian(array('f', index.anomalies[lo:hi])),
+        little_endian(array('f', (0.0 if m is None else m for m in moving_avgs))),
+        little_endian(array('h', index.years[lo:hi])),
+        bytes(m is not None for m in moving_avgs),
+    ])
+
+def unpack(body):
+    """Decode a packed body into (years, anomalies, moving_avgs) lists; the inverse of packed()"""
+    magic, count = PACKED_HEADER.unpack_from(body)
+    if magic != PACKED_MAGIC:
+        raise ValueError(f"Not a packed annual series (magic {magic!r})")
+    fields = struct.unpack_from(f'<{count}f{count}f{count}h{count}B', body, PACKED_HEADER.size)
+    anomalies = list(fields[:count])
+    moving_avgs = [m if valid else None
+                   for m, valid in zip(fields[count:2 * count], fields[3 * count:])]
+    years = list(fields[2 * count:3 * count])
+    return years, anomalies, moving_avgs
+
+def encode_annual(index, fmt, lo, hi, encode, extra=None):
+    """Encode the rows [lo, hi) of a year index in one of the MEDIA_TYPES formats
+
+    extra maps additional column names to values for the same rows; it is
+    supported by the JSON formats only.
+    """
+    if extra:
+        if fmt == 'packed':
+            raise ValueError('The packed format has no room for extra columns')
+        columns = {
+            'year': index.years[lo:hi].tolist(),
+            'anomaly': index.anomalies[lo:hi].tolist(),
+            'moving_avg_5yr': index.moving_avgs[lo:hi],
+            **extra
+        }
+        return encode(columns) if fmt == 'columns' else encode_records(columns)
+    if fmt == 'columns':
+        return columns_json(index, lo, hi, encode)
+    if fmt == 'packed':
+        return packed(index, lo, hi)
+    return index.slice_json(lo, hi)
@@ -0,0 +1,42 @@
+"""
+Gunicorn settings for the production API server
+Every setting can be overridden on the command line or through the
+environment variables read below
+"""
+
+import multiprocessing
+import os
+
+# Address the API listens on
+bind = os.environ.get('API_BIND', '0.0.0.0:5000')
+
+# Worker processes; each keeps its own snapshot and connection pool
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# Threads per worker; the snapshot cache and connection pool are thread-safe
+worker_class = 'gthread'
+threads = int(os.environ.get('API_THREADS', 4))
+
+# Bound the queues that form before a request reaches a thread, and so Flask:
+# a worker holds at most worker_connections connections (idle keep-alive ones
+# included) and stops accepting beyond that, leaving new connections in the
+# listen backlog shared by all workers, which refuses them once full. Requests
+# that still wait too long are shed by app.py's API_MAX_QUEUE_MS check when a trusted
+# proxy (API_TRUSTED_PROXIES) stamps X-Request-Start
+worker_connections = int(os.environ.get('API_WORKER_CONNECTIONS', threads * 8))
+backlog = int(os.environ.get('API_BACKLOG', 128))
+
+# Workers import wsgi.py themselves, which loads the snapshot before they accept
+# connections; preloading in the master would share SQLite handles across fork()
+preload_app = False
+
+# Keep-alive lets the dashboard reuse one connection for its requests
+keepalive = 5
+
+# Restart a worker that stops responding (e.g. stuck on a locked database)
+timeout = 30
+graceful_timeout = 10
+
+# Log to stdout/stderr like the development server (API_ACCESS_LOG='' turns access logs off)
+accesslog = os.environ.get('API_ACCESS_LOG', '-') or None
+errorlog = '-'
@@ -0,0 +1,101 @@
+"""
+Admission control for the API
+A token bucket per client bounds how fast any one client may send
+requests (429 Too Many Requests). Load is shed (503 Service Unavailable)
+when a request has waited too long in a queue, as stamped by a proxy, or
+when a cap on the requests admitted at once is reached. Both answer with
+Retry-After and keep only a few numbers per client in memory
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Clients whose buckets are remembered; the least recently seen are forgotten first
+MAX_CLIENTS = 10000
+
+# Seconds a shed client is asked to wait before retrying
+SHED_RETRY_AFTER = 1
+
+# Header a reverse proxy sets to the time it received the request
+REQUEST_START_HEADER = 'X-Request-Start'
+
+
+def queue_wait(header, now=None):
+    """Return the seconds since the time in an X-Request-Start header, or None if it is absent or malformed
+
+    Accepts 't=' followed by epoch seconds (nginx's $msec), milliseconds or
+    microseconds, told apart by their magnitude.
+    """
+    if not header:
+        return None
+    try:
+        stamp = float(header[2:] if header.startswith('t=') else header)
+    except ValueError:
+        return None
+    # Epoch seconds are around 1.7e9; larger stamps are in milli- or microseconds
+    while stamp > 1e11:
+        stamp /= 1000
+    now = time.time() if now is None else now
+    return max(0.0, now - stamp)
+
+
+class RateLimiter:
+    """Token bucket per client: rate tokens per second, holding at most burst"""
+
+    def __init__(self, rate, burst, max_clients=MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # Client -> [tokens, time of the last refill]
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def acquire(self, client, now=None):
+        """Take a token for a request; returns 0 if allowed, else the seconds until one is available"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [float(self.burst), now]
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return 0
+            self.limited += 1
+            return max(1, math.ceil((1.0 - bucket[0]) / self.rate))
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class LoadShedder:
+    """Counts admitted requests and refuses new ones beyond max_pending"""
+
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+        self.shed = 0
+
+    def enter(self):
+        """Admit a request; returns False, counting it as shed, when max_pending are already in"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.shed += 1
+                return False
+            self.pending += 1
+            return True
+
+    def leave(self):
+        """Release a request admitted by enter()"""
+        with self._lock:
+            self.pending -= 1
@@ -0,0 +1,108 @@
+"""
+Request metrics in the Prometheus text exposition format
+Latency histograms and counters are kept per process, so each gunicorn
+worker reports its own /metrics
+"""
+
+import threading
+from bisect import bisect_left
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def escape_label(value):
+    """Escape a label value (backslash, double quote and newline)"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    """Render a label dict as {name="value",...}"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + '}'
+
+def format_value(value):
+    """Render a sample value the way Prometheus expects"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Bucketed counts plus the sum and count of observed values"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # counts[i] holds values <= buckets[i] (and > the previous bound); the last is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Count one value"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        """Yield the cumulative _bucket, _sum and _count lines"""
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{format_labels(dict(labels, le=format_value(bound)))} {cumulative}'
+        yield f'{name}_sum{format_labels(labels)} {format_value(self.sum)}'
+        yield f'{name}_count{format_labels(labels)} {self.count}'
+
+
+class MetricsRegistry:
+    """Named histograms and counters, each split by a set of labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (type, help text)
+        self._meta = {}
+        # name -> {sorted label items: Histogram or number}
+        self._series = {}
+
+    def describe(self, name, kind, help_text):
+        """Declare a metric ('histogram' or 'counter') before it is used"""
+        self._meta[name] = (kind, help_text)
+        self._series.setdefault(name, {})
+
+    def observe(self, name, value, **labels):
+        """Add a value to a histogram"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._series[name].get(key)
+            if histogram is None:
+                histogram = self._series[name][key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        """Increase a counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[name][key] = self._series[name].get(key, 0) + amount
+
+    def render(self, collected=()):
+        """Return every metric as Prometheus text
+
+        collected holds (name, type, help text, [(labels, value)]) tuples read
+        at scrape time, such as counters owned by other components.
+        """
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in self._meta.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for key, value in sorted(self._series[name].items()):
+                    if kind == 'histogram':
+                        lines.extend(value.samples(name, dict(key)))
+                    else:
+                        lines.append(f'{name}{format_labels(dict(key))} {format_value(value)}')
+        for name, kind, help_text, samples in collected:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
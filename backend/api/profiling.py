@@ -0,0 +1,71 @@
+"""
+Opt-in sampling profiler for slow requests
+A background thread samples the stacks of the threads currently serving
+requests; when a request turns out slower than the threshold its samples
+are written out in collapsed-stack form (one "frame;frame;frame count"
+line per stack, as read by flamegraph.pl and speedscope)
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def collapse(frame):
+    """Render a stack as 'outer;...;inner' with one file:function:line entry per frame"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samples the stacks of registered threads every interval seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        # thread ident -> Counter of collapsed stacks
+        self._active = {}
+        self._thread = None
+
+    def start(self):
+        """Begin sampling the calling thread"""
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop sampling the calling thread and return its stack counts"""
+        with self._lock:
+            return self._active.pop(threading.get_ident(), Counter())
+
+    def _run(self):
+        """Sampler loop; only touches threads that are between start() and stop()"""
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[collapse(frame)] += 1
+
+
+def dump_profile(samples, directory, label):
+    """Write collapsed stacks to a new file in directory and return its path"""
+    os.makedirs(directory, exist_ok=True)
+    safe_label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label)
+    now = time.time()
+    stamp = f'{time.strftime("%Y%m%d-%H%M%S", time.localtime(now))}.{int(now * 1000) % 1000:03d}'
+    path = os.path.join(directory, f'{stamp}-{os.getpid()}-{safe_label}.folded')
+    with open(path, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
@@ -0,0 +1,150 @@
+"""
+Multi-resolution views of a series
+Each series has one level per stored resolution: the base rows ingested
+from the source (daily or monthly) and their precomputed annual and
+decadal rollups. /api/series serves the finest level that fits a point
+budget, and thins a level that still does not fit with Largest-Triangle-
+Three-Buckets (LTTB), which keeps the visual shape of a chart
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+# Resolutions from finest to coarsest
+RESOLUTIONS = ('daily', 'monthly', 'annual', 'decadal')
+
+# Default and maximum number of points /api/series returns
+DEFAULT_MAX_POINTS = 1000
+MAX_POINTS_LIMIT = 10000
+
+
+class Level:
+    """One resolution of a series: period start dates (as ordinals), values and base-row counts"""
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self.ordinals = array('i')
+        self.values = array('d')
+        self.counts = array('i')
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def append(self, period_start, value, count=1):
+        """Add a period given its ISO start date; periods must arrive in date order"""
+        self.ordinals.append(date.fromisoformat(period_start).toordinal())
+        self.values.append(value)
+        self.counts.append(count)
+
+    def offsets(self, start, end):
+        """Return the [lo, hi) offsets of the periods starting within start..end (ordinals)"""
+        lo = bisect_left(self.ordinals, start)
+        return lo, max(lo, bisect_right(self.ordinals, end))
+
+    def update_digest(self, digest):
+        """Feed the level content into a hash"""
+        digest.update(self.resolution.encode('utf-8'))
+        for values in (self.ordinals, self.values, self.counts):
+            digest.update(values.tobytes())
+
+
+def parse_date(text, end=False):
+    """Parse YYYY, YYYY-MM or YYYY-MM-DD into a date ordinal
+
+    With end=True a partial date means the last day of that year or month.
+    Raises ValueError for anything else.
+    """
+    parts = text.split('-')
+    if len(parts) > 3 or len(parts[0]) != 4 or not all(part.isdigit() for part in parts):
+        raise ValueError(f"Invalid date '{text}' (expected YYYY, YYYY-MM or YYYY-MM-DD)")
+    year = int(parts[0])
+    if len(parts) == 3:
+        return date(year, int(parts[1]), int(parts[2])).toordinal()
+    if len(parts) == 2:
+        month = int(parts[1])
+        if not end:
+            return date(year, month, 1).toordinal()
+        # The day before the first of the next month
+        if month == 12:
+            return date(year + 1, 1, 1).toordinal() - 1
+        return date(year, month + 1, 1).toordinal() - 1
+    return date(year, 12, 31).toordinal() if end else date(year, 1, 1).toordinal()
+
+def parse_range(start_text, end_text):
+    """Parse optional start/end dates into an inclusive (start, end) ordinal range, open-ended when missing"""
+    start = parse_date(start_text) if start_text else date.min.toordinal()
+    end = parse_date(end_text, end=True) if end_text else date.max.toordinal()
+    return start, end
+
+def choose_level(levels, start, end, max_points):
+    """Pick the finest level with at most max_points periods in start..end
+
+    Falls back to the coarsest level when none fits. Returns (level, lo, hi).
+    """
+    chosen = None
+    for resolution in RESOLUTIONS:
+        level = levels.get(resolution)
+        if level is None:
+            continue
+        lo, hi = level.offsets(start, end)
+        chosen = (level, lo, hi)
+        if hi - lo <= max_points:
+            break
+    return chosen
+
+def lttb(xs, ys, threshold):
+    """Return the indices of threshold points chosen by Largest-Triangle-Three-Buckets
+
+    The first and last points are always kept. Between them the points are
+    split into threshold - 2 buckets, and from each bucket the point forming
+    the largest triangle with the previously kept point and the average of
+    the next bucket is kept.
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+
+    bucket = (n - 2) / (threshold - 2)
+    indices = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        next_end = min(int((i + 2) * bucket) + 1, n)
+        avg_x = sum(xs[end:next_end]) / (next_end - end)
+        avg_y = sum(ys[end:next_end]) / (next_end - end)
+
+        # Twice the triangle area is |dx * y + dy * x + c| for each candidate (x, y)
+        ax, ay = xs[a], ys[a]
+        dx = ax - avg_x
+        dy = avg_y - ay
+        c = -(dx * ay + dy * ax)
+        areas = [abs(dx * y + dy * x + c) for x, y in zip(xs[start:end], ys[start:end])]
+        a = start + areas.index(max(areas))
+        indices.append(a)
+    indices.append(n - 1)
+    return indices
+
+def series_points(series_id, level, lo, hi, max_points):
+    """Build the /api/series result for periods [lo, hi) of a level"""
+    ordinals = level.ordinals[lo:hi]
+    values = level.values[lo:hi]
+    counts = level.counts[lo:hi]
+    downsampled = len(ordinals) > max_points
+    if downsampled:
+        keep = lttb(ordinals, values, max_points)
+        ordinals = [ordinals[i] for i in keep]
+        values = [values[i] for i in keep]
+        counts = [counts[i] for i in keep]
+    return {
+        'series': series_id,
+        'resolution': level.resolution,
+        'downsampled': downsampled,
+        'total_points': hi - lo,
+        'date': [date.fromordinal(ordinal).isoformat() for ordinal in ordinals],
+        'value': list(values),
+        'count': list(counts)
+    }
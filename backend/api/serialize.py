@@ -0,0 +1,57 @@
+"""
+Bulk JSON serialization
+Encodes whole columns with one encoder call instead of one call per row,
+and uses orjson when it is installed. Both encoders produce compact JSON
+with sorted keys; they differ only in how very small or large floats are
+spelled (1e-05 vs 0.00001), which parses to the same values
+"""
+
+import json
+from array import array
+from itertools import accumulate
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is always available
+    orjson = None
+
+# Encoding of one annual row; keys in sorted order, like encode_json
+ROW_TEMPLATE = b'{"anomaly":%s,"moving_avg_5yr":%s,"year":%s}'
+
+
+def encode_json(obj):
+    """Serialize an object to compact JSON bytes (same key order as jsonify)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def encode_column(values):
+    """Encode a column of numbers and None as a list of JSON tokens with a single encoder call"""
+    if not values:
+        return []
+    # Numbers and null never contain a comma, so the array text splits cleanly
+    return encode_json(list(values))[1:-1].split(b',')
+
+def encode_rows(years, anomalies, moving_avgs):
+    """Encode annual columns as comma-separated JSON objects in one buffer
+
+    Returns (buffer, offsets): row i is buffer[offsets[i]:offsets[i + 1] - 1],
+    and rows lo..hi-1 together are buffer[offsets[lo]:offsets[hi] - 1].
+    Faster than one json.dumps of row dicts; with orjson a single dumps is
+    faster, but finding the row offsets in its output costs as much again
+    (see benchmarks/bench_serialize.py).
+    """
+    rows = [
+        ROW_TEMPLATE % fields
+        for fields in zip(encode_column(anomalies), encode_column(moving_avgs), encode_column(years))
+    ]
+    # Each row is followed by a comma, except the last, which the -1 above accounts for
+    offsets = array('q', accumulate((len(row) + 1 for row in rows), initial=0))
+    return b','.join(rows), offsets
+
+def encode_records(columns):
+    """Encode a dict of equal-length columns as a JSON array of row objects, one encoder call per column"""
+    names = sorted(columns)
+    template = b'{' + b','.join(encode_json(name) + b':%s' for name in names) + b'}'
+    tokens = zip(*(encode_column(columns[name]) for name in names))
+    return b'[' + b','.join(template % fields for fields in tokens) + b']'
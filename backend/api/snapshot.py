@@ -0,0 +1,347 @@
+"""
+In-memory snapshot of the climate database
+Loads the annual, trends, decades and multi-resolution point tables of
+every series once per database version and keeps pre-serialized JSON
+bodies for the fixed API endpoints
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+from array import array
+from collections import Counter
+from functools import cached_property
+from itertools import groupby
+from operator import itemgetter
+
+from cache import LRUCache
+from resolutions import RESOLUTIONS, Level
+from serialize import encode_json
+from year_index import YearIndex
+
+# Series served when a request does not name one
+DEFAULT_SERIES = 'global'
+
+# Number of memoized per-request results (aggregates etc.) kept per snapshot
+MEMO_SIZE = 256
+
+# Number of rebased series (baseline=) kept per snapshot; each is a full copy of one series
+REBASED_SIZE = 16
+
+# Number of compressed response bodies kept per snapshot, apart from the memo
+# so that bodies in several encodings do not evict computed results
+COMPRESSED_SIZE = 256
+
+
+def data_version(db_path):
+    """Return a key that changes whenever the database file is rebuilt"""
+    # db_path may be a symlink to the current generation; SQLite names the
+    # WAL file after the target
+    db_path = os.path.realpath(db_path)
+    st = os.stat(db_path)
+    # Committed writes can sit in the WAL file until the next checkpoint
+    # (readers create an empty WAL file on open, which must not count as a change)
+    try:
+        wal = os.stat(db_path + '-wal')
+        wal_key = (wal.st_mtime_ns, wal.st_size) if wal.st_size else (0, 0)
+    except FileNotFoundError:
+        wal_key = (0, 0)
+    return (st.st_ino, st.st_mtime_ns, st.st_size) + wal_key
+
+def trends_to_dict(row):
+    """Convert a temperature_trends row to the API trends structure"""
+    return {
+        'data_range': {
+            'start_year': row['start_year'],
+            'end_year': row['end_year']
+        },
+        'trend_per_decade': row['trend_per_decade'],
+        'warming_since_preindustrial': row['warming_since_preindustrial'],
+        'average_anomalies': {
+            'pre_industrial': row['pre_industrial_avg'],
+            'early_20th_century': row['early_20th_century_avg'],
+            'late_20th_century': row['late_20th_century_avg'],
+            '21st_century': row['twentyfirst_century_avg']
+        },
+        'extremes': {
+            'warmest_year': {
+                'year': row['warmest_year'],
+                'anomaly': row['warmest_year_anomaly']
+            },
+            'coldest_year': {
+                'year': row['coldest_year'],
+                'anomaly': row['coldest_year_anomaly']
+            }
+        }
+    }
+
+
+class SeriesData:
+    """Rows of one series; the JSON bodies are encoded on first use"""
+
+    def __init__(self, series_id, name, description, annual, trends, decades, points=None):
+        self.series_id = series_id
+        self.name = name
+        self.description = description
+        # Annual rows as (year, anomaly, moving_avg_5yr) tuples ordered by year
+        self.annual = annual
+        self.trends = trends
+        self.decades = decades
+        # Resolution -> Level read from series_points (base rows and their rollups)
+        self.points = points or {}
+
+    @cached_property
+    def index(self):
+        """Columnar year index, built the first time the series is served"""
+        return YearIndex(self.annual)
+
+    @cached_property
+    def annual_json(self):
+        """Body of /api/annual"""
+        return self.index.all_json()
+
+    @cached_property
+    def trends_json(self):
+        """Body of /api/trends, or None when the series has no trends row"""
+        return encode_json(self.trends) if self.trends is not None else None
+
+    @cached_property
+    def decades_json(self):
+        """Body of /api/decades"""
+        return encode_json(self.decades)
+
+    @cached_property
+    def levels(self):
+        """Every resolution of the series; the annual and decades tables stand in for missing rollups"""
+        levels = dict(self.points)
+        if 'annual' not in levels and self.annual:
+            levels['annual'] = Level('annual')
+            for year, anomaly, _ in self.annual:
+                levels['annual'].append(f'{year:04d}-01-01', anomaly)
+        if 'decadal' not in levels and self.decades['decades']:
+            years = Counter(year // 10 * 10 for year, _, _ in self.annual)
+            levels['decadal'] = Level('decadal')
+            for label, average in zip(self.decades['decades'], self.decades['averages']):
+                # Labels are '1880s'
+                decade = int(label[:-1])
+                levels['decadal'].append(f'{decade:04d}-01-01', average, years[decade])
+        return levels
+
+    def range_json(self, start_year, end_year):
+        """Return the JSON body for the years start_year..end_year"""
+        return self.index.range_json(start_year, end_year)
+
+    def update_digest(self, digest):
+        """Feed the series content into a hash (packed arrays are far cheaper than repr)"""
+        years, anomalies, moving_avgs = zip(*self.annual) if self.annual else ((), (), ())
+        digest.update(repr((self.series_id, self.name, self.description,
+                            self.trends, self.decades)).encode('utf-8'))
+        digest.update(array('i', years).tobytes())
+        digest.update(array('d', anomalies).tobytes())
+        digest.update(array('d', (math.nan if m is None else m for m in moving_avgs)).tobytes())
+        for resolution in sorted(self.points):
+            self.points[resolution].update_digest(digest)
+
+    def catalog_entry(self):
+        """Describe the series for /api/catalog"""
+        return {
+            'id': self.series_id,
+            'name': self.name,
+            'description': self.description,
+            'start_year': self.annual[0][0] if self.annual else None,
+            'end_year': self.annual[-1][0] if self.annual else None,
+            'records': len(self.annual),
+            'resolutions': self.resolutions()
+        }
+
+    def resolutions(self):
+        """Return the resolutions /api/series can serve, finest first"""
+        available = set(self.points)
+        if self.annual:
+            available.add('annual')
+        if self.decades['decades']:
+            available.add('decadal')
+        return [resolution for resolution in RESOLUTIONS if resolution in available]
+
+
+class Snapshot:
+    """Immutable copy of the database tables at one data version"""
+
+    def __init__(self, version, series):
+        self.version = version
+        # series id -> SeriesData
+        self.series = series
+
+        # Validators shared by every response built from this snapshot.
+        # The ETag hashes the content so identical rebuilds keep it stable.
+        digest = hashlib.sha1()
+        for series_id in sorted(series):
+            series[series_id].update_digest(digest)
+        self.etag = digest.hexdigest()[:20]
+        self.last_modified = max(version[1], version[3]) / 1e9
+
+        self.catalog_json = encode_json(
+            {'series': [series[series_id].catalog_entry() for series_id in sorted(series)]}
+        )
+
+        # Derived results keyed by request parameters; dropped with the snapshot
+        self.memo = LRUCache(MEMO_SIZE)
+        # Year indexes shifted onto a baseline, keyed by series and baseline rows
+        self.rebased = LRUCache(REBASED_SIZE)
+        # Compressed response bodies keyed by encoding and body
+        self.compressed = LRUCache(COMPRESSED_SIZE)
+
+    def annual_records(self):
+        """Return the total number of annual rows across all series"""
+        return sum(len(data.annual) for data in self.series.values())
+
+
+def load_snapshot(conn, version, timings=None):
+    """Read every series from all tables in a single read transaction
+
+    Seconds spent querying and building the snapshot are stored in timings
+    under 'query' and 'build' when it is given.
+    """
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    conn.execute('BEGIN')
+    try:
+        # Plain tuples are much cheaper than sqlite3.Row for the bulk tables
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        catalog = cursor.execute(
+            'SELECT series_id, name, description FROM series ORDER BY series_id'
+        ).fetchall()
+        annual_rows = cursor.execute(
+            'SELECT series_id, year, anomaly, moving_avg_5yr FROM annual_temperatures '
+            'ORDER BY series_id, year'
+        ).fetchall()
+        decade_rows = cursor.execute(
+            'SELECT series_id, decade, average FROM decadal_averages ORDER BY series_id, decade'
+        ).fetchall()
+        trends_rows = conn.execute('SELECT * FROM temperature_trends').fetchall()
+        # Databases set up before series_points was added do not have it
+        tables = {name for name, in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        # Streamed into arrays rather than fetched, since daily series can be long
+        points = {}
+        if 'series_points' in tables:
+            for series_id, resolution, period_start, value, count in cursor.execute(
+                'SELECT series_id, resolution, period_start, value, count FROM series_points '
+                'ORDER BY series_id, resolution, period_start'
+            ):
+                levels = points.setdefault(series_id, {})
+                if resolution not in levels:
+                    levels[resolution] = Level(resolution)
+                levels[resolution].append(period_start, value, count)
+    finally:
+        conn.rollback()
+    queried = time.perf_counter()
+    timings['query'] = queried - started
+
+    annual = {
+        series_id: [row[1:] for row in rows]
+        for series_id, rows in groupby(annual_rows, key=itemgetter(0))
+    }
+    decades = {}
+    for series_id, rows in groupby(decade_rows, key=itemgetter(0)):
+        rows = list(rows)
+        decades[series_id] = {
+            'decades': [row[1] for row in rows],
+            'averages': [row[2] for row in rows]
+        }
+    trends = {row['series_id']: trends_to_dict(row) for row in trends_rows}
+
+    # Series with data but no catalogue entry are still served under their id
+    names = {series_id: (name, description) for series_id, name, description in catalog}
+    for series_id in list(annual) + list(points):
+        names.setdefault(series_id, (series_id, None))
+
+    series = {
+        series_id: SeriesData(
+            series_id, name, description,
+            annual.get(series_id, []),
+            trends.get(series_id),
+            decades.get(series_id, {'decades': [], 'averages': []}),
+            points.get(series_id)
+        )
+        for series_id, (name, description) in names.items()
+    }
+    snapshot = Snapshot(version, series)
+    timings['build'] = time.perf_counter() - queried
+    return snapshot
+
+
+class SnapshotCache:
+    """Holds the current snapshot and swaps it atomically when the database changes"""
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        # Called with the {'connect', 'query', 'build'} seconds of every load
+        self.on_load = None
+
+    def get(self, db_path):
+        """Return a snapshot matching the current database version"""
+        version = data_version(db_path)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                self.hits += 1
+                return snapshot
+
+            self.misses += 1
+            started = time.perf_counter()
+            timings = {}
+            with self._connect() as conn:
+                timings['connect'] = time.perf_counter() - started
+                new_snapshot = load_snapshot(conn, version, timings)
+            if self.on_load is not None:
+                self.on_load(timings)
+
+            if snapshot is not None:
+                self.reloads += 1
+            # Readers holding the old snapshot keep a consistent view
+            self._snapshot = new_snapshot
+            return new_snapshot
+
+    def stats(self):
+        """Return cache counters"""
+        snapshot = self._snapshot
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'loaded': snapshot is not None,
+            'series': len(snapshot.series) if snapshot is not None else 0,
+            'annual_records': snapshot.annual_records() if snapshot is not None else 0,
+            'memo': {
+                'entries': len(snapshot.memo),
+                'hits': snapshot.memo.hits,
+                'misses': snapshot.memo.misses,
+                'coalesced': snapshot.memo.coalesced
+            } if snapshot is not None else None,
+            'rebased': {
+                'entries': len(snapshot.rebased),
+                'hits': snapshot.rebased.hits,
+                'misses': snapshot.rebased.misses,
+                'coalesced': snapshot.rebased.coalesced
+            } if snapshot is not None else None,
+            'compressed': {
+                'entries': len(snapshot.compressed),
+                'hits': snapshot.compressed.hits,
+                'misses': snapshot.compressed.misses,
+                'coalesced': snapshot.compressed.coalesced
+            } if snapshot is not None else None
+        }
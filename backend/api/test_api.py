@@ -1,151 +1,500 @@
 #!/usr/bin/env python3
 """
-Test script for the Climate Data API
-Tests all endpoints to ensure they return the expected data
+Test suite for the Climate Data API
+Tests every endpoint through the Flask test client against the temporary
+database built in conftest.py; no server needs to be running
+
+    python -m pytest backend/api
 """
 
-import requests
+import gzip
 import json
-import time
-import subprocess
-import sys
 import os
-import signal
-from threading import Thread
-
-# API base URL
-BASE_URL = 'http://localhost:5000'
-
-def start_api_server():
-    """Start the Flask API server in a separate process"""
-    print("Starting API server...")
-    api_process = subprocess.Popen(
-        ['python3', 'app.py'],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        cwd='/home/ubuntu/climate_app/backend/api'
-    )
-    
-    # Wait for server to start
-    time.sleep(2)
-    return api_process
-
-def test_root_endpoint():
+import threading
+import time
+
+import numpy as np
+import pytest
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import app as api
+import setup_database
+from compression import ENCODINGS
+from conftest import GAPPY_SERIES, PROCESSED_DIR
+from formats import MEDIA_TYPES, unpack
+from limits import LoadShedder, RateLimiter
+
+# Annual rows, trends and decades as stored by setup_database.py
+ANNUAL_ROWS = setup_database.read_annual_rows(os.path.join(PROCESSED_DIR, setup_database.ANNUAL_FILE))
+with open(os.path.join(PROCESSED_DIR, setup_database.TRENDS_FILE)) as f:
+    TRENDS = json.load(f)
+with open(os.path.join(PROCESSED_DIR, setup_database.DECADAL_FILE)) as f:
+    DECADES = json.load(f)
+
+def test_root_endpoint(client):
     """Test the root endpoint"""
-    print("\nTesting root endpoint...")
-    response = requests.get(f"{BASE_URL}/")
-    
-    if response.status_code == 200:
-        print("✓ Root endpoint returned 200 OK")
-        data = response.json()
-        print(f"API name: {data.get('name')}")
-        print(f"Available endpoints: {len(data.get('endpoints', []))}")
-        return True
-    else:
-        print(f"✗ Root endpoint failed with status code {response.status_code}")
-        return False
-
-def test_annual_endpoint():
-    """Test the annual data endpoint"""
-    print("\nTesting annual data endpoint...")
-    response = requests.get(f"{BASE_URL}/api/annual")
-    
-    if response.status_code == 200:
-        print("✓ Annual data endpoint returned 200 OK")
-        data = response.json()
-        print(f"Number of annual records: {len(data)}")
-        print(f"First year: {data[0]['year']}")
-        print(f"Last year: {data[-1]['year']}")
-        return True
-    else:
-        print(f"✗ Annual data endpoint failed with status code {response.status_code}")
-        return False
-
-def test_trends_endpoint():
-    """Test the trends data endpoint"""
-    print("\nTesting trends data endpoint...")
-    response = requests.get(f"{BASE_URL}/api/trends")
-    
-    if response.status_code == 200:
-        print("✓ Trends data endpoint returned 200 OK")
-        data = response.json()
-        print(f"Data range: {data['data_range']['start_year']} to {data['data_range']['end_year']}")
-        print(f"Trend per decade: {data['trend_per_decade']}°C")
-        print(f"Warmest year: {data['extremes']['warmest_year']['year']} ({data['extremes']['warmest_year']['anomaly']}°C)")
-        return True
-    else:
-        print(f"✗ Trends data endpoint failed with status code {response.status_code}")
-        return False
-
-def test_decades_endpoint():
-    """Test the decades data endpoint"""
-    print("\nTesting decades data endpoint...")
-    response = requests.get(f"{BASE_URL}/api/decades")
-    
-    if response.status_code == 200:
-        print("✓ Decades data endpoint returned 200 OK")
-        data = response.json()
-        print(f"Number of decades: {len(data['decades'])}")
-        print(f"Decades: {', '.join(data['decades'][:5])}...")
-        return True
-    else:
-        print(f"✗ Decades data endpoint failed with status code {response.status_code}")
-        return False
-
-def test_range_endpoint():
+    response = client.get('/')
+    
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['name'] == 'Climate Data Visualization API'
+    paths = [endpoint['path'].split('?')[0] for endpoint in data['endpoints']]
+    assert {'/api/annual', '/api/range', '/api/trend', '/api/series', '/metrics'} <= set(paths)
+
+def test_ready_endpoint(client):
+    """Test that /ready reports the warm-up state and retries it in the background, one load at a time"""
+    api.ready.clear()
+    with api.warm_up_lock:
+        # A warm-up already in progress is neither repeated nor waited for
+        assert api.warm_up() is False
+        response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.get_json()['status'] == 'unavailable'
+    
+    client.get('/ready')
+    assert api.ready.wait(5)
+    response = client.get('/ready')
+    
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'ready'}
+
+def test_annual_endpoint(client):
+    """Test that the annual endpoint returns every stored row unchanged"""
+    response = client.get('/api/annual')
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    data = response.get_json()
+    assert [(row['year'], row['anomaly'], row['moving_avg_5yr']) for row in data] == ANNUAL_ROWS
+    assert data[0]['year'] == 1880 and data[-1]['year'] == 2022
+    # Keys are sorted, as jsonify wrote them
+    assert response.data.startswith(b'[{"anomaly":')
+
+def test_annual_null_handling(client):
+    """Test that missing moving averages are JSON null, never NaN"""
+    response = client.get(f'/api/annual?series={GAPPY_SERIES}')
+    
+    assert response.status_code == 200
+    assert b'NaN' not in response.data
+    data = response.get_json()
+    assert [row['year'] for row in data] == [1990, 1991, 1993, 1994, 1997, 1998]
+    assert [row['moving_avg_5yr'] for row in data] == [None, None, 0.1, 0.35, None, None]
+    assert [row['anomaly'] for row in data] == [-0.25, 0.0, 0.5, 1.0, 0.75, -0.125]
+    
+    # The leading and trailing years of the global series have no moving average either
+    data = client.get('/api/annual').get_json()
+    assert [row['moving_avg_5yr'] is None for row in data[:3] + data[-3:]] == [True, True, False, False, True, True]
+
+def test_annual_formats(client):
+    """Test that the columnar and packed formats hold the same rows"""
+    rows = client.get(f'/api/annual?series={GAPPY_SERIES}').get_json()
+    columns = client.get(f'/api/annual?series={GAPPY_SERIES}', headers={'Accept': MEDIA_TYPES['columns']})
+    packed = client.get(f'/api/annual?series={GAPPY_SERIES}', headers={'Accept': MEDIA_TYPES['packed']})
+    
+    assert columns.status_code == 200 and packed.status_code == 200
+    assert columns.mimetype == MEDIA_TYPES['columns']
+    assert columns.get_json() == {
+        'year': [row['year'] for row in rows],
+        'anomaly': [row['anomaly'] for row in rows],
+        'moving_avg_5yr': [row['moving_avg_5yr'] for row in rows]
+    }
+    
+    years, anomalies, moving_avgs = unpack(packed.data)
+    assert years == [row['year'] for row in rows]
+    assert anomalies == pytest.approx([row['anomaly'] for row in rows], abs=1e-6)
+    assert [m is None for m in moving_avgs] == [row['moving_avg_5yr'] is None for row in rows]
+    
+    assert columns.headers['ETag'] != packed.headers['ETag']
+    assert 'Accept' in columns.headers['Vary']
+
+def test_trends_endpoint(client):
+    """Test that the trends endpoint returns the stored trends"""
+    response = client.get('/api/trends')
+    
+    assert response.status_code == 200
+    assert response.get_json() == TRENDS
+    
+    # A series without a trends row
+    response = client.get(f'/api/trends?series={GAPPY_SERIES}')
+    assert response.status_code == 404
+
+def test_trends_without_early_periods(client, tmp_path, monkeypatch):
+    """Test that periods a series does not reach are served as null, rebased or not"""
+    trends = json.loads(json.dumps(TRENDS))
+    trends['warming_since_preindustrial'] = None
+    trends['average_anomalies'].update(pre_industrial=None, early_20th_century=None)
+    trends_path = str(tmp_path / 'trends.json')
+    with open(trends_path, 'w') as f:
+        json.dump(trends, f)
+    path = str(tmp_path / 'climate_data.db')
+    conn = setup_database.create_database(path)
+    with conn:
+        setup_database.import_annual_data(conn, 'short', os.path.join(PROCESSED_DIR, 'annual_temperatures.csv'),
+                                          verbose=False)
+        setup_database.import_trends_data(conn, 'short', trends_path, verbose=False)
+    conn.close()
+    monkeypatch.setattr(api, 'DB_PATH', path)
+    
+    assert client.get('/api/trends?series=short').get_json() == trends
+    rebased = client.get('/api/trends?series=short&baseline=1951-1980').get_json()
+    assert rebased['warming_since_preindustrial'] is None
+    assert rebased['average_anomalies']['pre_industrial'] is None
+    assert rebased['average_anomalies']['late_20th_century'] is not None
+
+def test_decades_endpoint(client):
+    """Test that the decades endpoint returns the stored decadal averages"""
+    response = client.get('/api/decades')
+    
+    assert response.status_code == 200
+    assert response.get_json() == DECADES
+    
+    response = client.get(f'/api/decades?series={GAPPY_SERIES}')
+    assert response.get_json() == {'decades': [], 'averages': []}
+
+def test_range_endpoint(client):
     """Test the range data endpoint"""
-    print("\nTesting range data endpoint...")
-    start_year = 2000
-    end_year = 2020
-    response = requests.get(f"{BASE_URL}/api/range?start={start_year}&end={end_year}")
-    
-    if response.status_code == 200:
-        print(f"✓ Range data endpoint returned 200 OK for years {start_year}-{end_year}")
-        data = response.json()
-        print(f"Number of records: {len(data)}")
-        print(f"Years included: {data[0]['year']} to {data[-1]['year']}")
-        return True
-    else:
-        print(f"✗ Range data endpoint failed with status code {response.status_code}")
-        return False
-
-def main():
-    """Main test function"""
-    print("Testing Climate Data API...")
-    
-    # Start the API server
-    api_process = start_api_server()
-    
-    try:
-        # Run all tests
-        tests = [
-            test_root_endpoint,
-            test_annual_endpoint,
-            test_trends_endpoint,
-            test_decades_endpoint,
-            test_range_endpoint
-        ]
-        
-        results = []
-        for test in tests:
-            results.append(test())
-        
-        # Print summary
-        print("\nTest Summary:")
-        print(f"Total tests: {len(tests)}")
-        print(f"Passed: {results.count(True)}")
-        print(f"Failed: {results.count(False)}")
-        
-        if all(results):
-            print("\n✓ All tests passed! The API is working correctly.")
+    response = client.get('/api/range?start=2000&end=2020')
+    
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data) == 21
+    assert data[0]['year'] == 2000 and data[-1]['year'] == 2020
+
+@pytest.mark.parametrize('series, start, end, years', [
+    ('global', 1880, 1880, [1880]),
+    ('global', 1800, 1882, [1880, 1881, 1882]),
+    ('global', 2021, 2100, [2021, 2022]),
+    ('global', 1700, 1800, []),
+    ('global', 2030, 2040, []),
+    ('global', 2000, 1990, []),
+    (GAPPY_SERIES, 1992, 1992, []),
+    (GAPPY_SERIES, 1995, 1996, []),
+    (GAPPY_SERIES, 1991, 1996, [1991, 1993, 1994]),
+    (GAPPY_SERIES, 1992, 1997, [1993, 1994, 1997]),
+])
+def test_range_edges(client, series, start, end, years):
+    """Test ranges at, beyond and between the ends of the data"""
+    response = client.get(f'/api/range?series={series}&start={start}&end={end}')
+    
+    assert response.status_code == 200
+    assert [row['year'] for row in response.get_json()] == years
+    
+    # Every format agrees on the rows in range
+    columns = client.get(f'/api/range?series={series}&start={start}&end={end}',
+                         headers={'Accept': MEDIA_TYPES['columns']})
+    assert columns.get_json()['year'] == years
+
+@pytest.mark.parametrize('query', ['', 'start=2000', 'end=2000', 'start=abc&end=2000', 'start=0&end=2000'])
+def test_range_missing_parameters(client, query):
+    """Test that a range without a valid start and end is rejected"""
+    response = client.get(f'/api/range?{query}')
+    
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_unknown_series(client):
+    """Test that an unknown series is a JSON 404 on every data endpoint"""
+    for path in ('/api/annual', '/api/trends', '/api/decades', '/api/range?start=1&end=2',
+                 '/api/trend', '/api/aggregate', '/api/series', '/api/batch?queries=annual'):
+        separator = '&' if '?' in path else '?'
+        response = client.get(f'{path}{separator}series=nowhere')
+        assert response.status_code == 404, path
+        assert response.get_json() == {'error': "Unknown series 'nowhere'"}
+
+def test_baselines(client):
+    """Test baseline rebasing and period means"""
+    response = client.get('/api/trends?baseline=1951-1980&periods=1951-1980,1991-2020')
+    
+    assert response.status_code == 200
+    assert response.headers['X-Baseline'] == '1951-1980'
+    data = response.get_json()
+    # Relative to itself, the baseline period averages zero
+    assert abs(data['periods']['1951-1980']['mean']) < 1e-3
+    assert data['trend_per_decade'] == TRENDS['trend_per_decade']
+    
+    # Rebasing shifts every anomaly by the same offset
+    rebased = client.get('/api/range?start=1951&end=1980&baseline=1951-1980').get_json()
+    assert sum(row['anomaly'] for row in rebased) / len(rebased) == pytest.approx(0.0, abs=1e-6)
+    
+    # Period means move the rows into an envelope
+    response = client.get('/api/range?start=2000&end=2001&periods=1991-2020')
+    assert set(response.get_json()) == {'data', 'periods'}
+    
+    # /api/trend adds them next to the regression, rebased like its intercept
+    data = client.get('/api/trend?start=1950&end=2000&baseline=1951-1980&periods=1951-1980').get_json()
+    assert data['years'] == 51
+    assert data['periods']['1951-1980']['years'] == 30
+    assert abs(data['periods']['1951-1980']['mean']) < 1e-3
+    
+    for query in ('baseline=1980-1951', 'baseline=1700-1800', 'baseline=abc', 'periods=', 'periods=1-2,x'):
+        assert client.get(f'/api/annual?{query}').status_code == 400, query
+    assert client.get('/api/annual?periods=1991-2020', headers={'Accept': MEDIA_TYPES['packed']}).status_code == 400
+
+def test_trend_endpoint(client):
+    """Test least-squares trends and arbitrary moving average windows"""
+    response = client.get('/api/trend')
+    
+    assert response.status_code == 200
+    data = response.get_json()
+    years = [row[0] for row in ANNUAL_ROWS]
+    anomalies = [row[1] for row in ANNUAL_ROWS]
+    slope, intercept = np.polyfit(years, anomalies, 1)
+    assert data['slope_per_year'] == pytest.approx(slope, abs=1e-6)
+    assert data['intercept'] == pytest.approx(intercept, abs=1e-5)
+    assert data['r_squared'] == pytest.approx(np.corrcoef(years, anomalies)[0, 1] ** 2, abs=1e-6)
+    assert round(data['slope_per_decade'], 4) == TRENDS['trend_per_decade']
+    
+    # Ranges are clamped to the data and need at least two years
+    data = client.get('/api/trend?start=1970&end=2100').get_json()
+    assert (data['start_year'], data['end_year'], data['years']) == (1970, 2022, 53)
+    assert client.get(f'/api/trend?series={GAPPY_SERIES}&start=1992&end=1993').status_code == 400
+    # Malformed years are rejected rather than ignored
+    for query in ('start=abc&end=2000', 'start=1950&end=2000.5', 'start=1950&end=x'):
+        assert client.get(f'/api/trend?{query}').status_code == 400, query
+        assert client.get(f'/api/range?{query}').status_code == 400, query
+    
+    # window=5 reproduces the stored 5-year moving average, NULLs included
+    rows = client.get('/api/range?start=1880&end=2022&window=5').get_json()
+    for row, (_, _, moving_avg) in zip(rows, ANNUAL_ROWS):
+        if moving_avg is None:
+            assert row['moving_avg_5yr'] is None
         else:
-            print("\n✗ Some tests failed. Please check the API implementation.")
+            assert row['moving_avg_5yr'] == pytest.approx(moving_avg, abs=1e-6)
+    
+    rows = client.get('/api/range?start=1990&end=2000&window=11').get_json()
+    assert rows[5]['moving_avg_11yr'] == pytest.approx(np.mean(anomalies[1990 - 1880:2001 - 1880]), abs=1e-6)
+    for query in ('window=0', 'window=-3', 'window=x'):
+        assert client.get(f'/api/annual?{query}').status_code == 400, query
+
+def test_aggregate_endpoint(client):
+    """Test the aggregate data endpoint"""
+    response = client.get('/api/aggregate?bucket=20&agg=max&start=1900&end=1999')
+    
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['start_years'] == [1900, 1920, 1940, 1960, 1980]
+    assert data['counts'] == [20] * 5
+    expected = [max(row[1] for row in ANNUAL_ROWS if start <= row[0] < start + 20) for start in data['start_years']]
+    assert data['values'] == pytest.approx(expected)
+    
+    # Buckets only count the years present
+    data = client.get(f'/api/aggregate?series={GAPPY_SERIES}&bucket=5&agg=count').get_json()
+    assert data['start_years'] == [1990, 1995]
+    assert data['counts'] == [4, 2]
+    
+    for query in ('bucket=0', 'bucket=-5', 'bucket=abc', 'bucket=', 'start=abc', 'end=1990.5',
+                  'bucket=1000000000000000000000', 'bucket=144'):
+        assert client.get(f'/api/aggregate?{query}').status_code == 400, query
+    assert client.get('/api/aggregate?agg=median').status_code == 400
+    
+    # A bucket as wide as the series is allowed; out-of-range years are clamped to the data
+    data = client.get('/api/aggregate?bucket=143').get_json()
+    assert sum(data['counts']) == 143
+    big = '1' + '0' * 21
+    response = client.get(f'/api/aggregate?start=-{big}&end={big}')
+    assert response.get_json() == client.get('/api/aggregate').get_json()
+    # The default bucket is allowed however short the series
+    assert client.get(f'/api/aggregate?series={GAPPY_SERIES}').status_code == 200
+
+def test_batch_endpoint(client):
+    """Test that batch sub-queries match their own endpoints"""
+    response = client.get('/api/batch?queries=annual,trends,decades,range:1990-2020')
+    
+    assert response.status_code == 200
+    data = response.get_json()
+    assert set(data) == {'annual', 'trends', 'decades', 'range:1990-2020'}
+    assert data['range:1990-2020'] == client.get('/api/range?start=1990&end=2020').get_json()
+    assert data['trends'] == TRENDS
     
-    finally:
-        # Stop the API server
-        print("\nStopping API server...")
-        api_process.terminate()
-        api_process.wait()
+    data = client.get('/api/batch?queries=range:1990-1991&format=columns').get_json()
+    assert data['range:1990-1991']['year'] == [1990, 1991]
+    
+    for query in ('queries=', 'queries=everything', 'queries=annual&format=packed'):
+        assert client.get(f'/api/batch?{query}').status_code == 400, query
 
-if __name__ == "__main__":
-    main()
+def test_series_endpoint(client):
+    """Test the multi-resolution series endpoint"""
+    response = client.get('/api/series?max_points=200')
+    
+    assert response.status_code == 200
+    data = response.get_json()
+    # The global series has no stored points, so its annual rows serve as the finest level
+    assert data['resolution'] == 'annual' and not data['downsampled']
+    assert len(data['date']) == data['total_points'] == 143
+    
+    # Too many annual points for the budget: the decades fit
+    data = client.get('/api/series?max_points=50').get_json()
+    assert data['resolution'] == 'decadal' and len(data['date']) == 15
+    
+    # A fixed resolution that does not fit is downsampled, keeping both ends
+    data = client.get('/api/series?max_points=50&resolution=annual').get_json()
+    assert data['downsampled'] and len(data['date']) == 50
+    assert data['date'][0] == '1880-01-01' and data['date'][-1] == '2022-01-01'
+    
+    # The missing month is skipped, not stored as -999
+    data = client.get(f'/api/series?series={GAPPY_SERIES}&resolution=monthly').get_json()
+    assert data['date'] == ['1990-01-01', '1990-03-01', '1991-01-01', '1991-12-01']
+    assert data['value'] == [0.5, 1.5, -1.0, 1.0]
+    data = client.get(f'/api/series?series={GAPPY_SERIES}&resolution=annual').get_json()
+    assert data['value'] == [1.0, 0.0] and data['count'] == [2, 2]
+    
+    assert client.get(f'/api/series?series={GAPPY_SERIES}&resolution=daily').status_code == 404
+    for query in ('max_points=0', 'max_points=100000', 'max_points=abc', 'max_points=',
+                  'resolution=hourly', 'start=1990-13', 'end=90'):
+        assert client.get(f'/api/series?{query}').status_code == 400, query
+
+def test_catalog_endpoint(client):
+    """Test the series catalog endpoint"""
+    response = client.get('/api/catalog')
+    
+    assert response.status_code == 200
+    entries = {entry['id']: entry for entry in response.get_json()['series']}
+    assert set(entries) == {'global', GAPPY_SERIES}
+    assert (entries['global']['start_year'], entries['global']['end_year'], entries['global']['records']) == (1880, 2022, 143)
+    assert 'monthly' in entries[GAPPY_SERIES]['resolutions']
+
+def test_compression(client):
+    """Test content encoding negotiation on the annual endpoint"""
+    plain = client.get('/api/annual')
+    response = client.get('/api/annual', headers={'Accept-Encoding': 'gzip'})
+    
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == plain.data
+    assert response.headers['ETag'] != plain.headers['ETag']
+    
+    if 'br' in ENCODINGS:
+        import brotli
+        response = client.get('/api/annual', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.data) == plain.data
+    
+    # Small bodies are sent as they are
+    response = client.get('/api/range?start=2000&end=2000', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    
+    # Compressed bodies are cached apart from the memoized results
+    memo_entries = client.get('/api/cache').get_json()['memo']['entries']
+    client.get('/api/aggregate?bucket=7', headers={'Accept-Encoding': 'gzip'})
+    stats = client.get('/api/cache').get_json()
+    assert stats['memo']['entries'] == memo_entries + 1
+    assert stats['compressed']['entries'] >= 1
+    
+    # Repeating the request reuses its compressed body; each format has its own
+    client.get('/api/aggregate?bucket=7', headers={'Accept-Encoding': 'gzip'})
+    assert client.get('/api/cache').get_json()['compressed']['hits'] == stats['compressed']['hits'] + 1
+    columns = client.get('/api/annual', headers={'Accept-Encoding': 'gzip', 'Accept': MEDIA_TYPES['columns']})
+    assert gzip.decompress(columns.data) == client.get('/api/annual', headers={'Accept': MEDIA_TYPES['columns']}).data
+    assert gzip.decompress(columns.data) != plain.data
+
+def test_admission_control(client, monkeypatch):
+    """Test that rate-limited and shed requests are told when to retry"""
+    monkeypatch.setattr(api, 'rate_limiter', RateLimiter(rate=0.5, burst=2))
+    statuses = [client.get('/api/annual').status_code for _ in range(3)]
+    
+    assert statuses == [200, 200, 429]
+    response = client.get('/api/annual')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    # Probes are never limited
+    api.warm_up()
+    assert client.get('/ready').status_code == 200
+    
+    monkeypatch.setattr(api, 'rate_limiter', None)
+    monkeypatch.setattr(api, 'shedder', LoadShedder(0))
+    monkeypatch.setitem(api.app.config, 'SHED_LOAD', True)
+    response = client.get('/api/annual')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert client.get('/metrics').status_code == 200
+    
+    # Requests that waited too long since the proxy stamped them are shed too,
+    # but a client's own X-Request-Start is ignored without a trusted proxy
+    monkeypatch.setitem(api.app.config, 'SHED_LOAD', False)
+    monkeypatch.setattr(api, 'MAX_QUEUE_MS', 1000)
+    stale = {'X-Request-Start': f't={time.time() - 5:.3f}'}
+    assert client.get('/api/annual', headers=stale).status_code == 200
+    monkeypatch.setattr(api, 'TRUSTED_PROXIES', 1)
+    assert client.get('/api/annual', headers=stale).status_code == 503
+    assert client.get('/api/annual', headers={'X-Request-Start': f't={int(time.time() * 1e6)}'}).status_code == 200
+    
+    # Behind a trusted proxy every forwarded client address has its own bucket
+    monkeypatch.setattr(api, 'rate_limiter', RateLimiter(rate=0.5, burst=1))
+    monkeypatch.setattr(api.app, 'wsgi_app', ProxyFix(api.app.wsgi_app, x_for=1))
+    for address in ('203.0.113.1', '203.0.113.2'):
+        assert client.get('/api/annual', headers={'X-Forwarded-For': address}).status_code == 200
+    assert client.get('/api/annual', headers={'X-Forwarded-For': '203.0.113.1'}).status_code == 429
+
+def test_coalescing(client, monkeypatch):
+    """Test that concurrent identical requests share one computation"""
+    calls = []
+    aggregate = api.aggregate
+    
+    def slow_aggregate(*args):
+        calls.append(args)
+        time.sleep(0.1)
+        return aggregate(*args)
+    
+    monkeypatch.setattr(api, 'aggregate', slow_aggregate)
+    bodies = []
+    threads = [
+        threading.Thread(target=lambda: bodies.append(api.app.test_client().get('/api/aggregate?bucket=13').data))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(calls) == 1
+    assert len(bodies) == 8 and len(set(bodies)) == 1
+
+def test_metrics_endpoint(client):
+    """Test the Prometheus metrics endpoint"""
+    client.get('/api/annual')
+    response = client.get('/metrics')
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert 'climate_requests_total{endpoint="annual_data",status="200"}' in response.text
+    families = [line.split()[2] for line in response.text.splitlines() if line.startswith('# TYPE')]
+    assert len(families) == len(set(families))
+
+def test_conditional_get(client):
+    """Test that a repeated request with the ETag is answered with 304"""
+    response = client.get('/api/annual')
+    etag = response.headers['ETag']
+    
+    response = client.get('/api/annual', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    
+    # A current ETag does not hide an unknown series
+    response = client.get('/api/annual?series=nope', headers={'If-None-Match': etag})
+    assert response.status_code == 404
+    
+    # The ETag of one format does not validate another
+    response = client.get('/api/annual', headers={'If-None-Match': etag, 'Accept': MEDIA_TYPES['columns']})
+    assert response.status_code == 200
+
+def test_conditional_get_validates_parameters(client):
+    """Test that a matching validator does not turn a malformed request into a 304"""
+    response = client.get('/api/range?start=1950&end=2000')
+    etag = response.headers['ETag']
+    response = client.get('/api/range?start=abc&end=2000', headers={'If-None-Match': etag})
+    assert response.status_code == 400
+    
+    response = client.get('/api/aggregate?bucket=7')
+    etag = response.headers['ETag']
+    response = client.get('/api/aggregate?bucket=7', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    response = client.get('/api/aggregate?bucket=0', headers={'If-None-Match': etag})
+    assert response.status_code == 400
+    
+    future = 'Fri, 01 Jan 2100 00:00:00 GMT'
+    response = client.get('/api/aggregate', headers={'If-Modified-Since': future})
+    assert response.status_code == 304
+    for path in ('/api/range?start=abc', '/api/aggregate?bucket=0', '/api/trend?end=x',
+                 '/api/annual?baseline=nope', '/api/series?series=nope'):
+        response = client.get(path, headers={'If-Modified-Since': future})
+        assert response.status_code in (400, 404), path
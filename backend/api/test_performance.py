@@ -0,0 +1,171 @@
+"""
+Performance regression tests
+Every case is run once to warm up, then timed over REPEAT runs, and its
+peak allocation is measured in one more run under tracemalloc. The
+median time and the peak are compared with the baselines stored in
+perf_baselines.json, and the test fails when either has grown beyond its
+tolerance
+
+The baselines are machine-specific, so these tests only run on request;
+the default suite checks behaviour alone
+
+    PERF_TESTS=1 python -m pytest backend/api/test_performance.py
+    PERF_UPDATE_BASELINES=1 python -m pytest backend/api/test_performance.py   # record new baselines
+"""
+
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+
+import pytest
+
+from db import open_read_only
+from resolutions import lttb
+from snapshot import data_version, load_snapshot
+from year_index import YearIndex
+
+# Stored baselines: case -> {'median_ms': ..., 'peak_kb': ...}
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baselines.json')
+
+# Set to record the measured values as the new baselines instead of checking them
+UPDATE_BASELINES = os.environ.get('PERF_UPDATE_BASELINES') == '1'
+
+# Skip the module unless the tests were asked for or baselines are being recorded
+pytestmark = pytest.mark.skipif(
+    os.environ.get('PERF_TESTS') != '1' and not UPDATE_BASELINES,
+    reason='performance tests run with PERF_TESTS=1'
+)
+
+# Timed runs per case
+REPEAT = 15
+
+# Allowed growth over the baseline; timings vary far more between machines
+# than allocations, and sub-millisecond cases get an absolute allowance too
+LATENCY_TOLERANCE = float(os.environ.get('PERF_LATENCY_TOLERANCE', 3.0))
+LATENCY_SLACK_MS = 1.0
+ALLOC_TOLERANCE = float(os.environ.get('PERF_ALLOC_TOLERANCE', 1.5))
+ALLOC_SLACK_KB = 16
+
+# Rows in the synthetic series used for the bulk cases
+LARGE_SIZE = 100000
+
+# Warm requests through the test client; the memo and encoded bodies are filled by the warm-up run
+REQUESTS = [
+    ('annual', '/api/annual', {}),
+    ('annual_gzip', '/api/annual', {'Accept-Encoding': 'gzip'}),
+    ('annual_columns', '/api/annual', {'Accept': 'application/vnd.climate.columns+json'}),
+    ('annual_packed', '/api/annual', {'Accept': 'application/vnd.climate.packed'}),
+    ('range', '/api/range?start=1950&end=2000', {}),
+    ('range_baseline_window', '/api/range?start=1950&end=2000&baseline=1951-1980&window=11', {}),
+    ('trend', '/api/trend?start=1950&end=2000', {}),
+    ('aggregate', '/api/aggregate?bucket=10&agg=std', {}),
+    ('batch', '/api/batch?queries=annual,trends,decades,range:1990-2020', {}),
+    ('series', '/api/series?max_points=100', {}),
+    ('not_modified', '/api/annual', {'If-None-Match': None}),
+]
+
+
+def measure(fn):
+    """Return (median milliseconds, peak allocated kilobytes) of calling fn"""
+    fn()
+    times = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times) * 1000, peak / 1024
+
+@pytest.fixture(scope='session')
+def baselines():
+    """Stored baselines; in update mode the measurements are written back at the end of the session"""
+    stored = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            stored = json.load(f)
+    measured = {}
+    yield stored, measured
+    if UPDATE_BASELINES and measured:
+        stored.update(measured)
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump(dict(sorted(stored.items())), f, indent=2)
+            f.write('\n')
+
+def check(baselines, case, fn):
+    """Measure a case and compare it with its baseline"""
+    stored, measured = baselines
+    median_ms, peak_kb = measure(fn)
+    print(f"{case}: {median_ms:.3f} ms, peak {peak_kb:.1f} KB")
+    if UPDATE_BASELINES:
+        measured[case] = {'median_ms': round(median_ms, 4), 'peak_kb': round(peak_kb, 1)}
+        return
+
+    baseline = stored.get(case)
+    if baseline is None:
+        pytest.skip(f"No baseline for {case}; record one with PERF_UPDATE_BASELINES=1")
+    latency_limit = baseline['median_ms'] * LATENCY_TOLERANCE + LATENCY_SLACK_MS
+    alloc_limit = baseline['peak_kb'] * ALLOC_TOLERANCE + ALLOC_SLACK_KB
+    assert median_ms <= latency_limit, (
+        f"{case} took {median_ms:.3f} ms, baseline {baseline['median_ms']} ms (limit {latency_limit:.3f} ms)")
+    assert peak_kb <= alloc_limit, (
+        f"{case} allocated {peak_kb:.1f} KB, baseline {baseline['peak_kb']} KB (limit {alloc_limit:.1f} KB)")
+
+@pytest.fixture(scope='module')
+def large_rows():
+    """Synthetic (year, anomaly, moving_avg_5yr) rows, NULL at both ends like the real series"""
+    rng = random.Random(42)
+    return [
+        (year, rng.uniform(-1, 1), None if year < 2 or year >= LARGE_SIZE - 2 else rng.uniform(-1, 1))
+        for year in range(LARGE_SIZE)
+    ]
+
+@pytest.mark.parametrize('case, path, headers', REQUESTS, ids=[case for case, _, _ in REQUESTS])
+def test_request(client, baselines, case, path, headers):
+    """Time a warm request"""
+    if 'If-None-Match' in headers:
+        headers = dict(headers, **{'If-None-Match': client.get(path).headers['ETag']})
+    expected = 304 if 'If-None-Match' in headers else 200
+
+    def request():
+        response = client.get(path, headers=headers)
+        assert response.status_code == expected
+
+    check(baselines, f'request_{case}', request)
+
+def test_snapshot_load(database, baselines):
+    """Time loading the test database into a snapshot"""
+    conn = open_read_only(database)
+    try:
+        check(baselines, 'snapshot_load', lambda: load_snapshot(conn, data_version(database)))
+    finally:
+        conn.close()
+
+def test_index_build(large_rows, baselines):
+    """Time building and encoding a large year index"""
+    check(baselines, 'index_build', lambda: YearIndex(large_rows))
+
+def test_index_queries(large_rows, baselines):
+    """Time slicing, a 31-year moving average and a regression over a large year index"""
+    index = YearIndex(large_rows)
+
+    def queries():
+        index.slice_json(0, len(index))
+        index.moving_averages(0, len(index), 31)
+        index.regression(0, len(index))
+
+    check(baselines, 'index_queries', queries)
+
+def test_lttb(large_rows, baselines):
+    """Time downsampling a large series to 1000 points"""
+    xs = [row[0] for row in large_rows]
+    ys = [row[1] for row in large_rows]
+    check(baselines, 'lttb', lambda: lttb(xs, ys, 1000))
@@ -0,0 +1,16 @@
+"""
+WSGI entry point for production servers
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker imports this module before it accepts connections, so the
+snapshot is loaded here (set API_WARM_UP=0 to defer it to the first
+request, or to a background load started by the first /ready probe)
+"""
+
+import os
+
+from app import app, warm_up  # noqa: F401
+
+if os.environ.get('API_WARM_UP', '1') != '0':
+    warm_up()
@@ -0,0 +1,133 @@
+"""
+Columnar index of the annual series
+Maps a year straight to an array offset so range queries are answered by
+slicing one buffer of pre-encoded JSON rows, and keeps cumulative sums so
+range means, moving averages of any window and least-squares trends of
+any sub-range cost O(1)
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+from serialize import encode_rows
+
+# Year subtracted from x in the regression sums, keeping them small
+SUMS_ORIGIN_YEAR = 2000
+
+
+def cumulative_sums(years, anomalies):
+    """Return running (n, sum_x, sum_y, sum_xx, sum_xy, sum_yy) tuples, one per row"""
+    n = 0
+    sum_x = sum_y = sum_xx = sum_xy = sum_yy = 0.0
+    sums = []
+    for year, anomaly in zip(years, anomalies):
+        x = year - SUMS_ORIGIN_YEAR
+        n += 1
+        sum_x += x
+        sum_y += anomaly
+        sum_xx += x * x
+        sum_xy += x * anomaly
+        sum_yy += anomaly * anomaly
+        sums.append((n, sum_x, sum_y, sum_xx, sum_xy, sum_yy))
+    return sums
+
+
+class YearIndex:
+    """Years, anomalies and moving averages stored as parallel arrays"""
+
+    def __init__(self, rows):
+        # rows are (year, anomaly, moving_avg_5yr) tuples ordered by year
+        # (zip(*rows) would build one argument tuple per row, which is slower)
+        years = [row[0] for row in rows]
+        anomalies = [row[1] for row in rows]
+        moving_avgs = [row[2] for row in rows]
+        self.years = array('i', years)
+        self.anomalies = array('d', anomalies)
+        # Kept as a list because the leading/trailing moving averages are NULL
+        self.moving_avgs = moving_avgs
+
+        # Every row encoded once, column by column; requests slice the buffer.
+        # The raw values are encoded so integral anomalies keep their SQLite type.
+        self.buffer, self.row_offsets = encode_rows(years, anomalies, moving_avgs)
+
+        self.first_year = self.years[0] if rows else 0
+        self.last_year = self.years[-1] if rows else -1
+        # With no gaps the offset of a year is simply year - first_year
+        self.dense = len(self.years) == self.last_year - self.first_year + 1
+
+        # prefix[i] sums the first i anomalies (prefix_x, prefix_xx, ... likewise),
+        # so a range [lo, hi) sums to prefix[hi] - prefix[lo]
+        sums = cumulative_sums(years, anomalies)
+        self.prefix_x = array('d', [0.0] + [row[1] for row in sums])
+        self.prefix = array('d', [0.0] + [row[2] for row in sums])
+        self.prefix_xx = array('d', [0.0] + [row[3] for row in sums])
+        self.prefix_xy = array('d', [0.0] + [row[4] for row in sums])
+        self.prefix_yy = array('d', [0.0] + [row[5] for row in sums])
+
+    def __len__(self):
+        return len(self.years)
+
+    def offsets(self, start_year, end_year):
+        """Return the [lo, hi) offsets of the years within start_year..end_year"""
+        if self.dense:
+            lo = min(max(start_year - self.first_year, 0), len(self.years))
+            hi = min(max(end_year - self.first_year + 1, 0), len(self.years))
+        else:
+            lo = bisect_left(self.years, start_year)
+            hi = bisect_right(self.years, end_year)
+        return lo, max(lo, hi)
+
+    def mean(self, lo, hi):
+        """Return the mean anomaly of the rows [lo, hi), which must not be empty"""
+        return (self.prefix[hi] - self.prefix[lo]) / (hi - lo)
+
+    def moving_averages(self, lo, hi, window):
+        """Return centred window-row moving averages of rows [lo, hi), like pandas rolling(center=True)
+
+        None where the window runs past either end of the data.
+        """
+        prefix = self.prefix
+        count = len(self.years)
+        averages = []
+        for i in range(lo, hi):
+            start = i - window // 2
+            end = start + window
+            averages.append((prefix[end] - prefix[start]) / window if start >= 0 and end <= count else None)
+        return averages
+
+    def regression(self, lo, hi):
+        """Return (slope, intercept, r_squared) of the least-squares line through rows [lo, hi)
+
+        The intercept is at year 0, as from numpy.polyfit(years, anomalies, 1).
+        Needs at least two rows; r_squared is None when the anomalies are constant.
+        """
+        n = hi - lo
+        sum_x = self.prefix_x[hi] - self.prefix_x[lo]
+        sum_y = self.prefix[hi] - self.prefix[lo]
+        # Centred sums of squares and cross-products
+        sxx = (self.prefix_xx[hi] - self.prefix_xx[lo]) - sum_x * sum_x / n
+        sxy = (self.prefix_xy[hi] - self.prefix_xy[lo]) - sum_x * sum_y / n
+        syy = (self.prefix_yy[hi] - self.prefix_yy[lo]) - sum_y * sum_y / n
+        slope = sxy / sxx
+        intercept = (sum_y - slope * sum_x) / n - slope * SUMS_ORIGIN_YEAR
+        r_squared = sxy * sxy / (sxx * syy) if syy > 0 else None
+        return slope, intercept, r_squared
+
+    def rows(self, start_year, end_year):
+        """Return (year, anomaly, moving_avg_5yr) tuples within the range"""
+        lo, hi = self.offsets(start_year, end_year)
+        return list(zip(self.years[lo:hi], self.anomalies[lo:hi], self.moving_avgs[lo:hi]))
+
+    def slice_json(self, lo, hi):
+        """Return the JSON array of the rows [lo, hi) as a single copy of the buffer"""
+        if lo >= hi:
+            return b'[]'
+        return b'[' + self.buffer[self.row_offsets[lo]:self.row_offsets[hi] - 1] + b']'
+
+    def range_json(self, start_year, end_year):
+        """Return the JSON array of rows within the range without building dicts"""
+        return self.slice_json(*self.offsets(start_year, end_year))
+
+    def all_json(self):
+        """Return the JSON array of every row"""
+        return self.slice_json(0, len(self.years))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for /api/range
+Compares the original per-request SQL query + dict loop against the
+in-memory year index over many random year ranges
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from db import default_db_path  # noqa: E402
+from serialize import encode_json  # noqa: E402
+from snapshot import DEFAULT_SERIES, data_version, load_snapshot  # noqa: E402
+
+# Default database path, resolved like the API's (CLIMATE_DB_PATH overrides it)
+DB_PATH = default_db_path()
+
+def sql_range(db_path, series_id, start_year, end_year):
+    """Original range_data() path: connect, query, build dicts, serialize"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    annual_temps = conn.execute(
+        'SELECT * FROM annual_temperatures WHERE series_id = ? AND year >= ? AND year <= ? ORDER BY year',
+        (series_id, start_year, end_year)
+    ).fetchall()
+    conn.close()
+
+    result = []
+    for row in annual_temps:
+        result.append({
+            'year': row['year'],
+            'anomaly': row['anomaly'],
+            'moving_avg_5yr': row['moving_avg_5yr']
+        })
+    return encode_json(result)
+
+def random_ranges(first_year, last_year, count, seed):
+    """Generate reproducible random (start, end) year pairs"""
+    rng = random.Random(seed)
+    ranges = []
+    for _ in range(count):
+        a = rng.randint(first_year, last_year)
+        b = rng.randint(first_year, last_year)
+        ranges.append((min(a, b), max(a, b)))
+    return ranges
+
+def run(label, fn, ranges):
+    """Time fn over all ranges and print per-call statistics"""
+    start = time.perf_counter()
+    total_bytes = 0
+    for start_year, end_year in ranges:
+        total_bytes += len(fn(start_year, end_year))
+    elapsed = time.perf_counter() - start
+    per_call_us = elapsed / len(ranges) * 1e6
+    print(f"{label:<12} {elapsed:8.3f}s total  {per_call_us:9.1f} us/call  {total_bytes / 1e6:8.2f} MB")
+    return elapsed
+
+def main():
+    """Run both paths and report the speedup"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=DB_PATH, help='path to climate_data.db')
+    parser.add_argument('--ranges', type=int, default=5000, help='number of random ranges')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--series', default=DEFAULT_SERIES, help='series to query')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    snapshot = load_snapshot(conn, data_version(args.db))
+    conn.close()
+
+    series = snapshot.series[args.series]
+    index = series.index
+    print(f"Annual records: {len(index)} ({index.first_year}-{index.last_year}), dense={index.dense}")
+    ranges = random_ranges(index.first_year, index.last_year, args.ranges, args.seed)
+
+    # Both paths must produce identical bodies
+    for start_year, end_year in ranges[:100]:
+        assert sql_range(args.db, args.series, start_year, end_year) == series.range_json(start_year, end_year)
+
+    print(f"\n{args.ranges} random ranges:")
+    sql_time = run('sql', lambda s, e: sql_range(args.db, args.series, s, e), ranges)
+    index_time = run('year index', series.range_json, ranges)
+    print(f"\nSpeedup: {sql_time / index_time:.1f}x")
+
+if __name__ == '__main__':
+    main()
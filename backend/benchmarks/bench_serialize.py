@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark for encoding the annual rows
+Times serialize.encode_rows, which YearIndex calls once per series to
+build its buffer of rows and their offsets, against the simpler single
+encoder call over a list of row dicts, with and without recovering the
+same row offsets from its output. Each is run with orjson (when
+installed) and with the stdlib json module, on synthetic columns of
+increasing size
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+from itertools import accumulate
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import serialize  # noqa: E402
+
+# Series lengths benchmarked by default
+SIZES = (10**3, 10**4, 10**5, 10**6)
+
+# Leading/trailing years without a centred 5-year moving average
+MOVING_AVG_EDGE = 2
+
+
+def build_columns(size, seed):
+    """Return years, anomalies and moving averages of a synthetic series with size rows"""
+    rng = random.Random(seed)
+    years = list(range(size))
+    anomalies = [rng.uniform(-1, 1) for _ in years]
+    moving_avgs = [None if year < MOVING_AVG_EDGE or year >= size - MOVING_AVG_EDGE else rng.uniform(-1, 1)
+                   for year in years]
+    return years, anomalies, moving_avgs
+
+def encode_rows(years, anomalies, moving_avgs):
+    """serialize.encode_rows: one encoder call per column, rows spliced into one buffer"""
+    return serialize.encode_rows(years, anomalies, moving_avgs)
+
+def dumps(years, anomalies, moving_avgs):
+    """One encoder call over a list of row dicts; the body has no row offsets"""
+    return serialize.encode_json([
+        {'year': year, 'anomaly': anomaly, 'moving_avg_5yr': moving_avg}
+        for year, anomaly, moving_avg in zip(years, anomalies, moving_avgs)
+    ])
+
+def dumps_offsets(years, anomalies, moving_avgs):
+    """One encoder call, then the row offsets YearIndex needs recovered from the body"""
+    buffer = dumps(years, anomalies, moving_avgs)[1:-1]
+    # Numbers and null never contain '},{', so the split finds every row boundary
+    lengths = [len(part) + 3 for part in buffer.split(b'},{')]
+    lengths[0] -= 1
+    lengths[-1] -= 1
+    return buffer, array('q', accumulate(lengths, initial=0))
+
+def best_of(fn, columns, repeat):
+    """Return the fastest of repeat runs in seconds, and the result of the last run"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*columns)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    """Time every encoder at every size and report how encode_rows compares"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='series lengths to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement (best is reported)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    orjson = serialize.orjson
+    encoders = [('orjson ' + orjson.__version__, orjson)] if orjson else []
+    encoders.append(('json (stdlib)', None))
+    paths = [('encode_rows', encode_rows), ('dumps', dumps), ('dumps+offsets', dumps_offsets)]
+
+    print(f"{'encoder':<15} {'rows':>9}" + ''.join(f"{label:>16}" for label, _ in paths)
+          + f"{'vs dumps':>10}{'vs offsets':>12}")
+    for size in args.sizes:
+        columns = build_columns(size, args.seed)
+        for name, encoder in encoders:
+            serialize.orjson = encoder
+            times = []
+            results = []
+            for _, fn in paths:
+                elapsed, result = best_of(fn, columns, args.repeat)
+                times.append(elapsed)
+                results.append(result)
+            serialize.orjson = orjson
+
+            # Both ways must produce the same rows and offsets
+            buffer, offsets = results[0]
+            assert results[1] == b'[' + buffer + b']', f"bodies differ at {size} rows"
+            assert results[2] == (buffer, offsets), f"offsets differ at {size} rows"
+            print(f"{name:<15} {size:>9}" + ''.join(f"{elapsed * 1e3:>13.1f} ms" for elapsed in times)
+                  + f"{times[1] / times[0]:>9.2f}x{times[2] / times[0]:>11.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the API
+Profiles the import of app.py with -X importtime, checks that no heavy
+data-processing packages are pulled in, and measures how long a gunicorn
+worker takes to become ready with and without the boot-time warm-up
+"""
+
+import argparse
+import http.client
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+
+# Directory holding app.py and wsgi.py
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+
+sys.path.insert(0, API_DIR)
+
+from db import default_db_path  # noqa: E402
+
+# Default database path, resolved like the API's (CLIMATE_DB_PATH overrides it)
+DB_PATH = default_db_path()
+
+# Packages the request-serving path must not import
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib')
+
+# Seconds to wait for a server to answer before giving up
+STARTUP_TIMEOUT = 30.0
+
+def import_profile(db_path):
+    """Import app in a fresh interpreter and return [(module, self_us, cumulative_us, depth)]"""
+    env = dict(os.environ, CLIMATE_DB_PATH=db_path)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=API_DIR, env=env, capture_output=True, text=True, check=True)
+    profile = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        profile.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return profile
+
+def report_imports(profile, top):
+    """Print the slowest imports and return the heavy modules that were imported"""
+    end = next(i for i, entry in enumerate(profile) if entry[0] == 'app' and entry[3] == 0)
+    total = profile[end][2]
+    print(f"import app: {total / 1000:.1f} ms")
+    
+    # Children are listed before their parent, back to the previous top-level import
+    start = end
+    while start > 0 and profile[start - 1][3] > 0:
+        start -= 1
+    own = profile[start:end]
+    direct = sorted((p for p in own if p[3] == 1), key=lambda p: p[2], reverse=True)
+    print(f"\nDirect imports of app.py (top {top}):")
+    for name, _, cumulative, _ in direct[:top]:
+        print(f"  {name:<30} {cumulative / 1000:8.1f} ms  {cumulative / total * 100:5.1f}%")
+    
+    slowest = sorted(own + [profile[end]], key=lambda p: p[1], reverse=True)
+    print(f"\nSlowest modules by self time (top {top}):")
+    for name, self_us, _, _ in slowest[:top]:
+        print(f"  {name:<30} {self_us / 1000:8.1f} ms")
+    
+    loaded = {name.split('.')[0] for name, _, _, _ in own}
+    return [name for name in HEAVY_MODULES if name in loaded]
+
+def get(port, path):
+    """Issue one GET and return the status code"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+def time_boot(db_path, port, warm_up):
+    """Start one gunicorn worker and time the first response and the first data request"""
+    env = dict(os.environ, CLIMATE_DB_PATH=db_path, API_ACCESS_LOG='',
+               API_WARM_UP='1' if warm_up else '0')
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{port}', '--workers', '1', 'wsgi:app']
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=API_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if time.perf_counter() - started > STARTUP_TIMEOUT or process.poll() is not None:
+                raise RuntimeError('server did not start')
+            try:
+                if get(port, '/') == 200:
+                    break
+            except OSError:
+                time.sleep(0.005)
+        accepting = time.perf_counter() - started
+        
+        request_started = time.perf_counter()
+        status = get(port, '/api/annual')
+        first_request = time.perf_counter() - request_started
+        if status != 200:
+            raise RuntimeError(f'/api/annual returned {status}')
+        return accepting, first_request
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    """Run the import profile and the boot timings"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=DB_PATH, help='path to climate_data.db')
+    parser.add_argument('--top', type=int, default=10, help='modules listed per table')
+    parser.add_argument('--runs', type=int, default=3, help='boots per warm-up setting')
+    parser.add_argument('--port', type=int, default=5056)
+    args = parser.parse_args()
+    args.db = os.path.abspath(args.db)
+    
+    heavy = report_imports(import_profile(args.db), args.top)
+    
+    if importlib.util.find_spec('gunicorn') is None:
+        print("\ngunicorn is not installed; skipping boot timings")
+    else:
+        print(f"\nWorker boot, best of {args.runs} (accepting = first response to /):")
+        for warm_up in (False, True):
+            timings = [time_boot(args.db, args.port, warm_up) for _ in range(args.runs)]
+            accepting = min(t[0] for t in timings)
+            first_request = min(t[1] for t in timings)
+            label = 'warm-up at boot' if warm_up else 'lazy load'
+            print(f"  {label:<16} accepting after {accepting * 1000:7.1f} ms, "
+                  f"first /api/annual {first_request * 1000:7.1f} ms")
+    
+    if heavy:
+        print(f"\n✗ app.py imports heavy packages: {', '.join(heavy)}")
+        sys.exit(1)
+    print(f"\n✓ None of {', '.join(HEAVY_MODULES)} imported by app.py")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Load test for the API server modes
+Starts the API under each mode, drives every endpoint with a fixed number
+of requests from concurrent keep-alive clients and reports requests per
+second and p50/p95/p99 latency
+
+Modes:
+  single  gunicorn, 1 worker, 1 thread
+  multi   gunicorn, --workers processes with 4 threads each
+  cached  as multi, but clients revalidate with If-None-Match (304s)
+  asgi    uvicorn running asgi.py with --workers processes
+"""
+
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+# Directory holding app.py, wsgi.py and asgi.py
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+
+sys.path.insert(0, API_DIR)
+
+from db import default_db_path  # noqa: E402
+
+# Default database path, resolved like the API's (CLIMATE_DB_PATH overrides it)
+DB_PATH = default_db_path()
+
+# Modes run when --modes is not given
+MODES = ['single', 'multi', 'cached', 'asgi']
+
+# Seconds to wait for a server to answer before giving up
+STARTUP_TIMEOUT = 30.0
+
+def server_command(mode, port, workers):
+    """Return the command line that starts the API in a mode"""
+    bind = f'127.0.0.1:{port}'
+    if mode == 'single':
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', bind,
+                '--workers', '1', '--threads', '1', 'wsgi:app']
+    if mode in ('multi', 'cached'):
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', bind,
+                '--workers', str(workers), '--threads', '4', 'wsgi:app']
+    if mode == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1',
+                '--port', str(port), '--workers', str(workers), '--no-access-log']
+    raise ValueError(f"Unknown mode: {mode}")
+
+def mode_available(mode):
+    """Check that the server package a mode needs is installed"""
+    needed = ['uvicorn', 'a2wsgi'] if mode == 'asgi' else ['gunicorn']
+    return all(importlib.util.find_spec(name) for name in needed)
+
+def start_server(mode, port, workers, db_path):
+    """Start the API in a mode and wait until it answers"""
+    env = dict(os.environ, CLIMATE_DB_PATH=db_path, API_ACCESS_LOG='')
+    process = subprocess.Popen(server_command(mode, port, workers), cwd=API_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} server exited with status {process.returncode}")
+        try:
+            status, _, _ = fetch(http.client.HTTPConnection('127.0.0.1', port, timeout=5), '/')
+            if status == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f"{mode} server did not start within {STARTUP_TIMEOUT:.0f}s")
+
+def stop_server(process):
+    """Stop a server started by start_server"""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def fetch(conn, path, headers=None):
+    """Issue a GET on a keep-alive connection and return (status, etag, body size)"""
+    conn.request('GET', path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    return response.status, response.getheader('ETag'), len(body)
+
+def endpoint_paths(first_year, last_year, count, seed):
+    """Build the reproducible request paths for each endpoint"""
+    rng = random.Random(seed)
+    ranges = []
+    for _ in range(count):
+        a = rng.randint(first_year, last_year)
+        b = rng.randint(first_year, last_year)
+        ranges.append(f'/api/range?start={min(a, b)}&end={max(a, b)}')
+    return {
+        'annual': ['/api/annual'] * count,
+        'trends': ['/api/trends'] * count,
+        'decades': ['/api/decades'] * count,
+        'range': ranges,
+        'aggregate': [f'/api/aggregate?bucket={rng.choice((5, 10, 20, 30))}' for _ in range(count)],
+    }
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return float('nan')
+    rank = max(1, round(fraction * len(sorted_values) + 0.5))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def run_endpoint(port, paths, concurrency, revalidate):
+    """Send every path from concurrent clients and return the timing summary"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    next_path = iter(paths)
+    etags = {}
+    
+    def client():
+        nonlocal errors
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local, local_errors = [], 0
+        while True:
+            with lock:
+                path = next(next_path, None)
+            if path is None:
+                break
+            headers = {'If-None-Match': etags[path]} if revalidate and path in etags else None
+            start = time.perf_counter()
+            try:
+                status, etag, _ = fetch(conn, path, headers)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                local_errors += 1
+                continue
+            local.append(time.perf_counter() - start)
+            if status not in (200, 304):
+                local_errors += 1
+            elif revalidate and etag:
+                etags.setdefault(path, etag)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+    
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    return {
+        'requests': len(paths),
+        'errors': errors,
+        'rps': len(paths) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+def run_mode(mode, args, paths):
+    """Start the server in one mode, load every endpoint and return the results"""
+    process = start_server(mode, args.port, args.workers, args.db)
+    try:
+        results = {}
+        for name, endpoint_paths_ in paths.items():
+            # Warm up every worker's snapshot and memo; in cached mode the timed run collects
+            # each path's ETag on its first fetch and revalidates after that
+            run_endpoint(args.port, endpoint_paths_[:args.concurrency * 4], args.concurrency, False)
+            results[name] = run_endpoint(args.port, endpoint_paths_, args.concurrency,
+                                         revalidate=(mode == 'cached'))
+            print_row(mode, name, results[name])
+        return results
+    finally:
+        stop_server(process)
+
+def print_row(mode, endpoint, result):
+    """Print one line of the results table"""
+    print(f"{mode:<8} {endpoint:<10} {result['rps']:9.1f} {result['p50_ms']:8.2f} "
+          f"{result['p95_ms']:8.2f} {result['p99_ms']:8.2f} {result['errors']:6d}")
+
+def year_span(db_path):
+    """Return the first and last year of the default series"""
+    import sqlite3
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        return conn.execute(
+            "SELECT MIN(year), MAX(year) FROM annual_temperatures WHERE series_id = 'global'"
+        ).fetchone()
+    finally:
+        conn.close()
+
+def main():
+    """Run the load test across the selected modes"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default=DB_PATH, help='path to climate_data.db')
+    parser.add_argument('--modes', default=','.join(MODES), help='comma-separated modes to run')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--workers', type=int, default=4, help='worker processes for multi-worker modes')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+    args.db = os.path.abspath(args.db)
+    
+    first_year, last_year = year_span(args.db)
+    paths = endpoint_paths(first_year, last_year, args.requests, args.seed)
+    
+    print(f"{args.requests} requests per endpoint, {args.concurrency} clients, "
+          f"{args.workers} workers in multi-worker modes\n")
+    print(f"{'mode':<8} {'endpoint':<10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    results = {}
+    for mode in args.modes.split(','):
+        if not mode_available(mode):
+            print(f"{mode:<8} skipped (server package not installed)")
+            continue
+        results[mode] = run_mode(mode, args, paths)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': {'requests': args.requests, 'concurrency': args.concurrency,
+                                    'workers': args.workers, 'seed': args.seed},
+                       'results': results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+if __name__ == '__main__':
+    main()
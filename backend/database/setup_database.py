@@ -2,102 +2,300 @@
 """
 Setup SQLite database for climate data
 Creates database schema and imports processed data
+
+Full imports are built in a new generation file next to DB_PATH, starting
+from a copy of the current data, and swapped in by atomically replacing
+DB_PATH with a symlink to it. The API keeps serving the previous
+generation until the swap and never sees a half-built database.
+Incremental updates are applied in place, in a single transaction.
 """
 
+import argparse
+import math
+from datetime import date
 import sqlite3
+import time
 import pandas as pd
 import json
 import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from db import default_db_path  # noqa: E402
 
-# Database file path
-DB_PATH = '/home/ubuntu/climate_app/backend/database/climate_data.db'
+# Database file path, the one the API reads (CLIMATE_DB_PATH overrides it)
+DB_PATH = default_db_path()
 
 # Processed data paths
 ANNUAL_DATA_PATH = '/home/ubuntu/climate_app/data/processed/annual_temperatures.csv'
 TRENDS_PATH = '/home/ubuntu/climate_app/data/processed/temperature_trends.json'
 DECADAL_PATH = '/home/ubuntu/climate_app/data/processed/decadal_averages.json'
 
-def create_database():
+# Series the single-dataset paths above are imported as
+DEFAULT_SERIES = 'global'
+
+# File names process_data.py writes for each series (used with --series-dir)
+ANNUAL_FILE = 'annual_temperatures.csv'
+TRENDS_FILE = 'temperature_trends.json'
+DECADAL_FILE = 'decadal_averages.json'
+SERIES_INFO_FILE = 'series.json'
+
+# Tables that were keyed by year/decade/id alone before series were introduced
+SINGLE_SERIES_TABLES = ('annual_temperatures', 'decadal_averages', 'temperature_trends')
+
+# Trends columns after series_id, in insert order
+TRENDS_COLUMNS = '''start_year, end_year, trend_per_decade, warming_since_preindustrial,
+        pre_industrial_avg, early_20th_century_avg, late_20th_century_avg,
+        twentyfirst_century_avg, warmest_year, warmest_year_anomaly,
+        coldest_year, coldest_year_anomaly'''
+
+# Resolutions stored in series_points, finest first
+POINT_RESOLUTIONS = ('daily', 'monthly', 'annual', 'decadal')
+
+# Base resolutions that --points imports, and the date columns that precede
+# the anomaly in each whitespace-delimited NOAA file
+POINT_DATE_COLUMNS = {
+    'monthly': ['year', 'month'],
+    'daily': ['year', 'month', 'day']
+}
+
+# SQL expression for the start date of the period each base row rolls up into
+ROLLUP_PERIODS = {
+    'monthly': "substr(period_start, 1, 7) || '-01'",
+    'annual': "substr(period_start, 1, 4) || '-01-01'",
+    'decadal': "printf('%04d-01-01', CAST(substr(period_start, 1, 4) AS INTEGER) / 10 * 10)"
+}
+
+# Anomaly NOAA writes for periods without data
+MISSING_VALUE = -999.0
+
+# Previous generations kept after a swap (readers may still be finishing on them)
+KEEP_GENERATIONS = 1
+
+def create_database(path=None):
     """Create the SQLite database and tables"""
-    print(f"Creating database at {DB_PATH}...")
+    path = path or DB_PATH
+    print(f"Creating database at {path}...")
     
     # Connect to database (will create it if it doesn't exist)
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(path)
     cursor = conn.cursor()
     
+    # WAL lets the API's read-only connections keep reading while data is imported
+    cursor.execute('PRAGMA journal_mode=WAL')
+    
+    # Databases created before series were introduced are migrated below
+    legacy = rename_single_series_tables(conn)
+    # Trends tables created before the period averages were nullable are rebuilt below
+    strict_trends = rename_strict_trends_table(conn)
+    
     # Create tables
     print("Creating tables...")
     
+    # Every table is keyed by series and clustered on its primary key (WITHOUT ROWID),
+    # so the primary key B-tree is itself the covering index for per-series lookups
+    
+    # Series catalogue
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS series (
+        series_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT
+    ) WITHOUT ROWID
+    ''')
+    
     # Annual temperature data table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS annual_temperatures (
-        year INTEGER PRIMARY KEY,
+        series_id TEXT NOT NULL,
+        year INTEGER NOT NULL,
         anomaly REAL NOT NULL,
-        moving_avg_5yr REAL
-    )
+        moving_avg_5yr REAL,
+        PRIMARY KEY (series_id, year)
+    ) WITHOUT ROWID
     ''')
     
     # Decadal averages table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS decadal_averages (
-        decade TEXT PRIMARY KEY,
-        average REAL NOT NULL
-    )
+        series_id TEXT NOT NULL,
+        decade TEXT NOT NULL,
+        average REAL NOT NULL,
+        PRIMARY KEY (series_id, decade)
+    ) WITHOUT ROWID
     ''')
     
-    # Temperature trends and statistics table
+    # Temperature trends and statistics table; the period averages (and the
+    # warming derived from them) are NULL for periods a series does not reach
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS temperature_trends (
-        id INTEGER PRIMARY KEY,
+        series_id TEXT PRIMARY KEY,
         start_year INTEGER NOT NULL,
         end_year INTEGER NOT NULL,
         trend_per_decade REAL NOT NULL,
-        warming_since_preindustrial REAL NOT NULL,
-        pre_industrial_avg REAL NOT NULL,
-        early_20th_century_avg REAL NOT NULL,
-        late_20th_century_avg REAL NOT NULL,
-        twentyfirst_century_avg REAL NOT NULL,
+        warming_since_preindustrial REAL,
+        pre_industrial_avg REAL,
+        early_20th_century_avg REAL,
+        late_20th_century_avg REAL,
+        twentyfirst_century_avg REAL,
         warmest_year INTEGER NOT NULL,
         warmest_year_anomaly REAL NOT NULL,
         coldest_year INTEGER NOT NULL,
         coldest_year_anomaly REAL NOT NULL
-    )
+    ) WITHOUT ROWID
+    ''')
+    
+    # Multi-resolution series: base rows (daily or monthly) and their rollups.
+    # period_start is the ISO date of the first day of the period; count is
+    # the number of base rows averaged into the value.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS series_points (
+        series_id TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        period_start TEXT NOT NULL,
+        value REAL NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (series_id, resolution, period_start)
+    ) WITHOUT ROWID
     ''')
     
+    # The API computes its running sums from the annual rows when it loads
+    # them; a table of stored sums from earlier versions is no longer read
+    cursor.execute('DROP TABLE IF EXISTS annual_cumulative_sums')
+    
+    if legacy:
+        copy_single_series_tables(conn)
+    if strict_trends:
+        conn.execute(f'''
+        INSERT INTO temperature_trends (series_id, {TRENDS_COLUMNS})
+        SELECT series_id, {TRENDS_COLUMNS} FROM temperature_trends_strict
+        ''')
+        conn.execute('DROP TABLE temperature_trends_strict')
+    
     conn.commit()
     return conn
 
-def import_annual_data(conn):
+def rename_single_series_tables(conn):
+    """Move tables in the old single-series layout aside; returns True if there were any"""
+    columns = [column[1] for column in conn.execute('PRAGMA table_info(annual_temperatures)')]
+    if not columns or 'series_id' in columns:
+        return False
+    
+    print(f"Migrating single-series tables to series '{DEFAULT_SERIES}'...")
+    for table in SINGLE_SERIES_TABLES:
+        conn.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+    return True
+
+def rename_strict_trends_table(conn):
+    """Move aside a trends table whose period averages are NOT NULL; returns True if there was one"""
+    not_null = {column[1]: column[3] for column in conn.execute('PRAGMA table_info(temperature_trends)')}
+    if not not_null.get('warming_since_preindustrial'):
+        return False
+    
+    print("Migrating temperature_trends to nullable period averages...")
+    conn.execute('ALTER TABLE temperature_trends RENAME TO temperature_trends_strict')
+    return True
+
+def copy_single_series_tables(conn):
+    """Copy rows from the renamed single-series tables into DEFAULT_SERIES"""
+    cursor = conn.cursor()
+    cursor.execute('INSERT OR IGNORE INTO series (series_id, name) VALUES (?, ?)',
+                   (DEFAULT_SERIES, DEFAULT_SERIES))
+    cursor.execute('''
+    INSERT INTO annual_temperatures (series_id, year, anomaly, moving_avg_5yr)
+    SELECT ?, year, anomaly, moving_avg_5yr FROM annual_temperatures_old
+    ''', (DEFAULT_SERIES,))
+    cursor.execute('''
+    INSERT INTO decadal_averages (series_id, decade, average)
+    SELECT ?, decade, average FROM decadal_averages_old
+    ''', (DEFAULT_SERIES,))
+    cursor.execute(f'''
+    INSERT INTO temperature_trends (series_id, {TRENDS_COLUMNS})
+    SELECT ?, {TRENDS_COLUMNS} FROM temperature_trends_old
+    ''', (DEFAULT_SERIES,))
+    for table in SINGLE_SERIES_TABLES:
+        cursor.execute(f'DROP TABLE {table}_old')
+
+def series_paths(directory):
+    """Return the (annual, trends, decadal) processed file paths inside a series directory"""
+    return (
+        os.path.join(directory, ANNUAL_FILE),
+        os.path.join(directory, TRENDS_FILE),
+        os.path.join(directory, DECADAL_FILE)
+    )
+
+def find_series_dirs(root):
+    """Map series id -> directory for every subdirectory holding processed files"""
+    found = {}
+    for name in sorted(os.listdir(root)):
+        directory = os.path.join(root, name)
+        if os.path.isfile(os.path.join(directory, ANNUAL_FILE)):
+            found[name] = directory
+    return found
+
+def register_series(conn, series_id, directory=None):
+    """Add or update a series in the catalogue, using series.json metadata when present"""
+    info = {}
+    if directory is not None:
+        info_path = os.path.join(directory, SERIES_INFO_FILE)
+        if os.path.exists(info_path):
+            with open(info_path, 'r') as f:
+                info = json.load(f)
+    
+    conn.execute('''
+    INSERT INTO series (series_id, name, description) VALUES (?, ?, ?)
+    ON CONFLICT(series_id) DO UPDATE SET name = excluded.name, description = excluded.description
+    ''', (series_id, info.get('name', series_id), info.get('description')))
+
+def read_annual_rows(path=None):
+    """Read the processed annual CSV as (year, anomaly, moving_avg_5yr) tuples"""
+    df = pd.read_csv(path or ANNUAL_DATA_PATH)
+    
+    # Missing moving averages (first and last two years) are stored as NULL
+    return [
+        (int(year), float(anomaly), None if pd.isna(moving_avg) else float(moving_avg))
+        for year, anomaly, moving_avg in df[['year', 'anomaly', 'moving_avg_5yr']].itertuples(index=False)
+    ]
+
+def import_annual_data(conn, series_id=DEFAULT_SERIES, path=None, verbose=True):
     """Import annual temperature data from CSV"""
-    print(f"Importing annual temperature data from {ANNUAL_DATA_PATH}...")
+    path = path or ANNUAL_DATA_PATH
+    if verbose:
+        print(f"Importing annual temperature data from {path}...")
     
-    # Read CSV file
-    df = pd.read_csv(ANNUAL_DATA_PATH)
+    rows = read_annual_rows(path)
     
-    # Insert data into the database
-    df.to_sql('annual_temperatures', conn, if_exists='replace', index=False)
+    # Replace the series' rows but keep the table schema
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM annual_temperatures WHERE series_id = ?', (series_id,))
+    cursor.executemany('''
+    INSERT INTO annual_temperatures (series_id, year, anomaly, moving_avg_5yr)
+    VALUES (?, ?, ?, ?)
+    ''', ((series_id,) + row for row in rows))
     
-    print(f"Imported {len(df)} annual temperature records")
+    if verbose:
+        print(f"Imported {len(rows)} annual temperature records")
+    return len(rows)
 
-def import_trends_data(conn):
+def import_trends_data(conn, series_id=DEFAULT_SERIES, path=None, verbose=True):
     """Import temperature trends data from JSON"""
-    print(f"Importing temperature trends data from {TRENDS_PATH}...")
+    path = path or TRENDS_PATH
+    if verbose:
+        print(f"Importing temperature trends data from {path}...")
     
     # Read JSON file
-    with open(TRENDS_PATH, 'r') as f:
+    with open(path, 'r') as f:
         trends = json.load(f)
     
     # Extract data
     cursor = conn.cursor()
-    cursor.execute('''
-    INSERT OR REPLACE INTO temperature_trends (
-        id, start_year, end_year, trend_per_decade, warming_since_preindustrial,
-        pre_industrial_avg, early_20th_century_avg, late_20th_century_avg, 
-        twentyfirst_century_avg, warmest_year, warmest_year_anomaly,
-        coldest_year, coldest_year_anomaly
-    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    cursor.execute(f'''
+    INSERT OR REPLACE INTO temperature_trends (series_id, {TRENDS_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
-        1,  # id (only one record)
+        series_id,
         trends['data_range']['start_year'],
         trends['data_range']['end_year'],
         trends['trend_per_decade'],
@@ -112,39 +310,321 @@ def import_trends_data(conn):
         trends['extremes']['coldest_year']['anomaly']
     ))
     
-    conn.commit()
-    print("Imported temperature trends data")
+    if verbose:
+        print("Imported temperature trends data")
 
-def import_decadal_data(conn):
+def import_decadal_data(conn, series_id=DEFAULT_SERIES, path=None, verbose=True):
     """Import decadal averages data from JSON"""
-    print(f"Importing decadal averages data from {DECADAL_PATH}...")
+    path = path or DECADAL_PATH
+    if verbose:
+        print(f"Importing decadal averages data from {path}...")
     
     # Read JSON file
-    with open(DECADAL_PATH, 'r') as f:
+    with open(path, 'r') as f:
         decadal_data = json.load(f)
     
     # Extract data
     cursor = conn.cursor()
     
     # Clear existing data
-    cursor.execute('DELETE FROM decadal_averages')
+    cursor.execute('DELETE FROM decadal_averages WHERE series_id = ?', (series_id,))
     
     # Insert new data
-    for decade, avg in zip(decadal_data['decades'], decadal_data['averages']):
-        cursor.execute('''
-        INSERT INTO decadal_averages (decade, average)
-        VALUES (?, ?)
-        ''', (decade, avg))
+    cursor.executemany('''
+    INSERT INTO decadal_averages (series_id, decade, average)
+    VALUES (?, ?, ?)
+    ''', ((series_id, decade, avg) for decade, avg in zip(decadal_data['decades'], decadal_data['averages'])))
     
-    conn.commit()
-    print(f"Imported {len(decadal_data['decades'])} decadal average records")
+    if verbose:
+        print(f"Imported {len(decadal_data['decades'])} decadal average records")
+
+def import_series_dir(conn, root):
+    """Bulk import every series directory under root in a single transaction"""
+    started = time.perf_counter()
+    series_dirs = find_series_dirs(root)
+    print(f"Importing {len(series_dirs)} series from {root}...")
+    
+    annual_count = 0
+    with conn:
+        for series_id, directory in series_dirs.items():
+            annual_path, trends_path, decadal_path = series_paths(directory)
+            register_series(conn, series_id, directory)
+            annual_count += import_annual_data(conn, series_id, annual_path, verbose=False)
+            import_trends_data(conn, series_id, trends_path, verbose=False)
+            import_decadal_data(conn, series_id, decadal_path, verbose=False)
+    
+    print(f"Imported {len(series_dirs)} series ({annual_count} annual records) "
+          f"in {time.perf_counter() - started:.3f}s")
+
+def read_points(path, resolution):
+    """Read a NOAA monthly or daily anomaly file as (period_start, anomaly) tuples"""
+    date_columns = POINT_DATE_COLUMNS[resolution]
+    df = pd.read_csv(path, sep=r'\s+', header=None, usecols=range(len(date_columns) + 1))
+    df.columns = date_columns + ['anomaly']
+    
+    # Periods without data are skipped rather than stored
+    df = df[df['anomaly'] > MISSING_VALUE]
+    if resolution == 'monthly':
+        df['day'] = 1
+    
+    # date() rejects impossible dates such as month 13
+    return [
+        (date(int(year), int(month), int(day)).isoformat(), float(anomaly))
+        for year, month, day, anomaly in df[['year', 'month', 'day', 'anomaly']].itertuples(index=False)
+    ]
+
+def rollup_points(conn, series_id, base):
+    """Recompute every resolution coarser than base as averages of the base rows"""
+    cursor = conn.cursor()
+    for resolution in POINT_RESOLUTIONS[POINT_RESOLUTIONS.index(base) + 1:]:
+        cursor.execute('DELETE FROM series_points WHERE series_id = ? AND resolution = ?',
+                       (series_id, resolution))
+        cursor.execute(f'''
+        INSERT INTO series_points (series_id, resolution, period_start, value, count)
+        SELECT series_id, ?, {ROLLUP_PERIODS[resolution]} AS period, AVG(value), COUNT(*)
+        FROM series_points WHERE series_id = ? AND resolution = ?
+        GROUP BY period
+        ''', (resolution, series_id, base))
+
+def import_points(conn, series_id, path, resolution):
+    """Import monthly or daily base rows for a series and precompute their rollups"""
+    print(f"Importing {resolution} data for series '{series_id}' from {path}...")
+    started = time.perf_counter()
+    
+    rows = read_points(path, resolution)
+    
+    # Replace every resolution of the series, then roll the base rows up again
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT OR IGNORE INTO series (series_id, name) VALUES (?, ?)',
+                       (series_id, series_id))
+        cursor.execute('DELETE FROM series_points WHERE series_id = ?', (series_id,))
+        cursor.executemany('''
+        INSERT INTO series_points (series_id, resolution, period_start, value, count)
+        VALUES (?, ?, ?, ?, 1)
+        ''', ((series_id, resolution) + row for row in rows))
+        rollup_points(conn, series_id, resolution)
+    
+    counts = dict(conn.execute(
+        'SELECT resolution, COUNT(*) FROM series_points WHERE series_id = ? GROUP BY resolution',
+        (series_id,)
+    ).fetchall())
+    levels = ', '.join(f"{counts[resolution]} {resolution}"
+                       for resolution in POINT_RESOLUTIONS if resolution in counts)
+    print(f"Imported {levels} records in {time.perf_counter() - started:.3f}s")
+    return len(rows)
+
+def values_differ(old, new):
+    """Compare stored and incoming values, treating NULLs and float noise correctly"""
+    if old is None or new is None:
+        return old is not new
+    return not math.isclose(old, new, rel_tol=0, abs_tol=1e-9)
+
+def recompute_decades(conn, series_id, decades):
+    """Recompute the decadal averages of a series for the given decade start years"""
+    cursor = conn.cursor()
+    for decade in sorted(decades):
+        label = f"{decade}s"
+        avg = cursor.execute(
+            'SELECT AVG(anomaly) FROM annual_temperatures WHERE series_id = ? AND year >= ? AND year < ?',
+            (series_id, decade, decade + 10)
+        ).fetchone()[0]
+    
+        if avg is None:
+            cursor.execute('DELETE FROM decadal_averages WHERE series_id = ? AND decade = ?',
+                           (series_id, label))
+        else:
+            cursor.execute('''
+            INSERT INTO decadal_averages (series_id, decade, average) VALUES (?, ?, ?)
+            ON CONFLICT(series_id, decade) DO UPDATE SET average = excluded.average
+            ''', (series_id, label, round(avg, 4)))
+
+def recompute_trends(conn, series_id):
+    """Recompute a series' trends row from the annual table (same statistics as process_data.py)"""
+    cursor = conn.cursor()
+    
+    # Least-squares slope from SQL aggregates, with years centred for precision
+    start_year, end_year, n, mean_year, mean_anomaly = cursor.execute(
+        'SELECT MIN(year), MAX(year), COUNT(*), AVG(year), AVG(anomaly) '
+        'FROM annual_temperatures WHERE series_id = ?', (series_id,)
+    ).fetchone()
+    if not n:
+        cursor.execute('DELETE FROM temperature_trends WHERE series_id = ?', (series_id,))
+        return
+    sxx, sxy = cursor.execute('''
+    SELECT SUM((year - ?) * (year - ?)), SUM((year - ?) * (anomaly - ?))
+    FROM annual_temperatures WHERE series_id = ?
+    ''', (mean_year, mean_year, mean_year, mean_anomaly, series_id)).fetchone()
+    slope = sxy / sxx if sxx else 0.0
+    
+    def period_avg(where):
+        return cursor.execute(
+            f'SELECT AVG(anomaly) FROM annual_temperatures WHERE series_id = ? AND {where}',
+            (series_id,)
+        ).fetchone()[0]
+    
+    pre_industrial = period_avg('year < 1900')
+    early_20th = period_avg('year >= 1900 AND year < 1950')
+    late_20th = period_avg('year >= 1950 AND year < 2000')
+    recent = period_avg('year >= 2000')
+    
+    # Ties go to the earliest year, like pandas idxmax/idxmin
+    warmest = cursor.execute(
+        'SELECT year, anomaly FROM annual_temperatures WHERE series_id = ? '
+        'ORDER BY anomaly DESC, year LIMIT 1', (series_id,)
+    ).fetchone()
+    coldest = cursor.execute(
+        'SELECT year, anomaly FROM annual_temperatures WHERE series_id = ? '
+        'ORDER BY anomaly ASC, year LIMIT 1', (series_id,)
+    ).fetchone()
+    
+    def r4(value):
+        return round(value, 4) if value is not None else None
+    
+    cursor.execute(f'''
+    INSERT OR REPLACE INTO temperature_trends (series_id, {TRENDS_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        series_id,
+        start_year,
+        end_year,
+        r4(slope * 10),
+        r4(recent - pre_industrial) if recent is not None and pre_industrial is not None else None,
+        r4(pre_industrial),
+        r4(early_20th),
+        r4(late_20th),
+        r4(recent),
+        warmest[0],
+        r4(warmest[1]),
+        coldest[0],
+        r4(coldest[1])
+    ))
+
+def incremental_update(conn, series_id=DEFAULT_SERIES, path=None):
+    """Upsert only new or changed years and refresh the derived tables they affect"""
+    path = path or ANNUAL_DATA_PATH
+    print(f"Incrementally updating series '{series_id}' from {path}...")
+    started = time.perf_counter()
+    
+    rows = read_annual_rows(path)
+    existing = {
+        year: (anomaly, moving_avg)
+        for year, anomaly, moving_avg in conn.execute(
+            'SELECT year, anomaly, moving_avg_5yr FROM annual_temperatures WHERE series_id = ?',
+            (series_id,)
+        )
+    }
+    
+    # Diff the CSV against the table
+    changed = [
+        row for row in rows
+        if row[0] not in existing
+        or values_differ(existing[row[0]][0], row[1])
+        or values_differ(existing[row[0]][1], row[2])
+    ]
+    incoming_years = {row[0] for row in rows}
+    removed = [(series_id, year) for year in existing if year not in incoming_years]
+    
+    if not changed and not removed:
+        print(f"No changes found ({time.perf_counter() - started:.3f}s)")
+        return 0
+    
+    affected_decades = {year // 10 * 10 for year, _, _ in changed}
+    affected_decades.update(year // 10 * 10 for _, year in removed)
+    
+    # Everything is applied in a single transaction
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT OR IGNORE INTO series (series_id, name) VALUES (?, ?)',
+                       (series_id, series_id))
+        cursor.executemany('''
+        INSERT INTO annual_temperatures (series_id, year, anomaly, moving_avg_5yr) VALUES (?, ?, ?, ?)
+        ON CONFLICT(series_id, year) DO UPDATE SET
+            anomaly = excluded.anomaly,
+            moving_avg_5yr = excluded.moving_avg_5yr
+        ''', ((series_id,) + row for row in changed))
+        cursor.executemany('DELETE FROM annual_temperatures WHERE series_id = ? AND year = ?', removed)
+        recompute_decades(conn, series_id, affected_decades)
+        recompute_trends(conn, series_id)
+    
+    new_years = sum(1 for row in changed if row[0] not in existing)
+    elapsed = time.perf_counter() - started
+    print(f"Upserted {len(changed)} annual records ({new_years} new, {len(changed) - new_years} changed), "
+          f"deleted {len(removed)}")
+    print(f"Recomputed {len(affected_decades)} decadal averages and the trends row")
+    print(f"Rows touched: {len(changed) + len(removed) + len(affected_decades) + 1} in {elapsed:.3f}s")
+    return len(changed) + len(removed)
+
+def generation_pattern(db_path):
+    """Match the file names of db_path's generations, e.g. climate_data.20240101T120000-42.db"""
+    stem, ext = os.path.splitext(os.path.basename(db_path))
+    return re.compile(rf'{re.escape(stem)}\.\d{{8}}T\d{{6}}-\d+(?:\.\d+)?{re.escape(ext)}')
+
+def start_generation(db_path):
+    """Create a new generation file holding a copy of the current database and return its path"""
+    stem, ext = os.path.splitext(os.path.abspath(db_path))
+    name = f"{stem}.{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    path = f"{name}{ext}"
+    # A second build within the same second must not reuse the live generation's name
+    sequence = 0
+    while os.path.lexists(path):
+        sequence += 1
+        path = f"{name}.{sequence}{ext}"
+    print(f"Building new database generation {os.path.basename(path)}...")
+    
+    # The backup API copies a consistent snapshot even while the API is reading
+    build = sqlite3.connect(path)
+    if os.path.exists(db_path):
+        current = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        current.backup(build)
+        current.close()
+    build.close()
+    return path
 
-def verify_database(conn):
+def remove_database_files(path):
+    """Delete a database file and its WAL and shared-memory files"""
+    for name in (path, path + '-wal', path + '-shm'):
+        if os.path.exists(name):
+            os.remove(name)
+
+def swap_generation(path, db_path):
+    """Atomically point db_path at a finished generation and delete older generations"""
+    link = db_path + '.swap'
+    if os.path.lexists(link):
+        os.remove(link)
+    # A relative link keeps the directory relocatable
+    os.symlink(os.path.basename(path), link)
+    was_file = os.path.exists(db_path) and not os.path.islink(db_path)
+    os.replace(link, db_path)
+    print(f"Swapped {db_path} -> {os.path.basename(path)}")
+    
+    # Open readers keep the replaced files alive until they close them; SQLite
+    # names WAL files after the symlink target, so the new generation never
+    # shares them with the old one
+    if was_file:
+        for name in (db_path + '-wal', db_path + '-shm'):
+            if os.path.exists(name):
+                os.remove(name)
+    directory = os.path.dirname(os.path.abspath(db_path))
+    pattern = generation_pattern(db_path)
+    older = sorted((name for name in os.listdir(directory)
+                    if pattern.fullmatch(name) and name != os.path.basename(path)),
+                   key=lambda name: os.stat(os.path.join(directory, name)).st_mtime_ns)
+    for name in older[:max(len(older) - KEEP_GENERATIONS, 0)]:
+        remove_database_files(os.path.join(directory, name))
+        print(f"Removed old generation {name}")
+
+def verify_database(conn, series_id=DEFAULT_SERIES):
     """Verify that data was imported correctly"""
     print("Verifying database...")
     
     cursor = conn.cursor()
     
+    # Check series
+    cursor.execute('SELECT COUNT(*) FROM series')
+    series_count = cursor.fetchone()[0]
+    print(f"Series: {series_count}")
+    
     # Check annual data
     cursor.execute('SELECT COUNT(*) FROM annual_temperatures')
     annual_count = cursor.fetchone()[0]
@@ -160,15 +640,22 @@ def verify_database(conn):
     decadal_count = cursor.fetchone()[0]
     print(f"Decadal average records: {decadal_count}")
     
+    # Check multi-resolution data
+    cursor.execute('SELECT COUNT(*) FROM series_points')
+    points_count = cursor.fetchone()[0]
+    print(f"Multi-resolution records: {points_count}")
+    
+    
     # Sample queries
-    print("\nSample data:")
+    print(f"\nSample data for series '{series_id}':")
     
     # Latest 5 years
     cursor.execute('''
-    SELECT year, anomaly, moving_avg_5yr 
-    FROM annual_temperatures 
+    SELECT year, anomaly, moving_avg_5yr
+    FROM annual_temperatures
+    WHERE series_id = ?
     ORDER BY year DESC LIMIT 5
-    ''')
+    ''', (series_id,))
     print("\nLatest 5 years of temperature data:")
     for row in cursor.fetchall():
         year, anomaly, moving_avg = row
@@ -178,33 +665,75 @@ def verify_database(conn):
             print(f"Year: {year}, Anomaly: {anomaly:.4f}°C, 5-yr Avg: N/A")
     
     # Trend data
-    cursor.execute('SELECT * FROM temperature_trends')
+    cursor.execute(f'SELECT {TRENDS_COLUMNS} FROM temperature_trends WHERE series_id = ?', (series_id,))
     trend = cursor.fetchone()
+    if trend is None:
+        print("\nNo trend summary for this series")
+        return
     print("\nTemperature trend summary:")
-    print(f"Data range: {trend[1]}-{trend[2]}")
-    print(f"Trend per decade: {trend[3]:.4f}°C")
-    print(f"Warming since pre-industrial: {trend[4]:.4f}°C")
-    print(f"Warmest year: {trend[9]} ({trend[10]:.4f}°C)")
-    print(f"Coldest year: {trend[11]} ({trend[12]:.4f}°C)")
+    print(f"Data range: {trend[0]}-{trend[1]}")
+    print(f"Trend per decade: {trend[2]:.4f}°C")
+    print(f"Warming since pre-industrial: {trend[3]:.4f}°C")
+    print(f"Warmest year: {trend[8]} ({trend[9]:.4f}°C)")
+    print(f"Coldest year: {trend[10]} ({trend[11]:.4f}°C)")
+
+def import_data(conn, args):
+    """Run the import selected on the command line"""
+    if args.points:
+        import_points(conn, args.series, args.points, args.resolution)
+    elif args.series_dir and args.incremental:
+        for series_id, directory in find_series_dirs(args.series_dir).items():
+            incremental_update(conn, series_id, series_paths(directory)[0])
+    elif args.series_dir:
+        import_series_dir(conn, args.series_dir)
+    elif args.incremental:
+        incremental_update(conn)
+    else:
+        with conn:
+            register_series(conn, DEFAULT_SERIES)
+            import_annual_data(conn)
+            import_trends_data(conn)
+            import_decadal_data(conn)
 
 def main():
     """Main function to set up the database"""
+    parser = argparse.ArgumentParser(description='Set up the climate data database')
+    parser.add_argument('--incremental', action='store_true',
+                        help='upsert only new or changed years instead of reimporting everything')
+    parser.add_argument('--series-dir',
+                        help='import every subdirectory of processed files as a series named after it')
+    parser.add_argument('--points', metavar='PATH',
+                        help='import a NOAA monthly or daily anomaly file and precompute its rollups')
+    parser.add_argument('--resolution', choices=list(POINT_DATE_COLUMNS), default='monthly',
+                        help='resolution of the --points file (default: monthly)')
+    parser.add_argument('--series', default=DEFAULT_SERIES,
+                        help=f'series the --points file is imported as (default: {DEFAULT_SERIES})')
+    args = parser.parse_args()
+    
     print("Setting up climate data database...")
     
-    # Create database and tables
-    conn = create_database()
+    # Incremental updates are one transaction in place; full imports build a new generation
+    build_path = None if args.incremental else start_generation(DB_PATH)
     
-    # Import data
-    import_annual_data(conn)
-    import_trends_data(conn)
-    import_decadal_data(conn)
+    # Create database and tables
+    conn = create_database(build_path)
+    try:
+        import_data(conn, args)
     
-    # Verify database
-    verify_database(conn)
+        # Verify database
+        verify_database(conn)
+    except BaseException:
+        conn.close()
+        if build_path is not None:
+            remove_database_files(build_path)
+        raise
     
-    # Close connection
+    # Close connection (this also checkpoints the WAL into the database file)
     conn.close()
     
+    if build_path is not None:
+        swap_generation(build_path, DB_PATH)
+    
     print(f"\nDatabase setup complete. Database file: {DB_PATH}")
 
 if __name__ == "__main__":
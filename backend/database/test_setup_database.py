@@ -0,0 +1,289 @@
+"""
+Tests for the database build
+Incremental updates are compared with a full rebuild from the same CSV,
+whose trends and decadal averages come from data/climate_stats.py as in
+process_data.py. Full imports are run through main(), which builds a new
+generation and swaps it in
+
+    python -m pytest backend/database
+"""
+
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(DATABASE_DIR, '..', '..', 'data'))
+
+import setup_database  # noqa: E402
+from climate_stats import TemperatureStats  # noqa: E402
+from db import ConnectionPool  # noqa: E402
+
+# Processed files of the global series
+PROCESSED_DIR = os.path.join(DATABASE_DIR, '..', '..', 'data', 'processed')
+ANNUAL_PATH, TRENDS_PATH, DECADAL_PATH = setup_database.series_paths(PROCESSED_DIR)
+
+SERIES = setup_database.DEFAULT_SERIES
+
+
+def write_csv(path, rows):
+    """Write (year, anomaly, moving_avg_5yr) rows as a processed annual CSV"""
+    with open(path, 'w') as f:
+        f.write('year,anomaly,moving_avg_5yr\n')
+        for year, anomaly, moving_avg in rows:
+            f.write(f"{year},{anomaly!r},{'' if moving_avg is None else repr(moving_avg)}\n")
+
+def full_rebuild(directory, rows):
+    """Build a database from scratch with the summaries process_data.py would write for rows"""
+    csv_path = os.path.join(directory, 'rebuild.csv')
+    trends_path = os.path.join(directory, 'rebuild_trends.json')
+    decadal_path = os.path.join(directory, 'rebuild_decadal.json')
+    write_csv(csv_path, rows)
+    stats = TemperatureStats()
+    stats.add_chunk([row[0] for row in rows], [row[1] for row in rows])
+    with open(trends_path, 'w') as f:
+        json.dump(stats.trends_summary(), f)
+    with open(decadal_path, 'w') as f:
+        json.dump(stats.decadal_data(), f)
+
+    conn = setup_database.create_database(os.path.join(directory, 'rebuild.db'))
+    with conn:
+        setup_database.import_annual_data(conn, SERIES, csv_path, verbose=False)
+        setup_database.import_trends_data(conn, SERIES, trends_path, verbose=False)
+        setup_database.import_decadal_data(conn, SERIES, decadal_path, verbose=False)
+    return conn
+
+def table_contents(conn):
+    """Return the annual rows, decadal averages and trends row of the series"""
+    annual = conn.execute(
+        'SELECT year, anomaly, moving_avg_5yr FROM annual_temperatures WHERE series_id = ? ORDER BY year',
+        (SERIES,)
+    ).fetchall()
+    decades = conn.execute(
+        'SELECT decade, average FROM decadal_averages WHERE series_id = ? ORDER BY decade', (SERIES,)
+    ).fetchall()
+    trends = conn.execute(
+        f'SELECT {setup_database.TRENDS_COLUMNS} FROM temperature_trends WHERE series_id = ?', (SERIES,)
+    ).fetchone()
+    return annual, decades, trends
+
+@pytest.fixture
+def database(tmp_path):
+    """A database fully imported from the processed global series"""
+    conn = setup_database.create_database(str(tmp_path / 'climate_data.db'))
+    with conn:
+        setup_database.import_annual_data(conn, SERIES, ANNUAL_PATH, verbose=False)
+        setup_database.import_trends_data(conn, SERIES, TRENDS_PATH, verbose=False)
+        setup_database.import_decadal_data(conn, SERIES, DECADAL_PATH, verbose=False)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def rows():
+    """The processed annual rows of the global series"""
+    return setup_database.read_annual_rows(ANNUAL_PATH)
+
+def update_and_compare(database, tmp_path, rows):
+    """Apply rows incrementally, check the result against a full rebuild and return the update count"""
+    csv_path = str(tmp_path / 'update.csv')
+    write_csv(csv_path, rows)
+    updated = setup_database.incremental_update(database, SERIES, csv_path)
+
+    rebuilt = full_rebuild(str(tmp_path), rows)
+    try:
+        annual, decades, trends = table_contents(database)
+        expected_annual, expected_decades, expected_trends = table_contents(rebuilt)
+    finally:
+        rebuilt.close()
+    assert annual == expected_annual
+    assert decades == expected_decades
+    assert trends == expected_trends
+    return updated
+
+def test_unchanged_reimport(database, tmp_path, rows):
+    """Re-importing the same CSV writes nothing"""
+    csv_path = str(tmp_path / 'same.csv')
+    write_csv(csv_path, rows)
+    changes = database.total_changes
+
+    assert setup_database.incremental_update(database, SERIES, csv_path) == 0
+    assert database.total_changes == changes
+
+def test_changed_year(database, tmp_path, rows):
+    """A changed anomaly updates its row, its decade and the trends"""
+    rows = [(year, anomaly + 2.0 if year == 1955 else anomaly, moving_avg) for year, anomaly, moving_avg in rows]
+
+    assert update_and_compare(database, tmp_path, rows) == 1
+    # 1955 is now by far the warmest year
+    assert table_contents(database)[2][8] == 1955
+
+def test_changed_moving_average(database, tmp_path, rows):
+    """A moving average that becomes NULL counts as a change"""
+    rows = [(year, anomaly, None if year == 2020 else moving_avg) for year, anomaly, moving_avg in rows]
+
+    assert update_and_compare(database, tmp_path, rows) == 1
+
+def test_appended_year(database, tmp_path, rows):
+    """An appended year starts a new decade and moves the end of the data range"""
+    rows = rows + [(2030, 1.25, None)]
+
+    assert update_and_compare(database, tmp_path, rows) == 1
+    annual, decades, trends = table_contents(database)
+    assert decades[-1] == ('2030s', 1.25)
+    assert trends[1] == 2030
+
+def test_removed_years(database, tmp_path, rows):
+    """Removed years are deleted, and a decade left without years disappears"""
+    rows = [row for row in rows if row[0] < 2020 and row[0] != 1900]
+
+    assert update_and_compare(database, tmp_path, rows) == 4
+    annual, decades, trends = table_contents(database)
+    assert '2020s' not in [decade for decade, _ in decades]
+    assert trends[1] == 2019
+
+def run_setup(monkeypatch, db_path, annual_path=ANNUAL_PATH):
+    """Run a full import of the global series into db_path, as setup_database.py does from the command line"""
+    monkeypatch.setattr(setup_database, 'DB_PATH', db_path)
+    monkeypatch.setattr(setup_database, 'ANNUAL_DATA_PATH', annual_path)
+    monkeypatch.setattr(setup_database, 'TRENDS_PATH', TRENDS_PATH)
+    monkeypatch.setattr(setup_database, 'DECADAL_PATH', DECADAL_PATH)
+    monkeypatch.setattr('sys.argv', ['setup_database.py'])
+    setup_database.main()
+
+def generations(db_path):
+    """Return the names of the generation files next to db_path"""
+    pattern = setup_database.generation_pattern(db_path)
+    return sorted(name for name in os.listdir(os.path.dirname(db_path)) if pattern.fullmatch(name))
+
+def anomaly(conn, year):
+    """Return the global anomaly of one year"""
+    return conn.execute('SELECT anomaly FROM annual_temperatures WHERE series_id = ? AND year = ?',
+                        (SERIES, year)).fetchone()[0]
+
+def test_first_generation_replaces_plain_file(database, tmp_path, monkeypatch):
+    """A plain database file is copied into the first generation and replaced by a symlink to it"""
+    db_path = str(tmp_path / 'climate_data.db')
+    with database:
+        setup_database.register_series(database, 'extra')
+    database.close()
+
+    run_setup(monkeypatch, db_path)
+    assert os.path.islink(db_path)
+    assert generations(db_path) == [os.readlink(db_path)]
+    assert not os.path.exists(db_path + '-wal') and not os.path.exists(db_path + '-shm')
+    conn = sqlite3.connect(db_path)
+    try:
+        # Series the import does not touch are carried over from the plain file
+        assert conn.execute('SELECT COUNT(*) FROM series WHERE series_id = ?', ('extra',)).fetchone()[0] == 1
+        assert conn.execute('SELECT COUNT(*) FROM annual_temperatures').fetchone()[0] == 143
+    finally:
+        conn.close()
+
+def test_swap_while_pool_holds_old_generation(tmp_path, monkeypatch, rows):
+    """A connection borrowed before a swap keeps reading the old generation; the next checkout sees the new one"""
+    db_path = str(tmp_path / 'climate_data.db')
+    run_setup(monkeypatch, db_path)
+    changed_path = str(tmp_path / 'changed.csv')
+    write_csv(changed_path, [(year, value + 1.0 if year == 1955 else value, moving_avg)
+                             for year, value, moving_avg in rows])
+
+    pool = ConnectionPool(lambda: db_path)
+    try:
+        with pool.connection() as conn:
+            before = anomaly(conn, 1955)
+            run_setup(monkeypatch, db_path, changed_path)
+            assert anomaly(conn, 1955) == before
+        with pool.connection() as conn:
+            assert anomaly(conn, 1955) == before + 1.0
+        assert pool.generations == 1
+        assert pool.discarded == 1
+    finally:
+        pool.close_all()
+
+def test_old_generations_pruned(tmp_path, monkeypatch):
+    """Only the live generation and KEEP_GENERATIONS previous ones are kept"""
+    db_path = str(tmp_path / 'climate_data.db')
+    live = []
+    for _ in range(3):
+        run_setup(monkeypatch, db_path)
+        live.append(os.readlink(db_path))
+
+    assert len(set(live)) == 3
+    assert generations(db_path) == sorted(live[-1 - setup_database.KEEP_GENERATIONS:])
+
+def test_failed_build_keeps_live_generation(tmp_path, monkeypatch):
+    """A build that fails leaves the live generation in place and removes its own file"""
+    db_path = str(tmp_path / 'climate_data.db')
+    run_setup(monkeypatch, db_path)
+    live = os.readlink(db_path)
+
+    def fail(conn, args):
+        raise RuntimeError('import failed')
+
+    monkeypatch.setattr(setup_database, 'import_data', fail)
+    with pytest.raises(RuntimeError):
+        run_setup(monkeypatch, db_path)
+    assert os.readlink(db_path) == live
+    assert generations(db_path) == [live]
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute('SELECT COUNT(*) FROM annual_temperatures').fetchone()[0] == 143
+    finally:
+        conn.close()
+
+def write_series_dir(directory, rows):
+    """Write the processed files of a series as process_data.py lays them out for --series-dir"""
+    os.makedirs(directory)
+    annual_path, trends_path, decadal_path = setup_database.series_paths(directory)
+    write_csv(annual_path, rows)
+    stats = TemperatureStats()
+    stats.add_chunk([row[0] for row in rows], [row[1] for row in rows])
+    with open(trends_path, 'w') as f:
+        json.dump(stats.trends_summary(), f)
+    with open(decadal_path, 'w') as f:
+        json.dump(stats.decadal_data(), f)
+
+def test_series_dir_with_short_series(tmp_path, rows):
+    """A series that starts after 1900 imports with NULL period averages, which recompute_trends reproduces"""
+    root = str(tmp_path / 'series')
+    write_series_dir(os.path.join(root, 'global'), rows)
+    write_series_dir(os.path.join(root, 'short'), [row for row in rows if row[0] >= 1950])
+
+    conn = setup_database.create_database(str(tmp_path / 'climate_data.db'))
+    try:
+        setup_database.import_series_dir(conn, root)
+        query = ('SELECT warming_since_preindustrial, pre_industrial_avg, early_20th_century_avg, '
+                 'late_20th_century_avg FROM temperature_trends WHERE series_id = ?')
+        imported = conn.execute(query, ('short',)).fetchone()
+        assert imported[:3] == (None, None, None)
+        assert imported[3] is not None
+        assert conn.execute(query, ('global',)).fetchone()[0] is not None
+
+        with conn:
+            setup_database.recompute_trends(conn, 'short')
+        assert conn.execute(query, ('short',)).fetchone() == imported
+    finally:
+        conn.close()
+
+def test_strict_trends_table_migrated(tmp_path):
+    """A trends table whose period averages were NOT NULL is rebuilt with its rows kept"""
+    path = str(tmp_path / 'climate_data.db')
+    conn = setup_database.create_database(path)
+    conn.execute('DROP TABLE temperature_trends')
+    conn.execute(f'''CREATE TABLE temperature_trends (series_id TEXT PRIMARY KEY,
+        {', '.join(f'{column.strip()} REAL NOT NULL' for column in setup_database.TRENDS_COLUMNS.split(','))})''')
+    conn.execute(f'INSERT INTO temperature_trends VALUES ({", ".join("?" * 13)})', ('global',) + (1.0,) * 12)
+    conn.commit()
+    conn.close()
+
+    conn = setup_database.create_database(path)
+    try:
+        columns = {column[1]: column[3] for column in conn.execute('PRAGMA table_info(temperature_trends)')}
+        assert columns['pre_industrial_avg'] == 0
+        assert conn.execute('SELECT series_id, warming_since_preindustrial FROM temperature_trends').fetchall() == [
+            ('global', 1.0)]
+    finally:
+        conn.close()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Static export of the read API
+Writes the responses of the read endpoints for every series as a file
+tree that a CDN can serve with no Python in the request path. Data files
+are content-addressed (name.<hash>.json, plus .gz/.br siblings) so they
+can be cached forever; manifest.json maps each logical resource to its
+current file and is the only file clients need to revalidate
+
+    manifest.json
+    catalog.<hash>.json
+    series/<id>/annual.<hash>.json           /api/annual
+    series/<id>/annual-columns.<hash>.json   /api/annual, columnar format
+    series/<id>/trends.<hash>.json           /api/trends
+    series/<id>/decades.<hash>.json          /api/decades
+    series/<id>/range/<decade>.<hash>.json   /api/range for one decade
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from compression import BEST_LEVELS, ENCODINGS, MIN_COMPRESS_SIZE, compress  # noqa: E402
+from db import default_db_path, open_read_only  # noqa: E402
+from formats import encode_annual  # noqa: E402
+from serialize import encode_json  # noqa: E402
+from snapshot import DEFAULT_SERIES, data_version, load_snapshot  # noqa: E402
+
+# Repository root, against which the default paths are resolved
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+# Default database path, resolved like the API's (CLIMATE_DB_PATH overrides it)
+DB_PATH = default_db_path()
+
+# Default export directory
+OUT_DIR = os.path.join(ROOT, 'data', 'api')
+
+# Years per range shard
+SHARD_YEARS = 10
+
+# Hex digits of the content hash kept in file names
+HASH_LENGTH = 16
+
+# Version of the manifest layout
+MANIFEST_FORMAT = 1
+
+
+class Exporter:
+    """Writes content-addressed files under a root directory and tracks what it wrote"""
+
+    def __init__(self, root):
+        self.root = root
+        self.paths = set()
+        self.written = 0
+        self.reused = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = {encoding: 0 for encoding in ENCODINGS}
+
+    def write_file(self, path, body):
+        """Write body to a path under the root via a temporary file"""
+        target = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + '.tmp', 'wb') as f:
+            f.write(body)
+        os.replace(target + '.tmp', target)
+
+    def add(self, name, body):
+        """Store a body as name.<hash>.json with compressed siblings and return its manifest entry"""
+        digest = hashlib.sha256(body).hexdigest()
+        path = f'{name}.{digest[:HASH_LENGTH]}.json'
+        encodings = list(ENCODINGS) if len(body) >= MIN_COMPRESS_SIZE else []
+        self.paths.add(path)
+        self.paths.update(path + ENCODINGS[encoding] for encoding in encodings)
+        self.raw_bytes += len(body)
+
+        # The name changes with the content, so an existing file is already correct
+        if os.path.exists(os.path.join(self.root, path)):
+            self.reused += 1
+            for encoding in encodings:
+                self.compressed_bytes[encoding] += os.path.getsize(
+                    os.path.join(self.root, path + ENCODINGS[encoding]))
+        else:
+            for encoding in encodings:
+                compressed = compress(body, encoding, BEST_LEVELS)
+                self.write_file(path + ENCODINGS[encoding], compressed)
+                self.compressed_bytes[encoding] += len(compressed)
+            # Written last, so a present .json implies its siblings are complete
+            self.write_file(path, body)
+            self.written += 1
+        return {'path': path, 'sha256': digest, 'bytes': len(body), 'encodings': encodings}
+
+    def prune(self, keep):
+        """Delete files under the root that are not in keep; returns the number removed"""
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.relpath(os.path.join(dirpath, filename), self.root)
+                if path not in keep:
+                    os.remove(os.path.join(dirpath, filename))
+                    removed += 1
+        return removed
+
+
+def is_safe_segment(series_id):
+    """Check that a series id can be used as a single path segment"""
+    return series_id not in ('', '.', '..') and '/' not in series_id and '\\' not in series_id
+
+def export_series(exporter, series):
+    """Export every resource of one series and return its manifest entry"""
+    prefix = f'series/{series.series_id}'
+    index = series.index
+    entry = {
+        'annual': exporter.add(f'{prefix}/annual', series.annual_json),
+        'annual_columns': exporter.add(f'{prefix}/annual-columns',
+                                       encode_annual(index, 'columns', 0, len(index), encode_json)),
+        'trends': exporter.add(f'{prefix}/trends', series.trends_json) if series.trends_json else None,
+        'decades': exporter.add(f'{prefix}/decades', series.decades_json),
+        'range_shards': {'shard_years': SHARD_YEARS, 'shards': {}},
+    }
+    if len(index):
+        first = index.first_year // SHARD_YEARS * SHARD_YEARS
+        for start in range(first, index.last_year + 1, SHARD_YEARS):
+            body = series.range_json(start, start + SHARD_YEARS - 1)
+            if body != b'[]':
+                entry['range_shards']['shards'][str(start)] = exporter.add(f'{prefix}/range/{start}', body)
+    return entry
+
+def site_json(series):
+    """Build the data/climate_data.json structure read by the root site"""
+    trends = series.trends or {}
+    extremes = trends.get('extremes', {})
+    return {
+        'annual_data': [
+            {'year': year, 'anomaly': anomaly, 'moving_avg_5yr': moving_avg}
+            for year, anomaly, moving_avg in series.annual
+        ],
+        'decadal_averages': {
+            'decades': series.decades['decades'],
+            'values': series.decades['averages']
+        },
+        'statistics': {
+            'start_year': series.annual[0][0] if series.annual else None,
+            'end_year': series.annual[-1][0] if series.annual else None,
+            'total_years': len(series.annual),
+            'warming_rate_per_decade': trends.get('trend_per_decade'),
+            'warmest_year': extremes.get('warmest_year'),
+            'coldest_year': extremes.get('coldest_year')
+        }
+    }
+
+def main():
+    """Export the database as a static API tree"""
+    parser = argparse.ArgumentParser(description='Export the read API as static, content-addressed files')
+    parser.add_argument('--db', default=DB_PATH, help='path to climate_data.db')
+    parser.add_argument('--out', default=OUT_DIR, help='directory to write the tree to')
+    parser.add_argument('--site-json', metavar='PATH',
+                        help=f"also write the root site's climate_data.json for the '{DEFAULT_SERIES}' series")
+    parser.add_argument('--prune', action='store_true',
+                        help='delete files no longer referenced by the manifest')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        conn = open_read_only(args.db)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Cannot open {args.db}: {e}")
+        sys.exit(1)
+    try:
+        snapshot = load_snapshot(conn, data_version(args.db))
+    finally:
+        conn.close()
+    print(f"Loaded {len(snapshot.series)} series ({snapshot.annual_records()} annual records)")
+
+    exporter = Exporter(args.out)
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'dataset_etag': snapshot.etag,
+        'generated': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'catalog': exporter.add('catalog', snapshot.catalog_json),
+        'series': {}
+    }
+    for series_id in sorted(snapshot.series):
+        if not is_safe_segment(series_id):
+            print(f"Skipping series '{series_id}': not usable as a path")
+            continue
+        manifest['series'][series_id] = export_series(exporter, snapshot.series[series_id])
+
+    # The manifest goes last, so clients never see entries whose files are missing
+    exporter.write_file('manifest.json', json.dumps(manifest, indent=2).encode('utf-8'))
+    print(f"Wrote {exporter.written} file(s), reused {exporter.reused} unchanged, "
+          f"in {time.perf_counter() - started:.2f}s")
+    sizes = ', '.join(f"{encoding} {size / 1e6:.2f} MB" for encoding, size in exporter.compressed_bytes.items())
+    print(f"Payload: {exporter.raw_bytes / 1e6:.2f} MB raw, {sizes}")
+
+    if args.prune:
+        removed = exporter.prune(exporter.paths | {'manifest.json'})
+        print(f"Pruned {removed} unreferenced file(s)")
+
+    if args.site_json:
+        series = snapshot.series.get(DEFAULT_SERIES)
+        if series is None:
+            print(f"No '{DEFAULT_SERIES}' series; {args.site_json} not written")
+            sys.exit(1)
+        with open(args.site_json, 'w') as f:
+            json.dump(site_json(series), f, indent=2, allow_nan=False)
+            f.write('\n')
+        print(f"Site data written to {args.site_json}")
+
+    print(f"Manifest: {os.path.join(args.out, 'manifest.json')}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Precompress static assets
+Writes .gz (and .br when the brotli package is installed) siblings of the
+JSON, JS, CSS and HTML files so serve_static.py can send them without
+compressing per request
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from compression import BEST_LEVELS, ENCODINGS, MIN_COMPRESS_SIZE, compress  # noqa: E402
+
+# Repository root, against which the default paths are resolved
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+# Directories and files compressed when no paths are given
+DEFAULT_PATHS = ['frontend', 'index.html', 'css', 'js', 'data/climate_data.json']
+
+# Extensions of the text assets worth compressing
+EXTENSIONS = ('.json', '.js', '.css', '.html', '.svg')
+
+def find_assets(paths):
+    """Yield every compressible file under the given files and directories"""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for dirpath, _, filenames in os.walk(path):
+            for filename in sorted(filenames):
+                if filename.endswith(EXTENSIONS):
+                    yield os.path.join(dirpath, filename)
+
+def is_current(source, target):
+    """Check whether a compressed sibling is at least as new as its source"""
+    try:
+        return os.stat(target).st_mtime_ns >= os.stat(source).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def precompress(path, force=False):
+    """Write the compressed siblings of one file and return (written, skipped) counts"""
+    with open(path, 'rb') as f:
+        body = f.read()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return 0, len(ENCODINGS)
+    
+    written = skipped = 0
+    for encoding, suffix in ENCODINGS.items():
+        target = path + suffix
+        if not force and is_current(path, target):
+            skipped += 1
+            continue
+        compressed = compress(body, encoding, BEST_LEVELS)
+        # Write then rename, so the server never sees a partial file
+        with open(target + '.tmp', 'wb') as f:
+            f.write(compressed)
+        os.replace(target + '.tmp', target)
+        print(f"  {target}: {len(body)} -> {len(compressed)} bytes")
+        written += 1
+    return written, skipped
+
+def main():
+    """Compress every asset under the given paths"""
+    parser = argparse.ArgumentParser(description='Write .gz/.br siblings of static assets')
+    parser.add_argument('paths', nargs='*', help='files or directories (default: the site and frontend)')
+    parser.add_argument('--force', action='store_true', help='rewrite siblings that are up to date')
+    args = parser.parse_args()
+    
+    paths = args.paths or [os.path.join(ROOT, path) for path in DEFAULT_PATHS]
+    print(f"Precompressing with: {', '.join(ENCODINGS)}")
+    written = skipped = 0
+    for path in find_assets(p for p in paths if os.path.exists(p)):
+        w, s = precompress(path, args.force)
+        written += w
+        skipped += s
+    print(f"Wrote {written} compressed file(s), {skipped} up to date or too small")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Static file server with precompressed variants
+Drop-in replacement for python -m http.server that sends a file's .br or
+.gz sibling (written by precompress.py) when the client accepts it
+"""
+
+import argparse
+import os
+import sys
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from werkzeug.http import parse_accept_header
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from compression import ENCODINGS, choose_encoding  # noqa: E402
+from precompress import is_current  # noqa: E402
+
+class PrecompressedHandler(SimpleHTTPRequestHandler):
+    """Serves path.br / path.gz in place of path when present and up to date"""
+
+    def send_head(self):
+        """Open the best precompressed variant, falling back to the plain file"""
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            if not self.path.split('?', 1)[0].endswith('/'):
+                return super().send_head()  # redirects to the trailing-slash URL
+            path = os.path.join(path, 'index.html')
+        if not os.path.isfile(path):
+            return super().send_head()
+        
+        encoding = choose_encoding(parse_accept_header(self.headers.get('Accept-Encoding')))
+        variant = path + ENCODINGS[encoding] if encoding else None
+        if variant is None or not is_current(path, variant):
+            return super().send_head()
+        
+        f = open(variant, 'rb')
+        try:
+            fs = os.fstat(f.fileno())
+            self.send_response(200)
+            # The type comes from the original name, not the .br/.gz suffix
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Encoding', encoding)
+            self.send_header('Content-Length', str(fs.st_size))
+            self.send_header('Last-Modified', self.date_time_string(fs.st_mtime))
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+
+def main():
+    """Serve a directory over HTTP"""
+    parser = argparse.ArgumentParser(description='Serve static files, preferring precompressed variants')
+    parser.add_argument('port', type=int, nargs='?', default=8000)
+    parser.add_argument('--directory', '-d', default=os.getcwd(), help='directory to serve')
+    parser.add_argument('--bind', '-b', default='0.0.0.0')
+    args = parser.parse_args()
+    
+    handler = partial(PrecompressedHandler, directory=args.directory)
+    with ThreadingHTTPServer((args.bind, args.port), handler) as server:
+        print(f"Serving {args.directory} on http://{args.bind}:{args.port}")
+        server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+Online statistics for annual temperature series
+Keeps sufficient statistics (regression sums, per-decade and per-period
+sums and counts, running extremes and a rolling window buffer) so that the
+trends summary, decadal averages and moving averages can be updated when a
+year is appended instead of being recomputed over the whole series
+"""
+
+from collections import deque
+
+import numpy as np
+
+# Window of the centered moving average
+MOVING_AVG_WINDOW = 5
+
+# Periods compared in the trends summary: (key, first year, last year exclusive)
+PERIODS = [
+    ('pre_industrial', None, 1900),
+    ('early_20th_century', 1900, 1950),
+    ('late_20th_century', 1950, 2000),
+    ('21st_century', 2000, None),
+]
+
+# Version of the saved state layout
+STATE_VERSION = 1
+
+
+def in_period(year, first, last):
+    """Check whether a year falls in [first, last), where None is unbounded"""
+    return (first is None or year >= first) and (last is None or year < last)
+
+def round4(value):
+    """Round to the 4 decimals used in the processed JSON files, passing None through"""
+    return None if value is None else float(f"{value:.4f}")
+
+
+class TemperatureStats:
+    """Sufficient statistics of an annual anomaly series, updatable in O(1) per year"""
+
+    def __init__(self, window=MOVING_AVG_WINDOW):
+        self.window = window
+        self.count = 0
+        self.start_year = None
+        self.end_year = None
+        # Linear regression sums, with years offset from the first year for precision
+        self.x0 = None
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xx = 0.0
+        self.sum_xy = 0.0
+        # decade -> [sum, count]
+        self.decades = {}
+        # period key -> [sum, count]
+        self.periods = {key: [0.0, 0] for key, _, _ in PERIODS}
+        # (year, anomaly) of the first warmest/coldest year seen
+        self.warmest = None
+        self.coldest = None
+        # Last window - 1 (year, anomaly) pairs, enough to complete the next moving average
+        self.recent = deque(maxlen=window - 1)
+
+    def add(self, year, anomaly):
+        """Add one year and return the (year, moving_avg) that this completes, if any
+
+        Years must arrive in order without gaps, as the moving average is
+        taken over neighbouring rows.
+        """
+        if self.end_year is not None and year != self.end_year + 1:
+            raise ValueError(f"Expected year {self.end_year + 1}, got {year}")
+
+        if self.x0 is None:
+            self.x0 = year
+            self.start_year = year
+        self.end_year = year
+        self.count += 1
+
+        x = float(year - self.x0)
+        self.sum_x += x
+        self.sum_y += anomaly
+        self.sum_xx += x * x
+        self.sum_xy += x * anomaly
+
+        bucket = self.decades.setdefault(year // 10 * 10, [0.0, 0])
+        bucket[0] += anomaly
+        bucket[1] += 1
+
+        for key, first, last in PERIODS:
+            if in_period(year, first, last):
+                self.periods[key][0] += anomaly
+                self.periods[key][1] += 1
+
+        # Strict comparisons keep the earliest year on ties, like idxmax/idxmin
+        if self.warmest is None or anomaly > self.warmest[1]:
+            self.warmest = (year, anomaly)
+        if self.coldest is None or anomaly < self.coldest[1]:
+            self.coldest = (year, anomaly)
+
+        completed = None
+        if len(self.recent) == self.window - 1:
+            values = [value for _, value in self.recent] + [anomaly]
+            completed = (self.recent[self.window // 2][0], sum(values) / self.window)
+        self.recent.append((year, anomaly))
+        return completed
+
+    def add_chunk(self, years, anomalies):
+        """Fold arrays of consecutive years and anomalies in with vectorized sums"""
+        years = np.asarray(years)
+        anomalies = np.asarray(anomalies, dtype='float64')
+        if len(years) == 0:
+            return
+
+        if self.x0 is None:
+            self.x0 = int(years[0])
+            self.start_year = int(years.min())
+            self.end_year = int(years.max())
+        else:
+            self.start_year = min(self.start_year, int(years.min()))
+            self.end_year = max(self.end_year, int(years.max()))
+        self.count += len(years)
+
+        x = (years - self.x0).astype('float64')
+        self.sum_x += float(x.sum())
+        self.sum_y += float(anomalies.sum())
+        self.sum_xx += float((x * x).sum())
+        self.sum_xy += float((x * anomalies).sum())
+
+        decades, inverse = np.unique((years // 10) * 10, return_inverse=True)
+        decade_sums = np.bincount(inverse, weights=anomalies)
+        decade_counts = np.bincount(inverse)
+        for decade, total, count in zip(decades, decade_sums, decade_counts):
+            bucket = self.decades.setdefault(int(decade), [0.0, 0])
+            bucket[0] += float(total)
+            bucket[1] += int(count)
+
+        for key, first, last in PERIODS:
+            mask = np.ones(len(years), dtype=bool)
+            if first is not None:
+                mask &= years >= first
+            if last is not None:
+                mask &= years < last
+            self.periods[key][0] += float(anomalies[mask].sum())
+            self.periods[key][1] += int(mask.sum())
+
+        i_max = int(anomalies.argmax())
+        if self.warmest is None or anomalies[i_max] > self.warmest[1]:
+            self.warmest = (int(years[i_max]), float(anomalies[i_max]))
+        i_min = int(anomalies.argmin())
+        if self.coldest is None or anomalies[i_min] < self.coldest[1]:
+            self.coldest = (int(years[i_min]), float(anomalies[i_min]))
+
+        for year, anomaly in zip(years[-(self.window - 1):], anomalies[-(self.window - 1):]):
+            self.recent.append((int(year), float(anomaly)))
+
+    def regression(self):
+        """Return (slope, intercept) of the least-squares line through all points"""
+        n = self.count
+        denominator = n * self.sum_xx - self.sum_x * self.sum_x
+        slope = (n * self.sum_xy - self.sum_x * self.sum_y) / denominator
+        intercept = (self.sum_y - slope * self.sum_x) / n - slope * self.x0
+        return slope, intercept
+
+    def period_mean(self, key):
+        """Return the mean anomaly of one of the PERIODS, or None when the series has no years in it"""
+        total, count = self.periods[key]
+        return total / count if count else None
+
+    def trends_summary(self):
+        """Build the summary written to temperature_trends.json"""
+        slope, _ = self.regression()
+        trend_per_decade = slope * 10  # degrees per decade
+        pre_industrial = self.period_mean('pre_industrial')
+        recent = self.period_mean('21st_century')
+
+        # Calculate warming since pre-industrial times (unknown if either period is missing)
+        warming_since_preindustrial = (
+            recent - pre_industrial if recent is not None and pre_industrial is not None else None
+        )
+
+        return {
+            "data_range": {
+                "start_year": self.start_year,
+                "end_year": self.end_year
+            },
+            "trend_per_decade": round4(trend_per_decade),
+            "warming_since_preindustrial": round4(warming_since_preindustrial),
+            "average_anomalies": {
+                key: round4(self.period_mean(key)) for key, _, _ in PERIODS
+            },
+            "extremes": {
+                "warmest_year": {
+                    "year": self.warmest[0],
+                    "anomaly": round4(self.warmest[1])
+                },
+                "coldest_year": {
+                    "year": self.coldest[0],
+                    "anomaly": round4(self.coldest[1])
+                }
+            }
+        }
+
+    def decadal_data(self):
+        """Build the decadal averages written to decadal_averages.json"""
+        decades = sorted(self.decades)
+        return {
+            "decades": [f"{decade}s" for decade in decades],
+            "averages": [round4(self.decades[d][0] / self.decades[d][1]) for d in decades]
+        }
+
+    def to_state(self):
+        """Return a JSON-serializable copy of the statistics"""
+        return {
+            "version": STATE_VERSION,
+            "window": self.window,
+            "count": self.count,
+            "start_year": self.start_year,
+            "end_year": self.end_year,
+            "x0": self.x0,
+            "sums": [self.sum_x, self.sum_y, self.sum_xx, self.sum_xy],
+            "decades": {str(decade): bucket for decade, bucket in self.decades.items()},
+            "periods": self.periods,
+            "warmest": self.warmest,
+            "coldest": self.coldest,
+            "recent": list(self.recent)
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild statistics saved with to_state()"""
+        if state.get("version") != STATE_VERSION:
+            raise ValueError(f"Unsupported statistics state version: {state.get('version')}")
+        stats = cls(window=state["window"])
+        stats.count = state["count"]
+        stats.start_year = state["start_year"]
+        stats.end_year = state["end_year"]
+        stats.x0 = state["x0"]
+        stats.sum_x, stats.sum_y, stats.sum_xx, stats.sum_xy = state["sums"]
+        stats.decades = {int(decade): bucket for decade, bucket in state["decades"].items()}
+        stats.periods = state["periods"]
+        stats.warmest = tuple(state["warmest"]) if state["warmest"] else None
+        stats.coldest = tuple(state["coldest"]) if state["coldest"] else None
+        stats.recent.extend(tuple(pair) for pair in state["recent"])
+        return stats
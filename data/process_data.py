@@ -2,23 +2,54 @@
 """
 Process NOAA Global Surface Temperature Dataset
 Extracts key trends and prepares data for visualization and database storage
+
+The input is read in fixed-size chunks and reduced into running aggregates,
+so memory use is bounded by the chunk size rather than the file size.
+Given several files or a directory, each dataset is processed in its own
+worker process and written to its own subdirectory, the layout that
+setup_database.py --series-dir imports.
+
+Plotting is opt-in (--plot): matplotlib is only imported when a plot is
+rendered, and plots are rendered after the JSON/CSV outputs are written
 """
 
-import pandas as pd
+import argparse
+import glob
 import numpy as np
-import matplotlib.pyplot as plt
+import pandas as pd
 import os
 import json
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from climate_stats import MOVING_AVG_WINDOW, TemperatureStats
 
 # Input and output file paths
 input_file = '/home/ubuntu/climate_app/data/global_temp_data.asc'
 output_dir = '/home/ubuntu/climate_app/data/processed'
-trends_file = os.path.join(output_dir, 'temperature_trends.json')
-decadal_file = os.path.join(output_dir, 'decadal_averages.json')
-annual_csv_file = os.path.join(output_dir, 'annual_temperatures.csv')
-plot_file = os.path.join(output_dir, 'temperature_plot.png')
 
-# Read the data
+# Output file names inside the output directory, or each dataset's directory (see setup_database.py)
+ANNUAL_FILE = 'annual_temperatures.csv'
+TRENDS_FILE = 'temperature_trends.json'
+DECADAL_FILE = 'decadal_averages.json'
+PLOT_FILE = 'temperature_plot.png'
+STATS_STATE_FILE = 'stats_state.json'
+SERIES_INFO_FILE = 'series.json'
+
+# Input files picked up when a directory is given
+INPUT_PATTERN = '*.asc'
+
+# Rows read per chunk; this bounds memory use regardless of input size
+CHUNK_ROWS = 100_000
+
+# Pipeline stages reported in the timing summary
+STAGES = ('parse', 'statistics', 'export', 'plot')
+
+# Resolution of the rendered plot
+PLOT_DPI = 300
+
 # Based on the readme, we know the columns are:
 # 1st column = year
 # 2nd column = anomaly of temperature (K)
@@ -26,119 +57,423 @@ plot_file = os.path.join(output_dir, 'temperature_plot.png')
 # 4th column = high-frequency error variance (K**2)
 # 5th column = low-frequency error variance (K**2)
 # 6th column = bias error variance (K**2)
+COLUMNS = ['year', 'anomaly', 'total_error_var', 'high_freq_error_var',
+           'low_freq_error_var', 'bias_error_var']
+
+# Only year and anomaly are used; explicit dtypes avoid per-chunk type inference
+USE_COLUMNS = ['year', 'anomaly']
+DTYPES = {'year': 'int32', 'anomaly': 'float64'}
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrames of at most chunk_rows rows from a whitespace-delimited NOAA file"""
+    return pd.read_csv(path, sep=r'\s+', header=None, names=COLUMNS,
+                       usecols=USE_COLUMNS, dtype=DTYPES, chunksize=chunk_rows)
+
+
+def centered_means(values, window):
+    """Centered moving averages of an array, NaN where the window runs past either end
+
+    Each mean sums its own window left to right, as TemperatureStats.add does,
+    so a row's average does not depend on where the input was split into chunks.
+    """
+    means = np.full(len(values), np.nan)
+    if len(values) >= window:
+        start = window // 2
+        windows = np.lib.stride_tricks.sliding_window_view(values, window)
+        means[start:start + len(windows)] = windows.sum(axis=1) / window
+    return means
+
+
+class MovingAverageWriter:
+    """Streams annual rows to CSV with a centered moving average
+
+    A row can only be written once the rows after its window have been read,
+    so up to window - 1 rows are carried over between chunks.
+    """
+
+    def __init__(self, out, window=MOVING_AVG_WINDOW):
+        self.out = out
+        self.window = window
+        self.half = window // 2
+        self.header = True
+        # Rows not yet written, preceded by up to `half` already-written context rows
+        self.buffer = pd.DataFrame({'year': pd.Series(dtype='int32'),
+                                    'anomaly': pd.Series(dtype='float64')})
+        self.context = 0
+
+    def _emit(self, frame, start, stop):
+        """Write rows start..stop of frame with their moving averages"""
+        rows = frame.iloc[start:stop]
+        if rows.empty:
+            return
+        rows[['year', 'anomaly', 'moving_avg_5yr']].to_csv(self.out, header=self.header, index=False)
+        self.header = False
+
+    def write(self, chunk):
+        """Add a chunk and write every row whose window is now complete"""
+        frame = pd.concat([self.buffer, chunk[['year', 'anomaly']]], ignore_index=True)
+        frame['moving_avg_5yr'] = centered_means(frame['anomaly'].to_numpy(), self.window)
+
+        emit_end = max(self.context, len(frame) - self.half)
+        self._emit(frame, self.context, emit_end)
+
+        keep_from = max(0, emit_end - self.half)
+        self.buffer = frame.iloc[keep_from:][['year', 'anomaly']].reset_index(drop=True)
+        self.context = emit_end - keep_from
+
+    def finish(self):
+        """Write the trailing rows, whose windows run past the end of the series"""
+        frame = self.buffer.copy()
+        frame['moving_avg_5yr'] = centered_means(frame['anomaly'].to_numpy(), self.window)
+        self._emit(frame, self.context, len(frame))
+
+
+def process_file(path, annual_csv_path, chunk_rows=CHUNK_ROWS, timings=None, verbose=True):
+    """Stream the input once, writing the annual CSV and returning the aggregates
+
+    Seconds spent parsing, updating statistics and writing the CSV are added
+    to timings under 'parse', 'statistics' and 'export' when it is given.
+    """
+    timings = Counter() if timings is None else timings
+    stats = TemperatureStats()
+    chunks = 0
+    with open(annual_csv_path, 'w', newline='') as out:
+        writer = MovingAverageWriter(out)
+        reader = iter(read_chunks(path, chunk_rows))
+        while True:
+            started = time.perf_counter()
+            chunk = next(reader, None)
+            parsed = time.perf_counter()
+            timings['parse'] += parsed - started
+            if chunk is None:
+                break
+            stats.add_chunk(chunk['year'].to_numpy(), chunk['anomaly'].to_numpy())
+            counted = time.perf_counter()
+            timings['statistics'] += counted - parsed
+            writer.write(chunk)
+            timings['export'] += time.perf_counter() - counted
+            chunks += 1
+        started = time.perf_counter()
+        writer.finish()
+        timings['export'] += time.perf_counter() - started
+    if verbose:
+        print(f"Read {stats.count} rows in {chunks} chunk(s) of up to {chunk_rows} rows")
+    return stats
+
+
+def load_pyplot():
+    """Import pyplot on first use with the non-interactive Agg backend"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def create_plot(annual_csv_path, stats, path):
+    """Plot the annual series, its moving average and the trend line"""
+    plt = load_pyplot()
+    df = pd.read_csv(annual_csv_path)
+    slope, intercept = stats.regression()
+    trend_per_decade = slope * 10
+
+    plt.figure(figsize=(12, 6))
+    plt.plot(df['year'], df['anomaly'], 'b-', alpha=0.5, label='Annual average')
+    plt.plot(df['year'], df['moving_avg_5yr'], 'r-', linewidth=2, label='5-year moving average')
+
+    # Add trend line
+    x = df['year'].values
+    trend_line = slope * x + intercept
+    plt.plot(x, trend_line, 'g--', label=f'Trend: {trend_per_decade:.2f}°C/decade')
+
+    # Add horizontal line at zero
+    plt.axhline(y=0, color='k', linestyle='-', alpha=0.3)
+
+    # Add labels and title
+    plt.xlabel('Year')
+    plt.ylabel('Temperature Anomaly (°C)')
+    plt.title(f'Global Land-Ocean Temperature Anomalies ({stats.start_year}-{stats.end_year})\n'
+              'Relative to 1971-2000 Average')
+    plt.grid(True, alpha=0.3)
+    plt.legend()
+
+    # Save the plot, releasing the figure so long-lived workers do not accumulate them
+    plt.savefig(path, dpi=PLOT_DPI, bbox_inches='tight')
+    plt.close()
+
+
+def format_csv_row(year, anomaly, moving_avg):
+    """Format an annual row the way DataFrame.to_csv writes it"""
+    moving_avg_text = '' if moving_avg is None or moving_avg != moving_avg else repr(moving_avg)
+    return f"{year},{anomaly!r},{moving_avg_text}\n"
+
+def replace_csv_tail(path, old_rows, new_text):
+    """Replace the last old_rows lines of a CSV file without reading the whole file"""
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        block = 4096
+        while True:
+            start = max(0, size - block)
+            f.seek(start)
+            tail = f.read()
+            # The file ends with a newline, so old_rows lines need old_rows + 1 newlines
+            # before them unless the block already reaches the start of the file
+            cut = len(tail)
+            for _ in range(old_rows + 1):
+                cut = tail.rfind(b'\n', 0, cut)
+                if cut < 0:
+                    break
+            if cut >= 0 or start == 0:
+                break
+            block *= 2
+        offset = start + cut + 1 if cut >= 0 else 0
+        f.seek(offset)
+        f.truncate()
+        f.write(new_text.encode('utf-8'))
+
+def save_summaries(stats, directory=None):
+    """Write the trends, decadal and statistics state files (to output_dir by default)"""
+    directory = directory or output_dir
+
+    # Save trends summary as JSON
+    with open(os.path.join(directory, TRENDS_FILE), 'w') as f:
+        json.dump(stats.trends_summary(), f, indent=2)
+
+    # Save decadal averages as JSON
+    with open(os.path.join(directory, DECADAL_FILE), 'w') as f:
+        json.dump(stats.decadal_data(), f, indent=2)
+
+    # Save the running statistics so later years can be appended incrementally
+    with open(os.path.join(directory, STATS_STATE_FILE), 'w') as f:
+        json.dump(stats.to_state(), f)
+
+def dataset_id(path):
+    """Name a dataset after its input file, without the extension"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+def check_dataset_ids(inputs):
+    """Raise ValueError if two inputs would be written to the same dataset directory"""
+    paths = {}
+    for path in inputs:
+        paths.setdefault(dataset_id(path), []).append(path)
+    duplicates = {dataset: found for dataset, found in paths.items() if len(found) > 1}
+    if duplicates:
+        raise ValueError('Inputs share a dataset id: ' + '; '.join(
+            f"{dataset} ({', '.join(found)})" for dataset, found in sorted(duplicates.items())))
+
+def find_inputs(paths, pattern=INPUT_PATTERN):
+    """Expand files and directories into a sorted list of input files"""
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            inputs.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        else:
+            inputs.append(path)
+    return inputs
+
+def process_dataset(path, directory, chunk_rows=CHUNK_ROWS):
+    """Write the CSV and JSON outputs for one input file and return a result summary
+
+    Runs in a worker process, so failures are reported in the result rather
+    than raised, and nothing is printed.
+    """
+    result = {'dataset': dataset_id(path), 'stage': 'data', 'output_dir': directory,
+              'rows': 0, 'timings': Counter(), 'error': None}
+    timings = result['timings']
+    try:
+        os.makedirs(directory, exist_ok=True)
+        stats = process_file(path, os.path.join(directory, ANNUAL_FILE), chunk_rows,
+                             timings, verbose=False)
+        result['rows'] = stats.count
+
+        started = time.perf_counter()
+        save_summaries(stats, directory)
+        with open(os.path.join(directory, SERIES_INFO_FILE), 'w') as f:
+            json.dump({'name': result['dataset'],
+                       'description': f"Processed from {os.path.basename(path)}"}, f, indent=2)
+        timings['export'] += time.perf_counter() - started
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        # Leave no partial outputs behind for setup_database.py --series-dir to import
+        for name in (ANNUAL_FILE, TRENDS_FILE, DECADAL_FILE, STATS_STATE_FILE, SERIES_INFO_FILE):
+            if os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+    return result
+
+def plot_dataset(directory, dataset):
+    """Render the plot of a dataset from its written outputs and return a result summary"""
+    result = {'dataset': dataset, 'stage': 'plot', 'output_dir': directory,
+              'rows': 0, 'timings': Counter(), 'error': None}
+    started = time.perf_counter()
+    try:
+        with open(os.path.join(directory, STATS_STATE_FILE)) as f:
+            stats = TemperatureStats.from_state(json.load(f))
+        create_plot(os.path.join(directory, ANNUAL_FILE), stats,
+                    os.path.join(directory, PLOT_FILE))
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['timings']['plot'] += time.perf_counter() - started
+    return result
+
+def process_many(inputs, root, jobs=None, chunk_rows=CHUNK_ROWS, plot=False):
+    """Process every input into root/<dataset id>/ over a process pool
+
+    Yields each result as its stage completes; jobs=1 runs inline. A plot is
+    rendered from its dataset's written CSV/JSON outputs: inline, after every
+    dataset's data stage; in the pool, as soon as that dataset's data stage
+    finishes, possibly alongside other datasets' data stages. Raises
+    ValueError before processing anything if two inputs share a dataset id.
+    """
+    check_dataset_ids(inputs)
+    tasks = [(path, os.path.join(root, dataset_id(path))) for path in inputs]
+    if jobs == 1:
+        results = []
+        for path, directory in tasks:
+            results.append(process_dataset(path, directory, chunk_rows))
+            yield results[-1]
+        for result in results:
+            if plot and not result['error']:
+                yield plot_dataset(result['output_dir'], result['dataset'])
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = {pool.submit(process_dataset, path, directory, chunk_rows)
+                   for path, directory in tasks}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if plot and result['stage'] == 'data' and not result['error']:
+                    pending.add(pool.submit(plot_dataset, result['output_dir'], result['dataset']))
+                yield result
+
+def print_timing_summary(results, elapsed, jobs):
+    """Print per-stage totals and overall throughput for a batch run"""
+    totals = Counter()
+    for result in results:
+        totals.update(result['timings'])
+    busy = sum(totals.values())
+    rows = sum(result['rows'] for result in results)
+    datasets = sum(1 for result in results if result['stage'] == 'data')
+
+    print("\nStage timings (summed over datasets):")
+    for stage in STAGES:
+        share = totals[stage] / busy * 100 if busy else 0.0
+        print(f"  {stage:<11} {totals[stage]:9.3f}s  {share:5.1f}%")
+    print(f"  {'total':<11} {busy:9.3f}s")
+    print(f"Wall time: {elapsed:.3f}s with {jobs} worker(s), "
+          f"{datasets / elapsed:.1f} datasets/s, {rows / elapsed:,.0f} rows/s")
+
+def append_year(year, anomaly, directory=None):
+    """Append one year to the processed outputs (in output_dir by default) in O(window) time"""
+    directory = directory or output_dir
+    with open(os.path.join(directory, STATS_STATE_FILE)) as f:
+        stats = TemperatureStats.from_state(json.load(f))
+
+    # The last window // 2 rows have no moving average yet; one of them completes now
+    pending = list(stats.recent)[-(MOVING_AVG_WINDOW // 2):]
+    completed = stats.add(year, anomaly)
+
+    moving_avgs = dict([completed]) if completed else {}
+    new_rows = ''.join(
+        format_csv_row(pending_year, pending_anomaly, moving_avgs.get(pending_year))
+        for pending_year, pending_anomaly in pending
+    ) + format_csv_row(year, anomaly, None)
+    replace_csv_tail(os.path.join(directory, ANNUAL_FILE), len(pending), new_rows)
+
+    save_summaries(stats, directory)
+    print(f"Appended {year} ({anomaly:.4f} K)")
+    if completed:
+        print(f"Completed {completed[0]} 5-year moving average: {completed[1]:.4f}")
+    print(f"Trend per decade: {stats.trends_summary()['trend_per_decade']}°C")
+    print("Run setup_database.py --incremental to load the new year into the database")
+
+def main():
+    """Run the processing pipeline"""
+    parser = argparse.ArgumentParser(description='Process the NOAA global temperature dataset')
+    parser.add_argument('inputs', nargs='*',
+                        help='input files or directories; each dataset is written to '
+                             'OUTPUT_DIR/<file name>/ (default: the global dataset into OUTPUT_DIR)')
+    parser.add_argument('--output-dir', default=output_dir, help='root of the processed outputs')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='worker processes for multiple inputs (default: one per CPU)')
+    parser.add_argument('--pattern', default=INPUT_PATTERN,
+                        help=f'input files to pick up from directories (default: {INPUT_PATTERN})')
+    parser.add_argument('--plot', action='store_true',
+                        help=f'also render {PLOT_FILE} (after the data outputs are written)')
+    parser.add_argument('--append', nargs=2, metavar=('YEAR', 'ANOMALY'),
+                        help='append one year to the existing processed outputs')
+    args = parser.parse_args()
+
+    if args.inputs:
+        inputs = find_inputs(args.inputs, args.pattern)
+        if not inputs:
+            print("No input files found")
+            sys.exit(1)
+        try:
+            check_dataset_ids(inputs)
+        except ValueError as e:
+            print(f"{e}. Rename the files so each dataset gets its own directory.")
+            sys.exit(1)
+        jobs = args.jobs or min(len(inputs), os.cpu_count() or 1)
+        print(f"Processing {len(inputs)} dataset(s) with {jobs} worker(s)...")
+
+        started = time.perf_counter()
+        results = []
+        for result in process_many(inputs, args.output_dir, jobs, plot=args.plot):
+            results.append(result)
+            if result['error']:
+                print(f"  ✗ {result['dataset']} ({result['stage']}): {result['error']}")
+            elif result['stage'] == 'plot':
+                print(f"  ✓ {result['dataset']}: plot -> {result['output_dir']}")
+            else:
+                print(f"  ✓ {result['dataset']}: {result['rows']} rows -> {result['output_dir']}")
+        print_timing_summary(results, time.perf_counter() - started, jobs)
+
+        failed = [result for result in results if result['error']]
+        if failed:
+            print(f"{len(failed)} dataset(s) failed")
+            sys.exit(1)
+        print(f"Import with: setup_database.py --series-dir {args.output_dir}")
+        return
+
+    if args.append:
+        try:
+            append_year(int(args.append[0]), float(args.append[1]), args.output_dir)
+        except (OSError, ValueError) as e:
+            print(f"Cannot append: {e}. Rerun without --append to rebuild the outputs.")
+            sys.exit(1)
+        return
+
+    started = time.perf_counter()
+    timings = Counter()
+    print("Reading temperature data...")
+    stats = process_file(input_file, os.path.join(args.output_dir, ANNUAL_FILE), timings=timings)
+
+    # Basic data exploration
+    print(f"Data range: {stats.start_year} to {stats.end_year}")
+    print(f"Number of data points: {stats.count}")
+    print(f"Temperature anomaly range: {stats.coldest[1]:.4f} to {stats.warmest[1]:.4f} K")
+
+    # Save processed data
+    print("Saving processed data...")
+    saving = time.perf_counter()
+    save_summaries(stats, args.output_dir)
+    timings['export'] += time.perf_counter() - saving
+    results = [{'stage': 'data', 'rows': stats.count, 'timings': timings}]
+    print(f"Processing complete. Results saved to {args.output_dir}")
+    print(f"Key trends saved to {os.path.join(args.output_dir, TRENDS_FILE)}")
+
+    # Create a visualization of the temperature trend
+    if args.plot:
+        print("Creating visualization...")
+        results.append(plot_dataset(args.output_dir, dataset_id(input_file)))
+        if results[-1]['error']:
+            print(f"Plot failed: {results[-1]['error']}")
+        else:
+            print(f"Visualization saved to {os.path.join(args.output_dir, PLOT_FILE)}")
+
+    print_timing_summary(results, time.perf_counter() - started, 1)
+
 
-print("Reading temperature data...")
-df = pd.read_csv(input_file, delim_whitespace=True, header=None,
-                names=['year', 'anomaly', 'total_error_var', 'high_freq_error_var', 
-                       'low_freq_error_var', 'bias_error_var'])
-
-# Basic data exploration
-print(f"Data range: {df['year'].min()} to {df['year'].max()}")
-print(f"Number of data points: {len(df)}")
-print(f"Temperature anomaly range: {df['anomaly'].min():.4f} to {df['anomaly'].max():.4f} K")
-
-# Calculate key statistics and trends
-print("Calculating key statistics and trends...")
-
-# Overall trend (linear regression)
-x = df['year'].values
-y = df['anomaly'].values
-slope, intercept = np.polyfit(x, y, 1)
-trend_per_decade = slope * 10  # degrees per decade
-
-# Calculate decadal averages
-df['decade'] = (df['year'] // 10) * 10
-decadal_avg = df.groupby('decade')['anomaly'].mean().reset_index()
-decadal_avg['decade_label'] = decadal_avg['decade'].astype(str) + 's'
-
-# Calculate 5-year moving average for smoother trend visualization
-df['moving_avg_5yr'] = df['anomaly'].rolling(window=5, center=True).mean()
-
-# Calculate average anomalies for different periods
-pre_industrial = df[df['year'] < 1900]['anomaly'].mean()
-early_20th = df[(df['year'] >= 1900) & (df['year'] < 1950)]['anomaly'].mean()
-late_20th = df[(df['year'] >= 1950) & (df['year'] < 2000)]['anomaly'].mean()
-recent = df[df['year'] >= 2000]['anomaly'].mean()
-
-# Calculate warming since pre-industrial times
-warming_since_preindustrial = recent - pre_industrial
-
-# Find the warmest and coldest years
-warmest_year = df.loc[df['anomaly'].idxmax()]
-coldest_year = df.loc[df['anomaly'].idxmin()]
-
-# Prepare data for visualization and API
-print("Preparing data for visualization and API...")
-
-# Create a summary of key trends
-trends_summary = {
-    "data_range": {
-        "start_year": int(df['year'].min()),
-        "end_year": int(df['year'].max())
-    },
-    "trend_per_decade": float(f"{trend_per_decade:.4f}"),
-    "warming_since_preindustrial": float(f"{warming_since_preindustrial:.4f}"),
-    "average_anomalies": {
-        "pre_industrial": float(f"{pre_industrial:.4f}"),
-        "early_20th_century": float(f"{early_20th:.4f}"),
-        "late_20th_century": float(f"{late_20th:.4f}"),
-        "21st_century": float(f"{recent:.4f}")
-    },
-    "extremes": {
-        "warmest_year": {
-            "year": int(warmest_year['year']),
-            "anomaly": float(f"{warmest_year['anomaly']:.4f}")
-        },
-        "coldest_year": {
-            "year": int(coldest_year['year']),
-            "anomaly": float(f"{coldest_year['anomaly']:.4f}")
-        }
-    }
-}
-
-# Prepare decadal averages for API
-decadal_data = {
-    "decades": decadal_avg['decade_label'].tolist(),
-    "averages": [float(f"{x:.4f}") for x in decadal_avg['anomaly'].tolist()]
-}
-
-# Save processed data
-print("Saving processed data...")
-
-# Save trends summary as JSON
-with open(trends_file, 'w') as f:
-    json.dump(trends_summary, f, indent=2)
-
-# Save decadal averages as JSON
-with open(decadal_file, 'w') as f:
-    json.dump(decadal_data, f, indent=2)
-
-# Save annual data as CSV for database import
-df[['year', 'anomaly', 'moving_avg_5yr']].to_csv(annual_csv_file, index=False)
-
-# Create a visualization of the temperature trend
-print("Creating visualization...")
-plt.figure(figsize=(12, 6))
-plt.plot(df['year'], df['anomaly'], 'b-', alpha=0.5, label='Annual average')
-plt.plot(df['year'], df['moving_avg_5yr'], 'r-', linewidth=2, label='5-year moving average')
-
-# Add trend line
-trend_line = slope * x + intercept
-plt.plot(x, trend_line, 'g--', label=f'Trend: {trend_per_decade:.2f}°C/decade')
-
-# Add horizontal line at zero
-plt.axhline(y=0, color='k', linestyle='-', alpha=0.3)
-
-# Add labels and title
-plt.xlabel('Year')
-plt.ylabel('Temperature Anomaly (°C)')
-plt.title('Global Land-Ocean Temperature Anomalies (1880-2022)\nRelative to 1971-2000 Average')
-plt.grid(True, alpha=0.3)
-plt.legend()
-
-# Save the plot
-plt.savefig(plot_file, dpi=300, bbox_inches='tight')
-
-print(f"Processing complete. Results saved to {output_dir}")
-print(f"Key trends saved to {trends_file}")
-print(f"Visualization saved to {plot_file}")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Tests for the processing pipeline
+The annual CSV must not depend on how the input was split into chunks
+
+    python -m pytest data
+"""
+
+import json
+import random
+
+import pytest
+
+import process_data
+from climate_stats import TemperatureStats
+
+# Years in the synthetic input
+YEARS = range(1850, 1950)
+
+
+@pytest.fixture
+def input_path(tmp_path):
+    """A synthetic NOAA-style input file with six columns per year"""
+    rng = random.Random(7)
+    path = tmp_path / 'synthetic.asc'
+    with open(path, 'w') as f:
+        for year in YEARS:
+            f.write(f"{year} {rng.uniform(-1, 1):.6f} 0.01 0.002 0.003 0.004\n")
+    return str(path)
+
+def process(input_path, directory, chunk_rows):
+    """Process the input with the given chunk size and return the annual CSV text"""
+    csv_path = str(directory / f'annual_{chunk_rows}.csv')
+    process_data.process_file(input_path, csv_path, chunk_rows=chunk_rows, verbose=False)
+    with open(csv_path) as f:
+        return f.read()
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 3, 7])
+def test_chunk_size_does_not_change_output(input_path, tmp_path, chunk_rows):
+    """Small chunks write the same bytes as a single chunk"""
+    assert process(input_path, tmp_path, chunk_rows) == process(input_path, tmp_path, len(YEARS))
+
+def test_moving_averages_match_appended_years(input_path, tmp_path):
+    """The written moving averages equal those TemperatureStats.add computes when years are appended"""
+    lines = process(input_path, tmp_path, 3).splitlines()[1:]
+    stats = TemperatureStats()
+    expected = {}
+    for line in lines:
+        year, anomaly, _ = line.split(',')
+        completed = stats.add(int(year), float(anomaly))
+        if completed is not None:
+            expected[completed[0]] = completed[1]
+
+    written = {int(line.split(',')[0]): line.split(',')[2] for line in lines}
+    assert {year: float(value) for year, value in written.items() if value} == expected
+
+def test_duplicate_dataset_ids(tmp_path):
+    """Inputs whose file names would share an output directory are rejected before any work"""
+    inputs = [str(tmp_path / 'a' / 'global.asc'), str(tmp_path / 'b' / 'global.asc')]
+    with pytest.raises(ValueError, match='global'):
+        next(process_data.process_many(inputs, str(tmp_path / 'out'), jobs=1))
+    assert not (tmp_path / 'out').exists()
+
+def test_main_writes_to_output_dir(input_path, tmp_path, monkeypatch):
+    """Without inputs, the default dataset is written to --output-dir"""
+    output = tmp_path / 'out'
+    output.mkdir()
+    monkeypatch.setattr(process_data, 'input_file', input_path)
+    monkeypatch.setattr('sys.argv', ['process_data.py', '--output-dir', str(output)])
+    process_data.main()
+
+    for name in (process_data.ANNUAL_FILE, process_data.TRENDS_FILE, process_data.DECADAL_FILE,
+                 process_data.STATS_STATE_FILE):
+        assert (output / name).exists()
+
+def test_series_after_1900_writes_null_periods(tmp_path):
+    """Periods a series does not reach are written as null, keeping the trends file valid JSON"""
+    path = tmp_path / 'late.asc'
+    with open(path, 'w') as f:
+        for year in range(1950, 2021):
+            f.write(f"{year} {(year - 1950) / 100:.6f} 0.01 0.002 0.003 0.004\n")
+    result = process_data.process_dataset(str(path), str(tmp_path / 'late'))
+    assert result['error'] is None
+
+    def reject(constant):
+        raise ValueError(f"{constant} is not valid JSON")
+
+    with open(tmp_path / 'late' / process_data.TRENDS_FILE) as f:
+        trends = json.load(f, parse_constant=reject)
+    assert trends['warming_since_preindustrial'] is None
+    assert trends['average_anomalies']['pre_industrial'] is None
+    assert trends['average_anomalies']['early_20th_century'] is None
+    assert trends['average_anomalies']['late_20th_century'] == 0.245
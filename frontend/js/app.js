@@ -21,17 +21,18 @@ document.addEventListener('DOMContentLoaded', () => {
 // Fetch all data from the API
 async function fetchData() {
     try {
-        // Fetch annual temperature data
-        const annualResponse = await fetch(`${CONFIG.API_BASE_URL}${CONFIG.ENDPOINTS.ANNUAL}`);
-        annualData = await annualResponse.json();
-        
-        // Fetch trends data
-        const trendsResponse = await fetch(`${CONFIG.API_BASE_URL}${CONFIG.ENDPOINTS.TRENDS}`);
-        trendsData = await trendsResponse.json();
-        
-        // Fetch decadal data
-        const decadalResponse = await fetch(`${CONFIG.API_BASE_URL}${CONFIG.ENDPOINTS.DECADES}`);
-        decadalData = await decadalResponse.json();
+        // Fetch annual, trends and decadal data in one round trip from one snapshot
+        // (annual data as columns: smaller payload, faster to parse)
+        const response = await fetch(
+            `${CONFIG.API_BASE_URL}${CONFIG.ENDPOINTS.BATCH}?queries=annual,trends,decades&format=columns`
+        );
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        const batch = await response.json();
+        annualData = columnsToRows(batch.annual);
+        trendsData = batch.trends || {};
+        decadalData = batch.decades;
         
         // Initialize charts and UI
         initializeUI();
@@ -44,6 +45,15 @@ async function fetchData() {
     }
 }
 
+// Convert {year: [...], anomaly: [...], moving_avg_5yr: [...]} into row objects
+function columnsToRows(columns) {
+    return columns.year.map((year, i) => ({
+        year: year,
+        anomaly: columns.anomaly[i],
+        moving_avg_5yr: columns.moving_avg_5yr[i]
+    }));
+}
+
 // Initialize UI elements
 function initializeUI() {
     // Populate year dropdowns
@@ -80,8 +90,10 @@ function updateKeyStats() {
     document.getElementById('trendPerDecade').textContent = 
         `${trendsData.trend_per_decade.toFixed(2)}°C`;
     
+    // null when the series does not reach back to the pre-industrial period
+    const warming = trendsData.warming_since_preindustrial;
     document.getElementById('warmingSincePreindustrial').textContent = 
-        `${trendsData.warming_since_preindustrial.toFixed(2)}°C`;
+        warming === null ? 'n/a' : `${warming.toFixed(2)}°C`;
     
     document.getElementById('warmestYear').textContent = 
         `${trendsData.extremes.warmest_year.year} (${trendsData.extremes.warmest_year.anomaly.toFixed(2)}°C)`;
@@ -7,7 +7,8 @@ const CONFIG = {
         ANNUAL: '/api/annual',
         TRENDS: '/api/trends',
         DECADES: '/api/decades',
-        RANGE: '/api/range'
+        RANGE: '/api/range',
+        BATCH: '/api/batch'
     },
     
     // Chart colors
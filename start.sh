@@ -29,21 +29,35 @@ if [ ! -f "backend/database/climate_data.db" ]; then
 fi
 
 # Start the backend API server
-echo "Starting backend API server..."
+# API_SERVER=gunicorn (default, multi-worker), asgi (uvicorn) or dev (Flask debug server)
+API_SERVER=${API_SERVER:-gunicorn}
+echo "Starting backend API server ($API_SERVER)..."
 cd backend/api
-python app.py &
+case "$API_SERVER" in
+    asgi)
+        uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers "${WEB_CONCURRENCY:-4}" &
+        ;;
+    dev)
+        FLASK_DEBUG=1 python app.py &
+        ;;
+    *)
+        gunicorn -c gunicorn.conf.py wsgi:app &
+        ;;
+esac
 API_PID=$!
 cd ../..
 
 echo "Backend API server running with PID: $API_PID"
 echo "API available at: http://localhost:5000"
 
-# Start the frontend server
+# Write .gz/.br siblings of the frontend assets
+echo "Precompressing frontend assets..."
+python backend/static/precompress.py frontend
+
+# Start the frontend server (serves the precompressed siblings when accepted)
 echo "Starting frontend server..."
-cd frontend
-python -m http.server 8000 &
+python backend/static/serve_static.py 8000 --directory frontend &
 FRONTEND_PID=$!
-cd ..
 
 echo "Frontend server running with PID: $FRONTEND_PID"
 echo "Frontend available at: http://localhost:8000"